@@ -45,6 +45,7 @@
         'views/driverpro_card_views.xml',
         'views/driverpro_trip_views.xml',
         'views/driverpro_empty_trip_views.xml',
+        'views/driverpro_push_outbox_views.xml',
         # 'views/driverpro_assignment_views.xml',  # Deshabilitado - se usa Fleet directamente
         'views/driverpro_menu.xml',
     ],
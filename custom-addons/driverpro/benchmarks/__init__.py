@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# Suite de rendimiento: el addon no la importa; se ejecuta desde un shell de Odoo
+
+from .generator import seed_fleet
+from .runner import run_benchmarks, compare_reports, check_query_plans, summarize, percentile
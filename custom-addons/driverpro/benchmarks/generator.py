@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from odoo import fields
+
+_logger = logging.getLogger(__name__)
+
+# Contexto para altas masivas por ORM: sin seguimiento, chatter ni correos
+BULK_CONTEXT = {
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_create_nosubscribe': True,
+    'mail_notrack': True,
+    'no_reset_password': True,
+}
+
+# Filas por sentencia INSERT en la carga masiva
+INSERT_PAGE_SIZE = 1000
+
+# Prefijo de los registros generados (permite identificarlos y limpiarlos)
+BENCH_PREFIX = 'BENCH'
+
+
+def _bulk_insert(env, model_name, rows):
+    """
+    Inserta filas directamente en la tabla del modelo y devuelve los ids
+
+    Completa las columnas de auditoría y recalcula después, por ORM, los
+    campos almacenados calculados o relacionados del modelo.
+    """
+    if not rows:
+        return []
+    model = env[model_name]
+    now = fields.Datetime.now()
+    columns = list(rows[0])
+    for audit in ('create_uid', 'write_uid'):
+        if audit not in columns:
+            columns.append(audit)
+    for audit in ('create_date', 'write_date'):
+        if audit not in columns:
+            columns.append(audit)
+
+    values = [
+        tuple(row.get(column, env.uid if column.endswith('_uid') else now) for column in columns)
+        for row in rows
+    ]
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    query = f'INSERT INTO "{model._table}" ({column_list}) VALUES %s RETURNING id'
+    ids = []
+    for index in range(0, len(values), INSERT_PAGE_SIZE):
+        ids += [row[0] for row in execute_values(
+            env.cr, query, values[index:index + INSERT_PAGE_SIZE], page_size=INSERT_PAGE_SIZE, fetch=True
+        )]
+
+    _recompute(model.browse(ids), [
+        name for name, field in model._fields.items()
+        if field.store and (field.compute or field.related) and name not in columns
+    ])
+    return ids
+
+
+def _recompute(records, fnames):
+    """Marca campos almacenados para recálculo por ORM y los escribe en base de datos"""
+    for fname in fnames:
+        records.env.add_to_compute(records._fields[fname], records)
+    records.env.flush_all()
+
+
+def _next_sync_versions(env, count):
+    """Versiones de sincronización para filas insertadas sin ORM"""
+    env.cr.execute("SELECT nextval('driverpro_sync_seq') FROM generate_series(1, %s)", [count])
+    return [row[0] for row in env.cr.fetchall()]
+
+
+def seed_fleet(env, companies=1, drivers=50, trips_per_driver=40, empty_trips_per_driver=2,
+               pauses_per_trip=1, initial_credits=1000.0, history_days=14, random_seed=42):
+    """
+    Genera una flotilla sintética para medir el módulo a escala
+
+    Compañías, choferes, vehículos y tarjetas se crean por ORM en lotes
+    (tienen efectos secundarios que el módulo necesita: contactos, grupos,
+    caché de asignaciones). Viajes, pausas, movimientos y búsquedas se
+    insertan en bloque por SQL.
+
+    Args:
+        env: entorno de Odoo (superusuario)
+        companies: número de compañías
+        drivers: choferes por compañía (cada uno con vehículo y tarjeta)
+        trips_per_driver: viajes por chofer repartidos en history_days días
+        empty_trips_per_driver: búsquedas de viaje vacío por chofer
+        pauses_per_trip: pausas por viaje terminado
+        initial_credits: recarga inicial de cada tarjeta
+        history_days: antigüedad máxima de los viajes generados
+        random_seed: semilla para resultados reproducibles
+
+    Returns:
+        dict: ids generados por modelo
+    """
+    rng = random.Random(random_seed)
+    env = env(context=dict(env.context, **BULK_CONTEXT))
+    now = fields.Datetime.now()
+    driver_group = env.ref('driverpro.group_driverpro_user')
+
+    company_ids = env['res.company'].create([
+        {'name': f'{BENCH_PREFIX} Compañía {index + 1}'} for index in range(companies)
+    ]).ids
+    brand = env['fleet.vehicle.model.brand'].create({'name': f'{BENCH_PREFIX} Marca'})
+    vehicle_model = env['fleet.vehicle.model'].create({'name': f'{BENCH_PREFIX} Modelo', 'brand_id': brand.id})
+
+    users = env['res.users']
+    vehicles = env['fleet.vehicle']
+    cards = env['driverpro.card']
+    for company_index, company_id in enumerate(company_ids):
+        company_users = env['res.users'].create([{
+            'name': f'{BENCH_PREFIX} Chofer {company_index + 1}-{index + 1}',
+            'login': f'bench.driver.{company_index + 1}.{index + 1}',
+            'company_id': company_id,
+            'company_ids': [(6, 0, [company_id])],
+            'groups_id': [(6, 0, [driver_group.id])],
+        } for index in range(drivers)])
+        company_vehicles = env['fleet.vehicle'].create([{
+            'model_id': vehicle_model.id,
+            'license_plate': f'{BENCH_PREFIX}-{company_index + 1}-{index + 1:05d}',
+            'driver_id': user.partner_id.id,
+            'company_id': company_id,
+        } for index, user in enumerate(company_users)])
+        company_cards = env['driverpro.card'].create([{
+            'name': f'{BENCH_PREFIX}-{company_index + 1}-{index + 1:06d}',
+            'vehicle_id': vehicle.id,
+            'company_id': company_id,
+        } for index, vehicle in enumerate(company_vehicles)])
+        users |= company_users
+        vehicles |= company_vehicles
+        cards |= company_cards
+    _logger.info(f"Flotilla sintética: {len(users)} choferes, {len(vehicles)} vehículos, {len(cards)} tarjetas")
+
+    # Viajes: mayoría terminados, algunos en borrador (parte programados) y activos
+    trip_rows = []
+    trip_meta = []
+    versions = iter(_next_sync_versions(env, len(users) * trips_per_driver or 1))
+    sequence = 0
+    for user, vehicle, card in zip(users, vehicles, cards):
+        for index in range(trips_per_driver):
+            sequence += 1
+            created = now - timedelta(minutes=rng.randint(0, history_days * 24 * 60))
+            roll = rng.random()
+            state = 'done' if roll < 0.8 else 'draft' if roll < 0.95 else 'active'
+            is_recharge = rng.random() < 0.3 and state != 'draft'
+            amount = round(rng.uniform(80, 900), 2)
+            start = created + timedelta(minutes=rng.randint(1, 30)) if state != 'draft' else None
+            end = start + timedelta(minutes=rng.randint(10, 120)) if state == 'done' else None
+            is_scheduled = state == 'draft' and rng.random() < 0.5
+            trip_rows.append({
+                'name': f'{BENCH_PREFIX}-TRIP-{sequence:08d}',
+                'state': state,
+                'driver_id': user.id,
+                'vehicle_id': vehicle.id,
+                'card_id': card.id,
+                'company_id': user.company_id.id,
+                'origin': f'Origen {rng.randint(1, 500)}',
+                'destination': f'Destino {rng.randint(1, 500)}',
+                'passenger_count': rng.randint(1, 4),
+                'payment_method': 'cash',
+                'amount_mxn': amount,
+                'amount_usd': 0.0,
+                'exchange_rate': 1.0,
+                'payment_in_usd': False,
+                'is_recharge_trip': is_recharge,
+                'is_empty_trip': False,
+                'is_scheduled': is_scheduled,
+                # Programados entre 0 y 40 minutos: parte cae en las ventanas de 15/30 del cron
+                'scheduled_datetime': now + timedelta(minutes=rng.randint(0, 40)) if is_scheduled else None,
+                'scheduled_notification_sent': False,
+                'scheduled_notification_30_sent': False,
+                'start_datetime': start,
+                'end_datetime': end,
+                'consumed_credits': 1.0 if is_recharge else 0.0,
+                'credit_consumed': is_recharge,
+                'credit_refunded': False,
+                'sync_version': next(versions),
+                'create_date': created,
+                'write_date': end or start or created,
+            })
+            trip_meta.append((card.id, state, start, end, is_recharge))
+    trip_ids = _bulk_insert(env, 'driverpro.trip', trip_rows)
+
+    # Pausas cerradas dentro del intervalo de los viajes terminados
+    reasons = env['driverpro.pause.reason'].search([])
+    pause_rows = []
+    for trip_id, (card_id, state, start, end, is_recharge) in zip(trip_ids, trip_meta):
+        if state != 'done':
+            continue
+        span = (end - start).total_seconds()
+        for index in range(pauses_per_trip):
+            pause_start = start + timedelta(seconds=span * (index + 0.25) / (pauses_per_trip + 1))
+            pause_rows.append({
+                'trip_id': trip_id,
+                'reason_id': rng.choice(reasons).id if reasons else None,
+                'start_datetime': pause_start,
+                'end_datetime': pause_start + timedelta(seconds=span / (pauses_per_trip + 1) / 2),
+                'is_active': False,
+                'notes': '',
+            })
+    pause_ids = _bulk_insert(env, 'driverpro.trip.pause', pause_rows)
+    env.invalidate_all()
+    _recompute(env['driverpro.trip'].browse(trip_ids), ['pause_count', 'pause_duration', 'effective_duration'])
+
+    # Libro de movimientos: recarga inicial y una salida por viaje con recarga
+    movement_rows = [{
+        'card_id': card.id,
+        'movement_type': 'in',
+        'amount': initial_credits,
+        'movement_date': now - timedelta(days=history_days + 1),
+        'reference': f'{BENCH_PREFIX} recarga inicial',
+    } for card in cards]
+    movement_rows += [{
+        'card_id': card_id,
+        'movement_type': 'out',
+        'amount': 1.0,
+        'movement_date': start,
+        'reference': f'{BENCH_PREFIX} viaje {trip_id}',
+        'trip_id': trip_id,
+    } for trip_id, (card_id, state, start, end, is_recharge) in zip(trip_ids, trip_meta) if is_recharge]
+    movement_rows.sort(key=lambda row: row['movement_date'])
+    for row in movement_rows:
+        row.setdefault('trip_id', None)
+    movement_ids = _bulk_insert(env, 'driverpro.card.movement', movement_rows)
+    env['driverpro.card.movement']._rebuild_running_balance(cards.ids)
+    env.invalidate_all()
+    _recompute(cards, ['balance', 'total_recharges', 'total_payment_amount', 'total_consumption', 'recharge_count', 'trip_count'])
+
+    # Búsquedas de viaje vacío: una activa por chofer como máximo, el resto cerradas
+    empty_rows = []
+    empty_versions = iter(_next_sync_versions(env, len(users) * empty_trips_per_driver or 1))
+    sequence = 0
+    for user, vehicle in zip(users, vehicles):
+        for index in range(empty_trips_per_driver):
+            sequence += 1
+            searching = index == 0
+            started = now - timedelta(minutes=rng.randint(1, 55) if searching else rng.randint(120, history_days * 24 * 60))
+            empty_rows.append({
+                'name': f'{BENCH_PREFIX}-SEARCH-{sequence:08d}',
+                'state': 'searching' if searching else rng.choice(['converted', 'cancelled']),
+                'driver_id': user.id,
+                'vehicle_id': vehicle.id,
+                'company_id': user.company_id.id,
+                'search_location': f'Zona {rng.randint(1, 50)}',
+                'wait_limit_minutes': 60,
+                'started_at': started,
+                'alert_30_sent': False,
+                'alert_15_sent': False,
+                'alert_5_sent': False,
+                'sync_version': next(empty_versions),
+                'create_date': started,
+            })
+    empty_trip_ids = _bulk_insert(env, 'driverpro.empty_trip', empty_rows)
+
+    env.invalidate_all()
+    _logger.info(
+        f"Carga masiva: {len(trip_ids)} viajes, {len(pause_ids)} pausas, "
+        f"{len(movement_ids)} movimientos, {len(empty_trip_ids)} búsquedas"
+    )
+    return {
+        'res.company': company_ids,
+        'res.users': users.ids,
+        'fleet.vehicle': vehicles.ids,
+        'driverpro.card': cards.ids,
+        'driverpro.trip': trip_ids,
+        'driverpro.trip.pause': pause_ids,
+        'driverpro.card.movement': movement_ids,
+        'driverpro.empty_trip': empty_trip_ids,
+    }
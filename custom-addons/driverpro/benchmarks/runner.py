@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from odoo import fields, release
+
+from ..utils.serializers import TripSerializer
+from ..utils.pagination import search_keyset
+from ..utils.query_plans import HOT_QUERIES, explain_hot_queries
+from .generator import seed_fleet
+
+_logger = logging.getLogger(__name__)
+
+# Percentiles reportados por ruta
+PERCENTILES = (50, 90, 95, 99)
+
+# Variación relativa de p95 (o de consultas promedio) considerada regresión
+REGRESSION_THRESHOLD = 0.2
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista de valores"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples):
+    """Resume muestras (ms, consultas) en percentiles de latencia y conteo de consultas"""
+    latencies = [latency for latency, queries in samples]
+    queries = [queries for latency, queries in samples]
+    summary = {'samples': len(samples)}
+    if not samples:
+        return summary
+    summary.update({
+        'min_ms': round(min(latencies), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+    })
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = round(percentile(latencies, pct), 3)
+    return summary
+
+
+def check_query_plans(env):
+    """
+    Planes de las consultas frecuentes sobre la flotilla generada
+
+    Se analizan las tablas para que el planificador tenga estadísticas del
+    volumen real y se usa su elección, sin forzar índices: a escala de
+    benchmark una consulta que deja de usar su índice es una regresión.
+
+    Returns:
+        dict: {etiqueta: índice declarado, uso de índice y nodos de lectura}
+    """
+    for table in sorted({table for _label, table, _index, _query in HOT_QUERIES}):
+        env.cr.execute(f'ANALYZE "{table}"')
+    return {
+        entry['label']: {
+            'index': entry['index'],
+            'uses_index': entry['uses_index'],
+            'uses_declared_index': entry['uses_declared_index'],
+            'scans': entry['scans'],
+        }
+        for entry in explain_hot_queries(env.cr)
+    }
+
+
+@contextmanager
+def _no_commit():
+    """Evita que los crons confirmen la transacción durante la medición"""
+    thread = threading.current_thread()
+    previous = getattr(thread, 'testing', False)
+    thread.testing = True
+    try:
+        yield
+    finally:
+        thread.testing = previous
+
+
+def measure(env, fn, *args):
+    """Ejecuta fn(*args) incluyendo el flush final; devuelve (ms, consultas SQL)"""
+    cr = env.cr
+    queries_before = cr.sql_log_count
+    started = time.perf_counter()
+    fn(*args)
+    env.flush_all()
+    elapsed = (time.perf_counter() - started) * 1000.0
+    return elapsed, cr.sql_log_count - queries_before
+
+
+class BenchmarkSuite:
+    """Rutas críticas del módulo medidas sobre la flotilla sintética"""
+
+    def __init__(self, env, seeded, samples=50):
+        self.env = env
+        self.samples = samples
+        self.driver_ids = seeded['res.users']
+        self.card_ids = seeded['driverpro.card']
+
+    def _drivers(self):
+        """Choferes de la muestra, rotando si hay menos que muestras"""
+        return [self.driver_ids[index % len(self.driver_ids)] for index in range(self.samples)]
+
+    def _cold(self):
+        """Vacía el caché del ORM para medir cada muestra en frío"""
+        self.env.invalidate_all()
+
+    def bench_get_trips(self):
+        """Listado de viajes de la semana (offset y conteo), como GET /driverpro/api/trips"""
+        samples = []
+        week_ago = datetime.now() - timedelta(days=7)
+        for driver_id in self._drivers():
+            env = self.env(user=driver_id)
+            domain = [('driver_id', '=', driver_id), ('create_date', '>=', week_ago)]
+
+            def run():
+                env['driverpro.trip'].search_count(domain)
+                TripSerializer(env).search_serialize(domain, limit=10, order='create_date desc')
+
+            self._cold()
+            samples.append(measure(env, run))
+        return samples
+
+    def bench_get_trips_cursor(self):
+        """Listado de viajes por cursor, como GET /driverpro/api/trips?cursor="""
+        samples = []
+        week_ago = datetime.now() - timedelta(days=7)
+        for driver_id in self._drivers():
+            env = self.env(user=driver_id)
+            domain = [('driver_id', '=', driver_id), ('create_date', '>=', week_ago)]
+
+            def run():
+                trips, _next_cursor = search_keyset(env['driverpro.trip'], domain, 10)
+                TripSerializer(env).serialize(trips)
+
+            self._cold()
+            samples.append(measure(env, run))
+        return samples
+
+    def bench_create_trip(self):
+        """Resolución de asignación y alta de un viaje, como POST /driverpro/api/trips/create"""
+        samples = []
+        for driver_id in self._drivers():
+            env = self.env(user=driver_id)
+
+            def run():
+                vehicle, card = env['driverpro.assignment.resolver'].resolve(driver_id)
+                env['driverpro.trip'].create({
+                    'driver_id': driver_id,
+                    'vehicle_id': vehicle.id,
+                    'card_id': card.id,
+                    'origin': 'Benchmark',
+                    'destination': 'Benchmark',
+                    'is_recharge_trip': True,
+                })
+
+            self._cold()
+            samples.append(measure(env, run))
+        return samples
+
+    def bench_action_start_done(self):
+        """Inicio (con consumo de recarga) y fin de viajes en borrador"""
+        starts, dones = [], []
+        for driver_id in self._drivers():
+            env = self.env(user=driver_id)
+            trip = env['driverpro.trip'].search([
+                ('driver_id', '=', driver_id),
+                ('state', '=', 'draft'),
+                ('is_scheduled', '=', False)
+            ], limit=1)
+            if not trip:
+                continue
+            self._cold()
+            starts.append(measure(env, trip.action_start))
+            self._cold()
+            dones.append(measure(env, trip.action_done))
+        return {'action_start': starts, 'action_done': dones}
+
+    def bench_check_time_alerts(self):
+        """Planificador de búsquedas de viaje vacío (alertas y vencimientos)"""
+        self._cold()
+        return [measure(self.env, self.env['driverpro.empty_trip'].check_time_alerts)]
+
+    def bench_send_scheduled_notifications(self):
+        """Cron de recordatorios de viajes programados"""
+        self._cold()
+        return [measure(self.env, self.env['driverpro.trip'].send_scheduled_notifications)]
+
+    def bench_card_balance(self):
+        """Recálculo del saldo (libro de movimientos) de todas las tarjetas"""
+        cards = self.env['driverpro.card'].browse(self.card_ids)
+
+        def run():
+            self.env.add_to_compute(cards._fields['balance'], cards)
+            cards.flush_recordset(['balance'])
+
+        samples = []
+        for _index in range(min(self.samples, 10)):
+            self._cold()
+            samples.append(measure(self.env, run))
+        return samples
+
+    def run(self):
+        """Ejecuta todas las rutas; devuelve {ruta: muestras}"""
+        results = {}
+        with _no_commit():
+            for name in ('get_trips', 'get_trips_cursor', 'create_trip', 'action_start_done',
+                         'check_time_alerts', 'send_scheduled_notifications', 'card_balance'):
+                _logger.info(f"Benchmark {name}")
+                samples = getattr(self, f'bench_{name}')()
+                if isinstance(samples, dict):
+                    results.update(samples)
+                else:
+                    results[name] = samples
+        return results
+
+
+def run_benchmarks(env, output=None, samples=50, rollback=True, seed=True, **fleet):
+    """
+    Genera la flotilla sintética, mide las rutas críticas y reporta resultados
+
+    Pensado para una base de datos desechable, desde un shell de Odoo:
+
+        from odoo.addons.driverpro.benchmarks import run_benchmarks
+        run_benchmarks(env, drivers=200, trips_per_driver=100, output='/tmp/driverpro-bench.json')
+
+    Args:
+        env: entorno de Odoo (superusuario)
+        output: ruta del archivo JSON de resultados (opcional)
+        samples: muestras por ruta
+        rollback: revierte la flotilla y los cambios al terminar
+        seed: si False, usa los registros BENCH ya existentes en la base de datos
+        **fleet: parámetros de seed_fleet (companies, drivers, trips_per_driver, ...)
+
+    Returns:
+        dict: metadatos y resumen por ruta
+    """
+    started = time.perf_counter()
+    if seed:
+        seeded = seed_fleet(env, **fleet)
+    else:
+        seeded = {
+            'res.users': env['res.users'].search([('login', '=like', 'bench.driver.%')]).ids,
+            'driverpro.card': env['driverpro.card'].search([('name', '=like', 'BENCH-%')]).ids,
+        }
+    seed_seconds = time.perf_counter() - started
+
+    try:
+        query_plans = check_query_plans(env)
+        raw = BenchmarkSuite(env, seeded, samples=samples).run()
+    finally:
+        if rollback:
+            env.cr.rollback()
+            env.invalidate_all()
+            env.registry.clear_cache()
+
+    module = env['ir.module.module'].sudo().search([('name', '=', 'driverpro')], limit=1)
+    report = {
+        'meta': {
+            'module_version': module.latest_version,
+            'odoo_version': release.version,
+            'python_version': platform.python_version(),
+            'database': env.cr.dbname,
+            'timestamp': fields.Datetime.now().isoformat(),
+            'samples': samples,
+            'fleet': fleet,
+            'seeded': {model: len(ids) for model, ids in seeded.items()},
+            'seed_seconds': round(seed_seconds, 3),
+        },
+        'results': {name: summarize(values) for name, values in raw.items()},
+        'query_plans': query_plans,
+    }
+    for name, summary in report['results'].items():
+        _logger.info(f"{name}: {json.dumps(summary)}")
+    for label, plan in query_plans.items():
+        if not plan['uses_declared_index']:
+            _logger.warning(f"Plan de {label} sin el índice {plan['index']}: {plan['scans']}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+    return report
+
+
+def compare_reports(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compara dos reportes (dicts o rutas JSON) y devuelve las regresiones
+
+    Una ruta regresa si su p95 o su promedio de consultas crece más de
+    threshold (relativo) respecto de la línea base; una consulta frecuente
+    regresa si usaba su índice declarado y ya no lo usa.
+    """
+    if isinstance(baseline, str):
+        with open(baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+    if isinstance(current, str):
+        with open(current, encoding='utf-8') as handle:
+            current = json.load(handle)
+
+    regressions = []
+    for name, summary in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base or not base.get('samples') or not summary.get('samples'):
+            continue
+        for metric in ('p95_ms', 'queries_mean'):
+            before, after = base.get(metric), summary.get(metric)
+            if before and after is not None and (after - before) / before > threshold:
+                regressions.append({
+                    'path': name,
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'change': round((after - before) / before, 3),
+                })
+
+    for label, plan in current.get('query_plans', {}).items():
+        base = baseline.get('query_plans', {}).get(label)
+        if base and base['uses_declared_index'] and not plan['uses_declared_index']:
+            regressions.append({
+                'path': f'plan:{label}',
+                'metric': 'uses_declared_index',
+                'baseline': True,
+                'current': False,
+                'scans': plan['scans'],
+            })
+    return regressions
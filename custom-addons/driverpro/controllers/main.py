@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import base64
 import json
 import logging
 from datetime import datetime
@@ -9,8 +10,21 @@ from odoo import http, _
 from odoo.http import request
 from odoo.exceptions import ValidationError, UserError, AccessError
 
+from ..utils.etag import (
+    compute_etag, etag_matches, trips_fingerprint, empty_trips_fingerprint,
+    pause_reasons_fingerprint, assignment_fingerprint,
+)
+from ..utils.pagination import search_keyset
+from ..utils.serializers import TripSerializer, EmptyTripSerializer, PauseSerializer
+from ..utils.uploads import (
+    get_upload_limits, max_request_bytes, store_uploaded_files,
+)
+
 _logger = logging.getLogger(__name__)
 
+# Máximo de viajes aceptados por request en la creación masiva
+BULK_CREATE_MAX_TRIPS = 500
+
 
 class DriverproAPIController(http.Controller):
     """API Controller para el cliente de choferes"""
@@ -44,15 +58,35 @@ class DriverproAPIController(http.Controller):
         # Solo verificamos que el usuario esté autenticado, sin grupo específico por ahora
         return {'success': True, 'user_id': request.env.user.id}
 
-    def _json_response(self, data, status=200):
+    def _is_truthy(self, value):
+        """Interpreta un parámetro de query string como booleano"""
+        return str(value).lower() in ('1', 'true', 'yes') if value is not None else False
+
+    def _json_response(self, data, status=200, etag=None):
         """Retorna respuesta JSON"""
+        headers = [('Content-Type', 'application/json; charset=utf-8')]
+        if etag:
+            headers += [('ETag', etag), ('Cache-Control', 'private, no-cache')]
         response = request.make_response(
             json.dumps(data, default=str, ensure_ascii=False),
-            headers=[('Content-Type', 'application/json; charset=utf-8')]
+            headers=headers
         )
         response.status_code = status
         return response
 
+    def _is_not_modified(self, etag):
+        """Indica si el ETag del cliente (If-None-Match) coincide con el actual"""
+        return etag_matches(request.httprequest.headers.get('If-None-Match'), etag)
+
+    def _not_modified_response(self, etag):
+        """Retorna 304 sin cuerpo para respuestas condicionales"""
+        response = request.make_response('', headers=[
+            ('ETag', etag),
+            ('Cache-Control', 'private, no-cache')
+        ])
+        response.status_code = 304
+        return response
+
     @http.route('/driverpro/api/test', type='http', auth='none', methods=['GET'], csrf=False)
     def test_connection(self):
         """Endpoint de prueba sin autenticación"""
@@ -81,10 +115,16 @@ class DriverproAPIController(http.Controller):
                     'code': 404
                 }, 404)
 
-            # Buscar vehículo asignado en Fleet
-            vehicle = request.env['fleet.vehicle'].search([
-                ('driver_id', '=', partner.id)
-            ], limit=1)
+            # Respuesta condicional: evitar búsquedas y serialización si no hubo cambios
+            etag = compute_etag(
+                'assignment', user_id, request.env.lang,
+                assignment_fingerprint(request.env.cr, partner.id)
+            )
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
+
+            # Vehículo asignado en Fleet y su tarjeta activa (cacheados por chofer)
+            vehicle, card = request.env['driverpro.assignment.resolver'].resolve(user)
 
             if not vehicle:
                 return self._json_response({
@@ -92,12 +132,6 @@ class DriverproAPIController(http.Controller):
                     'code': 404
                 }, 404)
 
-            # Buscar tarjeta activa asociada al vehículo
-            card = request.env['driverpro.card'].search([
-                ('vehicle_id', '=', vehicle.id),
-                ('active', '=', True)
-            ], limit=1)
-
             warnings = []
             if not card:
                 warnings.append("No hay tarjeta asignada al vehículo")
@@ -125,7 +159,7 @@ class DriverproAPIController(http.Controller):
                 'warnings': warnings
             }
 
-            return self._json_response({'success': True, 'data': data})
+            return self._json_response({'success': True, 'data': data}, etag=etag)
 
         except Exception as e:
             _logger.error(f"Error en get_current_assignment: {str(e)}")
@@ -136,8 +170,8 @@ class DriverproAPIController(http.Controller):
             }, 500)
 
     @http.route('/driverpro/api/trips', type='http', auth='user', methods=['GET'], csrf=False)
-    def get_trips(self, state=None, page=None, limit=None, offset=None):
-        """Obtiene los viajes del chofer con paginación"""
+    def get_trips(self, state=None, page=None, limit=None, offset=None, cursor=None, with_count=None):
+        """Obtiene los viajes del chofer con paginación (page/offset o cursor)"""
         try:
             auth_result = self._authenticate_driver()
             if 'error' in auth_result:
@@ -147,7 +181,9 @@ class DriverproAPIController(http.Controller):
 
             # Parámetros de paginación
             try:
-                if page:
+                if cursor is not None:
+                    limit = int(limit) if limit else 10
+                elif page:
                     page = int(page)
                     limit = int(limit) if limit else 10
                     offset = (page - 1) * limit
@@ -172,59 +208,31 @@ class DriverproAPIController(http.Controller):
             if state:
                 domain.append(('state', '=', state))
 
+            # Respuesta condicional; con viajes pausados la huella cambia cada minuto
+            fingerprint = trips_fingerprint(request.env.cr, user_id, week_ago, state)
+            etag = compute_etag(
+                'trips', user_id, request.env.user.tz, state, page, limit, offset, cursor, with_count,
+                fingerprint, datetime.now().strftime('%Y-%m-%dT%H:%M') if fingerprint[6] else None
+            )
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
+
+            # Modo cursor: keyset sobre (create_date, id), total solo si se pide
+            if cursor is not None:
+                return self._keyset_trips_response(domain, limit, cursor, with_count, etag)
+
             # Contar total
             total_count = request.env['driverpro.trip'].search_count(domain)
 
-            # Buscar viajes
-            trips = request.env['driverpro.trip'].search(
-                domain, 
-                limit=limit, 
-                offset=offset, 
+            # Buscar y serializar viajes en bloque (una lectura por modelo)
+            serializer = TripSerializer(request.env)
+            trips_data = serializer.search_serialize(
+                domain,
+                limit=limit,
+                offset=offset,
                 order='create_date desc'
             )
 
-            # Construir respuesta
-            trips_data = []
-            for trip in trips:
-                trip_data = {
-                    'id': trip.id,
-                    'name': trip.name,
-                    'state': trip.state,
-                    'origin': trip.origin,
-                    'destination': trip.destination,
-                    'passenger_count': trip.passenger_count,
-                    'passenger_reference': trip.passenger_reference,
-                    'start_datetime': self._convert_to_user_timezone(trip.start_datetime).isoformat() if trip.start_datetime else None,
-                    'end_datetime': self._convert_to_user_timezone(trip.end_datetime).isoformat() if trip.end_datetime else None,
-                    'duration': trip.duration,
-                    'pause_duration': trip.pause_duration,
-                    'effective_duration': trip.effective_duration,
-                    'consumed_credits': trip.consumed_credits,
-                    'amount_mxn': trip.amount_mxn,
-                    'amount_usd': trip.amount_usd,
-                    'total_amount_mxn': trip.total_amount_mxn,
-                    'payment_in_usd': trip.payment_in_usd,
-                    'exchange_rate': trip.exchange_rate,
-                    'payment_method': trip.payment_method,
-                    'payment_reference': trip.payment_reference,
-                    'is_paused': trip.is_paused,
-                    'pause_count': trip.pause_count,
-                    'comments': trip.comments,
-                    'is_scheduled': trip.is_scheduled,
-                    'scheduled_datetime': self._convert_to_user_timezone(trip.scheduled_datetime).isoformat() if trip.scheduled_datetime else None,
-                    'vehicle': {
-                        'id': trip.vehicle_id.id,
-                        'name': trip.vehicle_id.name,
-                        'license_plate': trip.vehicle_id.license_plate
-                    } if trip.vehicle_id else None,
-                    'card': {
-                        'id': trip.card_id.id,
-                        'name': trip.card_id.name,
-                        'balance': trip.card_id.balance
-                    } if trip.card_id else None
-                }
-                trips_data.append(trip_data)
-
             return self._json_response({
                 'success': True,
                 'data': trips_data,
@@ -239,7 +247,7 @@ class DriverproAPIController(http.Controller):
                     'limit': limit,
                     'offset': offset
                 }
-            })
+            }, etag=etag)
 
         except Exception as e:
             _logger.error(f"Error en get_trips: {str(e)}")
@@ -249,7 +257,87 @@ class DriverproAPIController(http.Controller):
                 'code': 500
             }, 500)
 
-    @http.route('/driverpro/api/trips/create', type='http', auth='user', methods=['POST'], csrf=False)
+    def _keyset_trips_response(self, domain, limit, cursor, with_count, etag=None):
+        """Respuesta de get_trips en modo cursor"""
+        Trip = request.env['driverpro.trip']
+        try:
+            trips, next_cursor = search_keyset(Trip, domain, limit, cursor)
+        except ValueError as e:
+            return self._json_response({
+                'error': str(e),
+                'code': 400
+            }, 400)
+
+        trips_data = TripSerializer(request.env).serialize(trips)
+
+        pagination = {
+            'count': len(trips_data),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': bool(next_cursor)
+        }
+        if self._is_truthy(with_count):
+            pagination['total'] = Trip.search_count(domain)
+
+        return self._json_response({
+            'success': True,
+            'data': trips_data,
+            'pagination': pagination
+        }, etag=etag)
+
+    def _validate_trip_data(self, data):
+        """Valida los campos requeridos según el tipo de viaje; devuelve el error o None"""
+        if data.get('trip_type', 'normal') == 'empty':
+            # Para viajes vacíos, no requerimos origen ni destino
+            if not data.get('empty_wait_limit_minutes'):
+                data['empty_wait_limit_minutes'] = 60  # Default 1 hora
+            return None
+        # Para viajes normales y con recarga, requerimos origen y destino
+        for field in ['origin', 'destination']:
+            if not data.get(field):
+                return f'Campo requerido: {field}'
+        return None
+
+    def _prepare_trip_vals(self, data, user_id, vehicle, card):
+        """Construye los valores de creación de un viaje a partir de los datos del request"""
+        trip_type = data.get('trip_type', 'normal')
+        trip_vals = {
+            'driver_id': user_id,
+            'vehicle_id': vehicle.id,
+            'card_id': card.id if card else False,
+            'comments': data.get('comments'),
+            'payment_method': data.get('payment_method', 'cash'),
+            'amount_mxn': data.get('amount_mxn', 0.0),
+            'amount_usd': data.get('amount_usd', 0.0),
+            'payment_in_usd': data.get('payment_in_usd', False),
+            'exchange_rate': data.get('exchange_rate', 1.0),
+            'is_scheduled': data.get('is_scheduled', False),
+            'scheduled_datetime': data.get('scheduled_datetime'),
+            'payment_reference': data.get('payment_reference')
+        }
+
+        # Agregar campos específicos según el tipo de viaje
+        if trip_type == 'empty':
+            trip_vals.update({
+                'is_empty_trip': True,
+                'empty_wait_limit_minutes': data.get('empty_wait_limit_minutes', 60),
+                'origin': 'Búsqueda de clientes',
+                'destination': 'Por definir',
+                'passenger_count': 0,
+            })
+        else:
+            trip_vals.update({
+                'origin': data.get('origin'),
+                'destination': data.get('destination'),
+                'passenger_count': data.get('passenger_count', 1),
+                'passenger_reference': data.get('passenger_reference'),
+                'is_recharge_trip': data.get('is_recharge_trip', trip_type == 'recharge'),
+            })
+
+        return trip_vals
+
+    @http.route('/driverpro/api/trips/create', type='http', auth='user', methods=['POST'], csrf=False,
+                max_content_length=max_request_bytes)
     def create_trip(self):
         """Crea un nuevo viaje con soporte para archivos"""
         try:
@@ -259,7 +347,6 @@ class DriverproAPIController(http.Controller):
 
             user_id = auth_result['user_id']
             user = request.env.user
-            partner = user.partner_id
 
             # Obtener datos desde el request (puede ser JSON o FormData)
             if request.httprequest.content_type and 'application/json' in request.httprequest.content_type:
@@ -289,25 +376,15 @@ class DriverproAPIController(http.Controller):
 
             # Validar campos requeridos según el tipo de viaje
             trip_type = data.get('trip_type', 'normal')
-            
-            if trip_type == 'empty':
-                # Para viajes vacíos, no requerimos origen ni destino
-                if not data.get('empty_wait_limit_minutes'):
-                    data['empty_wait_limit_minutes'] = 60  # Default 1 hora
-            else:
-                # Para viajes normales y con recarga, requerimos origen y destino
-                required_fields = ['origin', 'destination']
-                for field in required_fields:
-                    if not data.get(field):
-                        return self._json_response({
-                            'error': f'Campo requerido: {field}',
-                            'code': 400
-                        }, 400)
-
-            # Buscar vehículo asignado en Fleet
-            vehicle = request.env['fleet.vehicle'].search([
-                ('driver_id', '=', partner.id)
-            ], limit=1)
+            error = self._validate_trip_data(data)
+            if error:
+                return self._json_response({
+                    'error': error,
+                    'code': 400
+                }, 400)
+
+            # Vehículo asignado en Fleet y su tarjeta activa (cacheados por chofer)
+            vehicle, card = request.env['driverpro.assignment.resolver'].resolve(user)
 
             if not vehicle:
                 return self._json_response({
@@ -315,46 +392,8 @@ class DriverproAPIController(http.Controller):
                     'code': 404
                 }, 404)
 
-            # Buscar tarjeta activa asociada al vehículo
-            card = request.env['driverpro.card'].search([
-                ('vehicle_id', '=', vehicle.id),
-                ('active', '=', True)
-            ], limit=1)
-
             # Crear viaje
-            trip_vals = {
-                'driver_id': user_id,
-                'vehicle_id': vehicle.id,
-                'card_id': card.id if card else False,
-                'comments': data.get('comments'),
-                'payment_method': data.get('payment_method', 'cash'),
-                'amount_mxn': data.get('amount_mxn', 0.0),
-                'amount_usd': data.get('amount_usd', 0.0),
-                'payment_in_usd': data.get('payment_in_usd', False),
-                'exchange_rate': data.get('exchange_rate', 1.0),
-                'is_scheduled': data.get('is_scheduled', False),
-                'scheduled_datetime': data.get('scheduled_datetime'),
-                'payment_reference': data.get('payment_reference')
-            }
-
-            # Agregar campos específicos según el tipo de viaje
-            if trip_type == 'empty':
-                trip_vals.update({
-                    'is_empty_trip': True,
-                    'empty_wait_limit_minutes': data.get('empty_wait_limit_minutes', 60),
-                    'origin': 'Búsqueda de clientes',
-                    'destination': 'Por definir',
-                    'passenger_count': 0,
-                })
-            else:
-                trip_vals.update({
-                    'origin': data.get('origin'),
-                    'destination': data.get('destination'),
-                    'passenger_count': data.get('passenger_count', 1),
-                    'passenger_reference': data.get('passenger_reference'),
-                    'is_recharge_trip': data.get('is_recharge_trip', trip_type == 'recharge'),
-                })
-
+            trip_vals = self._prepare_trip_vals(data, user_id, vehicle, card)
             trip = request.env['driverpro.trip'].create(trip_vals)
 
             # Iniciar automáticamente los viajes vacíos
@@ -365,29 +404,12 @@ class DriverproAPIController(http.Controller):
                     _logger.warning(f"Error iniciando viaje vacío automáticamente: {e}")
                     # No fallar completamente, solo registrar el warning
 
-            # Manejar archivos adjuntos si los hay
-            files_uploaded = []
+            # Guardar archivos adjuntos por bloques en el filestore (sin cargarlos en memoria)
+            files_uploaded, files_rejected = [], []
             if request.httprequest.files:
-                for file_key in request.httprequest.files:
-                    file_item = request.httprequest.files[file_key]
-                    if file_item and file_item.filename:
-                        try:
-                            # Crear attachment en Odoo
-                            attachment = request.env['ir.attachment'].create({
-                                'name': file_item.filename,
-                                'type': 'binary',
-                                'datas': file_item.read(),
-                                'res_model': 'driverpro.trip',
-                                'res_id': trip.id,
-                                'mimetype': file_item.content_type
-                            })
-                            files_uploaded.append({
-                                'name': file_item.filename,
-                                'id': attachment.id,
-                                'size': len(attachment.datas) if attachment.datas else 0
-                            })
-                        except Exception as e:
-                            _logger.warning(f"Error subiendo archivo {file_item.filename}: {e}")
+                files_uploaded, files_rejected = store_uploaded_files(
+                    request.env, request.httprequest.files, 'driverpro.trip', trip.id, link_field='document_ids'
+                )
 
             return self._json_response({
                 'success': True,
@@ -398,6 +420,7 @@ class DriverproAPIController(http.Controller):
                     'card_available_credits': card.balance if card else 0,
                     'card_credits_warning': 'Saldo insuficiente para iniciar viaje' if not card or card.balance <= 0 else None,
                     'files_uploaded': files_uploaded,
+                    'files_rejected': files_rejected,
                     'files_count': len(files_uploaded)
                 }
             })
@@ -416,6 +439,289 @@ class DriverproAPIController(http.Controller):
                 'code': 500
             }, 500)
 
+    @http.route('/driverpro/api/trips/bulk-create', type='http', auth='user', methods=['POST'], csrf=False)
+    def bulk_create_trips(self):
+        """
+        Crea varios viajes en un solo request (JSON) con reporte de errores por elemento
+
+        Acepta un arreglo de viajes o {"trips": [...]} con los mismos campos
+        que /driverpro/api/trips/create. Los gestores pueden indicar driver_id
+        para crear viajes de otros choferes.
+        """
+        try:
+            auth_result = self._authenticate_driver()
+            if 'error' in auth_result:
+                return self._json_response(auth_result, auth_result['code'])
+
+            user = request.env.user
+            data = json.loads(request.httprequest.data.decode('utf-8'))
+            items = data.get('trips') if isinstance(data, dict) else data
+
+            if not isinstance(items, list) or not items:
+                return self._json_response({
+                    'error': 'Se requiere un arreglo de viajes',
+                    'code': 400
+                }, 400)
+            if len(items) > BULK_CREATE_MAX_TRIPS:
+                return self._json_response({
+                    'error': f'Máximo {BULK_CREATE_MAX_TRIPS} viajes por request',
+                    'code': 413
+                }, 413)
+
+            is_manager = user.has_group('driverpro.group_driverpro_manager')
+            resolver = request.env['driverpro.assignment.resolver']
+            errors = []
+            prepared = []
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    errors.append({'index': index, 'error': 'Elemento inválido', 'code': 400})
+                    continue
+                item = dict(item)
+                try:
+                    driver_id = int(item.get('driver_id') or user.id)
+                except (TypeError, ValueError):
+                    errors.append({'index': index, 'error': 'driver_id inválido', 'code': 400})
+                    continue
+                if driver_id != user.id and not is_manager:
+                    errors.append({'index': index, 'error': 'No autorizado para crear viajes de otro chofer', 'code': 403})
+                    continue
+
+                error = self._validate_trip_data(item)
+                if error:
+                    errors.append({'index': index, 'error': error, 'code': 400})
+                    continue
+
+                # Vehículo y tarjeta del chofer (cacheados: sin búsquedas si no cambió la asignación)
+                vehicle, card = resolver.resolve(driver_id)
+                if not vehicle:
+                    errors.append({'index': index, 'error': 'No hay vehículo asignado en Fleet', 'code': 404})
+                    continue
+                prepared.append((index, item.get('trip_type', 'normal'), self._prepare_trip_vals(item, driver_id, vehicle, card)))
+
+            created = self._create_trips_batch(prepared, errors)
+
+            # Iniciar automáticamente los viajes vacíos
+            for index, trip_type, trip in created:
+                if trip_type == 'empty':
+                    try:
+                        with request.env.cr.savepoint():
+                            trip.action_start_empty()
+                    except Exception as e:
+                        _logger.warning(f"Error iniciando viaje vacío {trip.name} automáticamente: {e}")
+
+            errors.sort(key=lambda error: error['index'])
+            return self._json_response({
+                'success': not errors,
+                'data': {
+                    'created': [{
+                        'index': index,
+                        'trip_id': trip.id,
+                        'name': trip.name,
+                        'state': trip.state,
+                    } for index, trip_type, trip in created],
+                    'errors': errors,
+                    'created_count': len(created),
+                    'error_count': len(errors)
+                }
+            }, 200 if created else 400)
+
+        except Exception as e:
+            _logger.error(f"Error en bulk_create_trips: {str(e)}")
+            return self._json_response({
+                'error': 'Error interno del servidor',
+                'message': str(e),
+                'code': 500
+            }, 500)
+
+    def _create_trips_batch(self, prepared, errors):
+        """
+        Crea los viajes preparados en un solo create; si el lote falla, los
+        crea uno por uno en savepoints para aislar los elementos con error
+
+        Returns:
+            list: tuplas (índice, tipo de viaje, viaje creado)
+        """
+        Trip = request.env['driverpro.trip']
+        if not prepared:
+            return []
+
+        try:
+            with request.env.cr.savepoint():
+                trips = Trip.create([vals for index, trip_type, vals in prepared])
+            return [(index, trip_type, trip) for (index, trip_type, vals), trip in zip(prepared, trips)]
+        except Exception as e:
+            _logger.warning(f"Lote de {len(prepared)} viajes rechazado, creando uno por uno: {e}")
+
+        created = []
+        for index, trip_type, vals in prepared:
+            try:
+                with request.env.cr.savepoint():
+                    created.append((index, trip_type, Trip.create(vals)))
+            except ValidationError as e:
+                errors.append({'index': index, 'error': 'Error de validación', 'message': str(e), 'code': 400})
+            except Exception as e:
+                errors.append({'index': index, 'error': 'Error creando viaje', 'message': str(e), 'code': 500})
+        return created
+
+    @http.route('/driverpro/api/trips/<int:trip_id>/attachments', type='http', auth='user', methods=['POST'], csrf=False,
+                max_content_length=max_request_bytes)
+    def upload_trip_attachments(self, trip_id):
+        """Sube archivos (multipart) a un viaje, copiándolos por bloques al filestore"""
+        try:
+            auth_result = self._authenticate_driver()
+            if 'error' in auth_result:
+                return self._json_response(auth_result, auth_result['code'])
+
+            trip = request.env['driverpro.trip'].search([
+                ('id', '=', trip_id),
+                ('driver_id', '=', auth_result['user_id'])
+            ])
+            if not trip:
+                return self._json_response({
+                    'error': 'Viaje no encontrado o sin permisos',
+                    'code': 404
+                }, 404)
+
+            if not request.httprequest.files:
+                return self._json_response({
+                    'error': 'No se recibieron archivos',
+                    'code': 400
+                }, 400)
+
+            files_uploaded, files_rejected = store_uploaded_files(
+                request.env, request.httprequest.files, 'driverpro.trip', trip.id, link_field='document_ids'
+            )
+            max_file, max_request = get_upload_limits(request.env)
+            return self._json_response({
+                'success': bool(files_uploaded),
+                'data': {
+                    'trip_id': trip.id,
+                    'files_uploaded': files_uploaded,
+                    'files_rejected': files_rejected,
+                    'files_count': len(files_uploaded),
+                    'max_file_size': max_file,
+                    'max_request_size': max_request
+                }
+            }, 200 if files_uploaded else 400)
+
+        except Exception as e:
+            _logger.error(f"Error en upload_trip_attachments: {str(e)}")
+            return self._json_response({
+                'error': 'Error interno del servidor',
+                'message': str(e),
+                'code': 500
+            }, 500)
+
+    def _get_driver_trip_attachment(self, attachment_id, user_id):
+        """Adjunto de un viaje del chofer (por res_id o document_ids) o recordset vacío"""
+        attachment = request.env['ir.attachment'].sudo().browse(attachment_id).exists()
+        if not attachment:
+            return attachment
+        Trip = request.env['driverpro.trip']
+        owned = Trip.search_count([
+            ('driver_id', '=', user_id),
+            '|',
+            ('document_ids', 'in', attachment.ids),
+            ('id', '=', attachment.res_id if attachment.res_model == 'driverpro.trip' else 0)
+        ], limit=1)
+        return attachment if owned else attachment.browse()
+
+    @http.route('/driverpro/api/trips/<int:trip_id>/documents', type='http', auth='user', methods=['GET'], csrf=False)
+    def get_trip_documents(self, trip_id):
+        """Lista los documentos del viaje con metadatos y URL de vista previa"""
+        try:
+            auth_result = self._authenticate_driver()
+            if 'error' in auth_result:
+                return self._json_response(auth_result, auth_result['code'])
+
+            trip = request.env['driverpro.trip'].search([
+                ('id', '=', trip_id),
+                ('driver_id', '=', auth_result['user_id'])
+            ])
+            if not trip:
+                return self._json_response({
+                    'error': 'Viaje no encontrado o sin permisos',
+                    'code': 404
+                }, 404)
+
+            # Sin leer contenido: solo metadatos (tamaño, checksum y estado de la vista previa)
+            rows = request.env['ir.attachment'].sudo().search_read(
+                ['|', ('id', 'in', trip.document_ids.ids),
+                 '&', ('res_model', '=', 'driverpro.trip'), ('res_id', '=', trip.id)],
+                ['name', 'mimetype', 'file_size', 'checksum', 'driverpro_preview_state'],
+                order='id'
+            )
+            etag = compute_etag('documents', trip.id, [
+                (row['id'], row['checksum'], row['driverpro_preview_state']) for row in rows
+            ])
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
+
+            documents = [{
+                'id': row['id'],
+                'name': row['name'],
+                'mimetype': row['mimetype'],
+                'size': row['file_size'],
+                'checksum': row['checksum'],
+                'preview_state': row['driverpro_preview_state'] or 'none',
+                'preview_url': f"/driverpro/api/attachments/{row['id']}/preview" if row['driverpro_preview_state'] == 'done' else None,
+                'download_url': f"/web/content/{row['id']}?download=true",
+            } for row in rows]
+
+            return self._json_response({
+                'success': True,
+                'data': documents
+            }, etag=etag)
+
+        except Exception as e:
+            _logger.error(f"Error en get_trip_documents: {str(e)}")
+            return self._json_response({
+                'error': 'Error interno del servidor',
+                'message': str(e),
+                'code': 500
+            }, 500)
+
+    @http.route('/driverpro/api/attachments/<int:attachment_id>/preview', type='http', auth='user', methods=['GET'], csrf=False)
+    def get_attachment_preview(self, attachment_id):
+        """Devuelve la vista previa reducida (WebP/JPEG) de un documento del viaje"""
+        try:
+            auth_result = self._authenticate_driver()
+            if 'error' in auth_result:
+                return self._json_response(auth_result, auth_result['code'])
+
+            attachment = self._get_driver_trip_attachment(attachment_id, auth_result['user_id'])
+            if not attachment:
+                return self._json_response({
+                    'error': 'Documento no encontrado o sin permisos',
+                    'code': 404
+                }, 404)
+
+            if attachment.driverpro_preview_state != 'done' or not attachment.driverpro_preview:
+                return self._json_response({
+                    'error': 'Vista previa no disponible',
+                    'preview_state': attachment.driverpro_preview_state or 'none',
+                    'code': 404
+                }, 404)
+
+            # El contenido no cambia para un mismo checksum: caché privada de larga duración
+            etag = f'"preview-{attachment.checksum or attachment.id}"'
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
+
+            return request.make_response(base64.b64decode(attachment.driverpro_preview), headers=[
+                ('Content-Type', attachment.driverpro_preview_mimetype or 'image/webp'),
+                ('ETag', etag),
+                ('Cache-Control', 'private, max-age=86400'),
+            ])
+
+        except Exception as e:
+            _logger.error(f"Error en get_attachment_preview: {str(e)}")
+            return self._json_response({
+                'error': 'Error interno del servidor',
+                'message': str(e),
+                'code': 500
+            }, 500)
+
     @http.route('/driverpro/api/trips/<int:trip_id>/start', type='http', auth='user', methods=['POST'], csrf=False)
     def start_trip(self, trip_id):
         """Inicia un viaje"""
@@ -541,6 +847,14 @@ class DriverproAPIController(http.Controller):
             if 'error' in auth_result:
                 return self._json_response(auth_result, auth_result['code'])
 
+            # Respuesta condicional sobre el catálogo de motivos activos
+            etag = compute_etag(
+                'pause_reasons', request.env.lang,
+                pause_reasons_fingerprint(request.env.cr)
+            )
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
+
             # Buscar motivos activos
             reasons = request.env['driverpro.pause.reason'].search([
                 ('active', '=', True)
@@ -558,7 +872,7 @@ class DriverproAPIController(http.Controller):
             return self._json_response({
                 'success': True,
                 'data': reasons_data
-            })
+            }, etag=etag)
 
         except Exception as e:
             _logger.error(f"Error en get_pause_reasons: {str(e)}")
@@ -662,7 +976,6 @@ class DriverproAPIController(http.Controller):
 
             user_id = auth_result['user_id']
             user = request.env.user
-            partner = user.partner_id
 
             # Verificar si ya tiene una búsqueda activa
             existing_search = request.env['driverpro.empty_trip'].search([
@@ -687,10 +1000,8 @@ class DriverproAPIController(http.Controller):
                 if 'wait_limit_minutes' in data:
                     data['wait_limit_minutes'] = int(data['wait_limit_minutes'])
 
-            # Buscar vehículo asignado en Fleet
-            vehicle = request.env['fleet.vehicle'].search([
-                ('driver_id', '=', partner.id)
-            ], limit=1)
+            # Vehículo asignado en Fleet (cacheado por chofer)
+            vehicle = request.env['driverpro.assignment.resolver'].resolve(user)[0]
 
             if not vehicle:
                 return self._json_response({
@@ -745,6 +1056,8 @@ class DriverproAPIController(http.Controller):
             page = int(request.httprequest.args.get('page', 1))
             limit = int(request.httprequest.args.get('limit', 10))
             offset = (page - 1) * limit
+            cursor = request.httprequest.args.get('cursor')
+            with_count = self._is_truthy(request.httprequest.args.get('with_count'))
 
             # Filtro de fecha: última semana
             from datetime import datetime, timedelta
@@ -755,80 +1068,64 @@ class DriverproAPIController(http.Controller):
                 ('driver_id', '=', user_id),
                 ('create_date', '>=', week_ago.strftime('%Y-%m-%d %H:%M:%S'))
             ]
-            
-            # Contar total
-            total_count = request.env['driverpro.empty_trip'].search_count(domain)
-            
-            # Obtener registros paginados
-            empty_trips = request.env['driverpro.empty_trip'].search(
-                domain,
-                order='create_date desc',
-                limit=limit,
-                offset=offset
+
+            # Respuesta condicional; con búsquedas activas la huella cambia cada minuto
+            fingerprint = empty_trips_fingerprint(request.env.cr, user_id, week_ago)
+            etag = compute_etag(
+                'empty_trips', user_id, request.env.user.tz, page, limit, cursor, with_count,
+                fingerprint, datetime.now().strftime('%Y-%m-%dT%H:%M') if fingerprint[3] else None
             )
+            if self._is_not_modified(etag):
+                return self._not_modified_response(etag)
 
-            trips_data = []
-            for trip in empty_trips:
-                # Calcular tiempo restante con conversión de timezone
-                time_remaining = 0
-                wait_limit_time = None
-                
-                if trip.started_at and trip.wait_limit_minutes > 0:
-                    from datetime import datetime, timedelta
-                    # Convertir started_at a timezone del usuario
-                    started_local = self._convert_to_user_timezone(trip.started_at)
-                    started = started_local.replace(tzinfo=None)  # Para cálculo sin tz
-                    limit_time = started + timedelta(minutes=trip.wait_limit_minutes)
-                    wait_limit_time = limit_time.isoformat()
-                    
-                    if trip.state == 'searching':
-                        # Usar hora local del usuario para el cálculo
-                        user_tz = request.env.user.tz or 'America/Mexico_City'
-                        timezone = pytz.timezone(user_tz)
-                        now_local = datetime.now(timezone).replace(tzinfo=None)
-                        
-                        if now_local < limit_time:
-                            diff = limit_time - now_local
-                            time_remaining = int(diff.total_seconds() / 60)  # en minutos
-
-                # Datos del vehículo (reemplaza assignment_data)
-                vehicle_data = None
-                if trip.vehicle_id:
-                    vehicle_data = {
-                        'id': trip.vehicle_id.id,
-                        'license_plate': trip.vehicle_id.license_plate,
-                        'brand': trip.vehicle_id.brand_id.name if trip.vehicle_id.brand_id else '',
-                        'model': trip.vehicle_id.model_id.name if trip.vehicle_id.model_id else '',
-                    }
-
-                trips_data.append({
-                    'id': trip.id,
-                    'search_number': trip.name,
-                    'state': trip.state,
-                    'search_location': trip.search_location,
-                    'wait_limit_minutes': trip.wait_limit_minutes,
-                    'wait_limit_time': wait_limit_time,
-                    'time_remaining': time_remaining,
-                    'create_date': self._convert_to_user_timezone(trip.create_date).isoformat() if trip.create_date else None,
-                    'started_at': self._convert_to_user_timezone(trip.started_at).isoformat() if trip.started_at else None,
-                    'converted_at': self._convert_to_user_timezone(trip.converted_at).isoformat() if trip.converted_at else None,
-                    'cancelled_at': self._convert_to_user_timezone(trip.cancelled_at).isoformat() if trip.cancelled_at else None,
-                    'converted_trip_id': trip.converted_trip_id.id if trip.converted_trip_id else None,
-                    'converted_trip_name': trip.converted_trip_id.name if trip.converted_trip_id else None,
-                    'comments': getattr(trip, 'comments', ''),
-                    'vehicle_id': vehicle_data,
-                })
+            EmptyTrip = request.env['driverpro.empty_trip']
+            next_cursor = None
+            if cursor is not None:
+                # Modo cursor: keyset sobre (create_date, id), total solo si se pide
+                try:
+                    empty_trips, next_cursor = search_keyset(EmptyTrip, domain, limit, cursor)
+                except ValueError as e:
+                    return self._json_response({
+                        'error': str(e),
+                        'code': 400
+                    }, 400)
+                total_count = EmptyTrip.search_count(domain) if with_count else None
+            else:
+                # Contar total
+                total_count = EmptyTrip.search_count(domain)
 
-            return self._json_response({
-                'success': True,
-                'data': trips_data,
-                'pagination': {
+                # Obtener registros paginados
+                empty_trips = EmptyTrip.search(
+                    domain,
+                    order='create_date desc',
+                    limit=limit,
+                    offset=offset
+                )
+
+            trips_data = EmptyTripSerializer(request.env).serialize(empty_trips)
+
+            if cursor is not None:
+                pagination = {
+                    'count': len(trips_data),
+                    'limit': limit,
+                    'next_cursor': next_cursor,
+                    'has_more': bool(next_cursor)
+                }
+                if total_count is not None:
+                    pagination['total'] = total_count
+            else:
+                pagination = {
                     'page': page,
                     'limit': limit,
                     'total': total_count,
                     'pages': (total_count + limit - 1) // limit  # Ceiling division
                 }
-            })
+
+            return self._json_response({
+                'success': True,
+                'data': trips_data,
+                'pagination': pagination
+            }, etag=etag)
 
         except Exception as e:
             _logger.error(f"Error en get_empty_trips: {str(e)}")
@@ -917,6 +1214,102 @@ class DriverproAPIController(http.Controller):
                 'code': 500
             }, 500)
 
+    @http.route('/driverpro/api/sync', type='http', auth='user', methods=['GET'], csrf=False)
+    def sync_changes(self, since=None):
+        """Devuelve solo los cambios del chofer posteriores al token indicado"""
+        try:
+            auth_result = self._authenticate_driver()
+            if 'error' in auth_result:
+                return self._json_response(auth_result, auth_result['code'])
+
+            user_id = auth_result['user_id']
+
+            try:
+                since = int(since) if since else 0
+            except ValueError:
+                return self._json_response({
+                    'error': 'El parámetro since debe ser un token numérico',
+                    'code': 400
+                }, 400)
+
+            Tombstone = request.env['driverpro.sync.tombstone'].sudo()
+
+            # Tokens anteriores a tombstones ya depurados requieren sincronización completa
+            full_sync = since <= 0 or since < Tombstone._get_watermark()
+
+            if full_sync:
+                # Sincronización completa: misma ventana de una semana que los listados
+                from datetime import datetime, timedelta
+                week_ago = datetime.now() - timedelta(days=7)
+                change_domain = [('create_date', '>=', week_ago.strftime('%Y-%m-%d %H:%M:%S'))]
+                since = 0
+            else:
+                change_domain = [('sync_version', '>', since)]
+
+            trips = request.env['driverpro.trip'].search(
+                [('driver_id', '=', user_id)] + change_domain,
+                order='sync_version, id'
+            )
+            empty_trips = request.env['driverpro.empty_trip'].search(
+                [('driver_id', '=', user_id)] + change_domain,
+                order='sync_version, id'
+            )
+            pauses = request.env['driverpro.trip.pause'].search(
+                [('trip_id.driver_id', '=', user_id)] + change_domain,
+                order='sync_version, id'
+            )
+            tombstones = Tombstone.search([
+                ('user_id', '=', user_id),
+                ('sync_version', '>', since)
+            ]) if not full_sync else Tombstone.browse()
+
+            # Tarjeta actual del chofer (solo si cambió su saldo o datos)
+            card_data = None
+            card = request.env['driverpro.assignment.resolver'].resolve(request.env.user)[1]
+            if card and (full_sync or card.sync_version > since):
+                card_data = {
+                    'id': card.id,
+                    'name': card.name,
+                    'balance': card.balance
+                }
+
+            # El nuevo token es la versión más alta entregada
+            versions = [since]
+            versions += trips.mapped('sync_version')
+            versions += empty_trips.mapped('sync_version')
+            versions += pauses.mapped('sync_version')
+            versions += tombstones.mapped('sync_version')
+            if card_data:
+                versions.append(card.sync_version)
+            if full_sync:
+                # Aunque no haya filas en la ventana, el token es la marca más alta ya confirmada
+                versions.append(request.env['driverpro.sync.mixin'].sudo()._sync_high_water_mark(user_id, card))
+            token = max(version or 0 for version in versions)
+
+            return self._json_response({
+                'success': True,
+                'data': {
+                    'token': str(token),
+                    'full_sync': full_sync,
+                    'trips': TripSerializer(request.env).serialize(trips),
+                    'empty_trips': EmptyTripSerializer(request.env).serialize(empty_trips),
+                    'pauses': PauseSerializer(request.env).serialize(pauses),
+                    'card': card_data,
+                    'deleted': [{
+                        'model': tombstone.res_model,
+                        'id': tombstone.res_id
+                    } for tombstone in tombstones]
+                }
+            })
+
+        except Exception as e:
+            _logger.error(f"Error en sync_changes: {str(e)}")
+            return self._json_response({
+                'error': 'Error interno del servidor',
+                'message': str(e),
+                'code': 500
+            }, 500)
+
     @http.route('/driverpro/api/health', type='http', auth='none', methods=['GET'], csrf=False)
     def health_check(self):
         """Endpoint de health check"""
@@ -4,9 +4,22 @@ from odoo import http
 from odoo.http import request
 import json
 import logging
+import time
+from datetime import datetime, timedelta
+
+from ..utils.notification_dispatcher import can_wait, wait_for_notifications
 
 _logger = logging.getLogger(__name__)
 
+# Espera por defecto y máxima del long-poll (segundos)
+LONGPOLL_DEFAULT_TIMEOUT = 25
+LONGPOLL_MAX_TIMEOUT = 50
+
+# Stream SSE: heartbeat, duración máxima antes de que el cliente reconecte y pausa de reconexión
+SSE_HEARTBEAT = 20
+SSE_MAX_DURATION = 300
+SSE_RETRY_MS = 3000
+
 
 class DriverProNotifications(http.Controller):
 
@@ -39,25 +52,58 @@ class DriverProNotifications(http.Controller):
 
     @http.route('/driverpro/api/check-notifications', type='http', auth='user', methods=['POST'], csrf=False)
     def check_notifications(self):
-        """Endpoint alternativo para verificar notificaciones cuando longpolling no está disponible"""
+        """
+        Feed de notificaciones por cursor con espera (long-poll)
+
+        Body JSON: {"last": <id de la última notificación recibida>, "timeout": <segundos>}
+        Responde en cuanto existen notificaciones con id > last, o con una lista
+        vacía al agotarse el timeout. Sin "last" (primera conexión) se entregan
+        las notificaciones recientes, igual que el bus de Odoo.
+
+        La espera solo ocurre en el worker gevent (gevent_port, 8072) y al
+        iterar el cuerpo de la respuesta, cuando Odoo ya liberó el cursor de la
+        petición. En un worker prefork la respuesta es inmediata (timeout 0).
+        """
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Allow-Methods', 'POST, GET, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type')
+        ]
         try:
-            # Por ahora, solo retornamos array vacío para que el test del bus funcione
-            # En el futuro se puede implementar un sistema de polling corto
-            response_data = {
-                'jsonrpc': '2.0',
-                'result': [],  # Sin notificaciones pendientes
-                'id': None
-            }
-            
-            return request.make_response(
-                json.dumps(response_data),
-                headers=[
-                    ('Content-Type', 'application/json'),
-                    ('Access-Control-Allow-Origin', '*'),
-                    ('Access-Control-Allow-Methods', 'POST, GET, OPTIONS'),
-                    ('Access-Control-Allow-Headers', 'Content-Type')
-                ]
-            )
+            params = {}
+            if request.httprequest.data:
+                params = json.loads(request.httprequest.data.decode('utf-8'))
+            user_id = request.env.user.id
+            registry = request.env.registry
+
+            try:
+                last = int(params.get('last') or 0)
+                timeout = float(params.get('timeout', LONGPOLL_DEFAULT_TIMEOUT))
+            except (TypeError, ValueError):
+                last, timeout = 0, LONGPOLL_DEFAULT_TIMEOUT
+            timeout = max(0.0, min(timeout, LONGPOLL_MAX_TIMEOUT)) if can_wait() else 0.0
+
+            if last <= 0:
+                # Primera conexión: partir de las notificaciones recientes
+                recent = datetime.now() - timedelta(seconds=LONGPOLL_MAX_TIMEOUT)
+                last = request.env['driverpro.notification'].sudo()._cursor_before(user_id, recent)
+
+            if not timeout:
+                notifications = request.env['driverpro.notification'].sudo()._fetch_since(user_id, last)
+                return request.make_response(self._poll_body(notifications, last), headers=headers)
+
+            def wait_body():
+                try:
+                    notifications = wait_for_notifications(registry, user_id, last, timeout)
+                except Exception as e:
+                    _logger.error(f"Error en long-poll de notificaciones: {str(e)}")
+                    notifications = []
+                yield self._poll_body(notifications, last)
+
+            response = request.make_response(wait_body(), headers=headers)
+            response.direct_passthrough = True
+            return response
             
         except Exception as e:
             _logger.error(f"Error in check_notifications: {str(e)}")
@@ -80,6 +126,74 @@ class DriverProNotifications(http.Controller):
                 status=500
             )
 
+    def _poll_body(self, notifications, last):
+        """Cuerpo JSON del long-poll con las notificaciones y el nuevo cursor"""
+        if notifications:
+            last = notifications[-1]['id']
+        return json.dumps({
+            'jsonrpc': '2.0',
+            'result': notifications,
+            'last': last,
+            'id': None
+        }, default=str, ensure_ascii=False)
+
+    @http.route('/driverpro/api/notifications/stream', type='http', auth='user', methods=['GET'], csrf=False)
+    def stream_notifications(self, last_event_id=None):
+        """
+        Stream Server-Sent Events con las notificaciones del chofer
+
+        Multiplexa eventos de viajes, búsquedas, recargas y vehículos sobre una
+        sola respuesta. El cliente reanuda con el encabezado Last-Event-ID (o el
+        parámetro last_event_id) y recibe lo emitido mientras estuvo desconectado.
+
+        En el worker gevent (gevent_port, 8072) el stream dura hasta
+        SSE_MAX_DURATION y cierra para que el cliente reconecte. En un worker
+        prefork es un stream corto: entrega lo pendiente y cierra, y el cliente
+        reconecta tras SSE_RETRY_MS con Last-Event-ID.
+        """
+        user_id = request.env.user.id
+        registry = request.env.registry
+        try:
+            last = int(request.httprequest.headers.get('Last-Event-ID') or last_event_id or 0)
+        except (TypeError, ValueError):
+            last = 0
+        if last <= 0:
+            # Conexión nueva: solo eventos desde ahora
+            last = request.env['driverpro.notification'].sudo()._cursor_before(user_id, datetime.now())
+        duration = SSE_MAX_DURATION if can_wait() else 0
+
+        def event_stream(last):
+            # El cursor de la petición ya se liberó: cada lectura usa uno propio y breve
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            deadline = time.monotonic() + duration
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    notifications = wait_for_notifications(
+                        registry, user_id, last, min(SSE_HEARTBEAT, max(remaining, 0))
+                    )
+                except Exception as e:
+                    _logger.error(f"Error en stream de notificaciones: {str(e)}")
+                    return
+                for notification in notifications:
+                    data = json.dumps(notification['message']['payload'], default=str, ensure_ascii=False)
+                    yield f"id: {notification['id']}\ndata: {data}\n\n"
+                if notifications:
+                    last = notifications[-1]['id']
+                if time.monotonic() >= deadline:
+                    return
+                if not notifications:
+                    # Heartbeat para mantener viva la conexión a través de proxies
+                    yield ": heartbeat\n\n"
+
+        response = request.make_response(event_stream(last), headers=[
+            ('Content-Type', 'text/event-stream; charset=utf-8'),
+            ('Cache-Control', 'no-cache'),
+            ('X-Accel-Buffering', 'no'),
+        ])
+        response.direct_passthrough = True
+        return response
+
     @http.route('/driverpro/api/notify', type='http', auth='user', methods=['POST'], csrf=False)
     def send_notification(self):
         """Envía una notificación al partner actual (para pruebas)"""
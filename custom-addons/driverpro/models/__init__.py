@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from . import driverpro_sync
+from . import driverpro_trip_event
 from . import driverpro_card
 from . import driverpro_trip
 from . import driverpro_empty_trip
 from . import driverpro_installer
 from . import driverpro_push_subscription
+from . import driverpro_push_outbox
+from . import driverpro_notification
+from . import driverpro_assignment_resolver
 from . import fleet_vehicle
+from . import res_users
+from . import ir_attachment
 # from . import driverpro_assignment  # Deshabilitado - se usa Fleet directamente
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, tools
+from odoo.modules import registry as odoo_registry
+from odoo.tools.lru import LRU
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Caché propio del registro para las asignaciones: se vacía y se señaliza a
+# los demás procesos sin tocar el caché 'default'
+ASSIGNMENT_CACHE = 'driverpro_assignments'
+ASSIGNMENT_CACHE_SIZE = 4096
+
+odoo_registry._REGISTRY_CACHES.setdefault(ASSIGNMENT_CACHE, ASSIGNMENT_CACHE_SIZE)
+odoo_registry._CACHES_BY_KEY.setdefault(ASSIGNMENT_CACHE, (ASSIGNMENT_CACHE,))
+
+# Fila de generación usada antes del caché propio; se elimina al actualizar
+OBSOLETE_GENERATION_TABLE = 'driverpro_assignment_generation'
+OBSOLETE_GENERATION_SEQUENCE = 'driverpro_assignment_generation_seq'
+
+
+class DriverproAssignmentResolver(models.AbstractModel):
+    """
+    Resuelve la cadena chofer → contacto → vehículo (Fleet) → tarjeta activa
+
+    Los resultados se guardan en un caché propio del registro
+    (ASSIGNMENT_CACHE) por id de usuario o de vehículo. fleet.vehicle,
+    driverpro.card y res.users lo vacían solo cuando cambia de verdad una
+    asignación; la invalidación se propaga a los demás procesos con la
+    señalización de cachés del registro, así que la creación de viajes no
+    hace búsquedas ni lecturas adicionales mientras las asignaciones no
+    cambien, y el resto de los cachés no se vacía.
+    """
+    _name = 'driverpro.assignment.resolver'
+    _description = 'Resolución de Asignaciones Driver Pro'
+
+    def init(self):
+        """Elimina la fila de generación de versiones anteriores"""
+        super().init()
+        self._cr.execute(f"DROP TABLE IF EXISTS {OBSOLETE_GENERATION_TABLE}")
+        self._cr.execute(f"DROP SEQUENCE IF EXISTS {OBSOLETE_GENERATION_SEQUENCE}")
+
+    def _register_hook(self):
+        """
+        Registra el caché de asignaciones en el registro ya creado
+
+        El registro crea sus cachés y su señalización antes de importar los
+        módulos, así que el primer registro del proceso no conoce todavía
+        ASSIGNMENT_CACHE.
+        """
+        super()._register_hook()
+        caches = self.pool._Registry__caches
+        if ASSIGNMENT_CACHE not in caches:
+            caches[ASSIGNMENT_CACHE] = LRU(ASSIGNMENT_CACHE_SIZE)
+        if not self.pool.in_test_mode() and ASSIGNMENT_CACHE not in self.pool.cache_sequences:
+            self.pool.setup_signaling()
+
+    @api.model
+    def resolve(self, user):
+        """
+        Vehículo y tarjeta activa asignados a un chofer
+
+        Args:
+            user: registro res.users (o id)
+
+        Returns:
+            tuple: (fleet.vehicle, driverpro.card), recordsets vacíos si no hay asignación
+        """
+        user_id = user.id if isinstance(user, models.BaseModel) else user
+        vehicle_id, card_id = self._get_assignment_ids(user_id) if user_id else (False, False)
+        return (
+            self.env['fleet.vehicle'].browse(vehicle_id or []),
+            self.env['driverpro.card'].browse(card_id or []),
+        )
+
+    @api.model
+    def resolve_vehicle_card(self, vehicle):
+        """Tarjeta activa de un vehículo (registro o id); recordset vacío si no tiene"""
+        vehicle_id = vehicle.id if isinstance(vehicle, models.BaseModel) else vehicle
+        card_id = self._get_vehicle_card_id(vehicle_id) if vehicle_id else False
+        return self.env['driverpro.card'].browse(card_id or [])
+
+    @api.model
+    @tools.ormcache('user_id', cache=ASSIGNMENT_CACHE)
+    def _get_assignment_ids(self, user_id):
+        """Ids (vehículo, tarjeta) del chofer; independiente de los permisos del usuario actual"""
+        user = self.env['res.users'].sudo().browse(user_id)
+        if not user.exists() or not user.partner_id:
+            return (False, False)
+        vehicle = self.env['fleet.vehicle'].sudo().search([
+            ('driver_id', '=', user.partner_id.id)
+        ], limit=1)
+        if not vehicle:
+            return (False, False)
+        return (vehicle.id, self._get_vehicle_card_id(vehicle.id))
+
+    @api.model
+    @tools.ormcache('vehicle_id', cache=ASSIGNMENT_CACHE)
+    def _get_vehicle_card_id(self, vehicle_id):
+        """Id de la tarjeta activa del vehículo o False"""
+        card = self.env['driverpro.card'].sudo().search([
+            ('vehicle_id', '=', vehicle_id),
+            ('active', '=', True)
+        ], limit=1)
+        return card.id or False
+
+    @api.model
+    def _assignment_values(self, records, field_names):
+        """Valores de los campos de asignación por registro, para detectar cambios reales"""
+        return {record.id: tuple(record[name] for name in field_names) for record in records}
+
+    @api.model
+    def _invalidate(self):
+        """
+        Vacía solo el caché de asignaciones
+
+        Los demás procesos lo vacían al confirmarse la transacción; si se
+        revierte, el registro restablece sus cachés.
+        """
+        self.env.registry.clear_cache(ASSIGNMENT_CACHE)
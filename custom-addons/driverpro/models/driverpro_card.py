@@ -2,17 +2,52 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import float_compare
+from odoo.tools.sql import create_index, drop_index
+from psycopg2.errors import LockNotAvailable
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Índices declarados: (nombre, expresiones, condición parcial)
+CARD_INDEXES = [
+    # Tarjeta activa del vehículo
+    ('driverpro_card_vehicle_active_idx', ['vehicle_id'], 'active'),
+]
+
+RECHARGE_INDEXES = [
+    # Totales de recargas confirmadas por tarjeta
+    ('driverpro_card_recharge_card_state_idx', ['card_id', 'state'], ''),
+]
+
+MOVEMENT_INDEXES = [
+    # Último saldo acumulado de la tarjeta (orden del acumulado)
+    ('driverpro_card_movement_card_id_id_idx', ['card_id', 'id DESC'], ''),
+    # Saldo a una fecha: mismo filtro y mismo orden que balance_at
+    ('driverpro_card_movement_card_create_date_id_idx', ['card_id', 'create_date DESC', 'id DESC'], ''),
+    # Agregados por tipo de movimiento (permite index-only scan)
+    ('driverpro_card_movement_card_type_amount_idx', ['card_id', 'movement_type', 'amount'], ''),
+]
+
+# Índices que ya no se usan y se eliminan al actualizar
+OBSOLETE_MOVEMENT_INDEXES = [
+    'driverpro_card_movement_card_id_create_date_idx',
+]
+
+# Campos de la tarjeta que cambian la resolución vehículo → tarjeta activa
+ASSIGNMENT_FIELDS = ('vehicle_id', 'active')
+
+# Espera máxima por el bloqueo de una tarjeta ocupada por otro consumo (lock_timeout)
+CONSUME_LOCK_TIMEOUT = '5s'
+
 
 class DriverproCard(models.Model):
     """Tarjeta de recarga ligada a vehículo"""
     _name = 'driverpro.card'
     _description = 'Tarjeta Driver Pro'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'driverpro.sync.mixin']
     _order = 'name desc'
+    _sync_user_field = None
 
     name = fields.Char(
         string='Número de Tarjeta',
@@ -131,19 +166,176 @@ class DriverproCard(models.Model):
         help="Notas adicionales sobre la tarjeta con formato enriquecido"
     )
 
-    @api.depends('movement_ids.amount', 'movement_ids.movement_type')
+    def init(self):
+        """Índices de búsqueda de tarjetas"""
+        super().init()
+        for name, expressions, where in CARD_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Invalidar el caché de asignaciones al dar de alta tarjetas activas con vehículo"""
+        cards = super().create(vals_list)
+        if cards.filtered(lambda card: card.active and card.vehicle_id):
+            self.env['driverpro.assignment.resolver']._invalidate()
+        return cards
+
+    def write(self, vals):
+        """Invalidar el caché de asignaciones si cambia el vehículo o el archivado de la tarjeta"""
+        resolver = self.env['driverpro.assignment.resolver']
+        tracked = [name for name in ASSIGNMENT_FIELDS if name in vals]
+        before = resolver._assignment_values(self, tracked) if tracked else None
+        result = super().write(vals)
+        if tracked and resolver._assignment_values(self, tracked) != before:
+            resolver._invalidate()
+        return result
+
+    def unlink(self):
+        """Invalidar el caché de asignaciones al eliminar tarjetas activas con vehículo"""
+        assigned = bool(self.filtered(lambda card: card.active and card.vehicle_id))
+        result = super().unlink()
+        if assigned:
+            self.env['driverpro.assignment.resolver']._invalidate()
+        return result
+
+    @api.depends('movement_ids.amount', 'movement_ids.movement_type', 'movement_ids.balance_after')
     def _compute_balance(self):
-        """Calcula el saldo actual basado en movimientos"""
-        for card in self:
+        """Calcula el saldo actual leyendo el saldo acumulado del último movimiento"""
+        cards = self.filtered('id')
+        balances = cards._get_ledger_balances() if cards else {}
+        for card in cards:
+            card.balance = balances.get(card.id, 0.0)
+
+        # Registros nuevos (formularios sin guardar): no existen en base de datos
+        for card in self - cards:
             total_in = sum(card.movement_ids.filtered(lambda m: m.movement_type == 'in').mapped('amount'))
             total_out = sum(card.movement_ids.filtered(lambda m: m.movement_type == 'out').mapped('amount'))
             card.balance = total_in - total_out
 
+    def _sync_owner_ids(self):
+        """Choferes que reciben la tarjeta: usuarios del conductor de su vehículo"""
+        partners = self.sudo().vehicle_id.driver_id
+        if not partners:
+            return set()
+        return set(self.env['res.users'].sudo().search([('partner_id', 'in', partners.ids)]).ids)
+
+    def _get_ledger_balances(self):
+        """Saldo acumulado del último movimiento de cada tarjeta (una búsqueda por índice)"""
+        Movement = self.env['driverpro.card.movement']
+        Movement.flush_model(['card_id', 'balance_after'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (card_id) card_id, balance_after
+              FROM driverpro_card_movement
+             WHERE card_id IN %s
+          ORDER BY card_id, id DESC
+        """, [tuple(self.ids)])
+        return {card_id: balance or 0.0 for card_id, balance in self.env.cr.fetchall()}
+
+    def _get_aggregate_balances(self):
+        """Saldo por suma completa del libro mayor, usado para verificar el acumulado"""
+        totals = {}
+        groups = self.env['driverpro.card.movement']._read_group(
+            [('card_id', 'in', self.ids)],
+            ['card_id', 'movement_type'],
+            ['amount:sum']
+        )
+        for card, movement_type, amount in groups:
+            sign = 1 if movement_type == 'in' else -1
+            totals[card.id] = totals.get(card.id, 0.0) + sign * amount
+        return totals
+
+    def balance_at(self, date):
+        """
+        Saldo de la tarjeta en una fecha dada
+
+        balance_after se acumula en orden de registro (ver
+        _rebuild_running_balance), así que se filtra por create_date y no por
+        movement_date: la fecha de negocio puede ser retroactiva (p. ej. la
+        fecha de una recarga) y no sigue el orden del acumulado. El saldo
+        devuelto es siempre un estado real del libro mayor y la búsqueda es
+        una sola lectura del índice (card_id, create_date DESC, id DESC).
+
+        Args:
+            date: datetime UTC; se toma el último movimiento registrado hasta esa fecha
+
+        Returns:
+            float: saldo acumulado a esa fecha
+        """
+        self.ensure_one()
+        self.env['driverpro.card.movement'].flush_model(['card_id', 'create_date', 'balance_after'])
+        self.env.cr.execute("""
+            SELECT balance_after
+              FROM driverpro_card_movement
+             WHERE card_id = %s AND create_date <= %s
+          ORDER BY create_date DESC, id DESC
+             LIMIT 1
+        """, [self.id, date])
+        row = self.env.cr.fetchone()
+        return (row[0] or 0.0) if row else 0.0
+
+    def _check_running_balance(self):
+        """
+        Compara el saldo acumulado contra la suma completa de movimientos
+
+        Returns:
+            dict: {card_id: (saldo_acumulado, saldo_agregado)} de las tarjetas inconsistentes
+        """
+        cards = self or self.search([])
+        if not cards:
+            return {}
+        ledger = cards._get_ledger_balances()
+        aggregate = cards._get_aggregate_balances()
+        mismatches = {}
+        for card in cards:
+            running = ledger.get(card.id, 0.0)
+            expected = aggregate.get(card.id, 0.0)
+            if float_compare(running, expected, precision_digits=2):
+                mismatches[card.id] = (running, expected)
+                _logger.warning(f"Saldo acumulado inconsistente en tarjeta {card.name}: {running} vs {expected}")
+        return mismatches
+
+    def action_rebuild_running_balance(self):
+        """Reconstruye el saldo acumulado de los movimientos de la tarjeta"""
+        mismatches = self._check_running_balance()
+        self.env['driverpro.card.movement']._rebuild_running_balance(self.ids)
+        for card in self:
+            if card.id in mismatches:
+                running, expected = mismatches[card.id]
+                card.message_post(body=_('Saldo acumulado reconstruido: %s → %s') % (running, expected))
+        return True
+
     @api.depends('recharge_ids.amount', 'recharge_ids.payment_amount', 'recharge_ids.state', 'trip_ids.consumed_credits')
     def _compute_totals(self):
-        """Calcula totales de recargas y consumo"""
-        for card in self:
+        """Calcula totales de recargas y consumo con agregados SQL por lote"""
+        cards = self.filtered('id')
+        recharges = {}
+        consumption = {}
+        if cards:
             # Solo sumar recargas confirmadas
+            recharges = {
+                card.id: (amount, payment_amount)
+                for card, amount, payment_amount in self.env['driverpro.card.recharge']._read_group(
+                    [('card_id', 'in', cards.ids), ('state', '=', 'confirmed')],
+                    ['card_id'],
+                    ['amount:sum', 'payment_amount:sum']
+                )
+            }
+            consumption = {
+                card.id: consumed
+                for card, consumed in self.env['driverpro.trip']._read_group(
+                    [('card_id', 'in', cards.ids), ('state', 'in', ['active', 'paused', 'done'])],
+                    ['card_id'],
+                    ['consumed_credits:sum']
+                )
+            }
+        for card in cards:
+            amount, payment_amount = recharges.get(card.id, (0, 0.0))
+            card.total_recharges = amount
+            card.total_payment_amount = payment_amount
+            card.total_consumption = consumption.get(card.id, 0.0)
+
+        # Registros nuevos (formularios sin guardar): no existen en base de datos
+        for card in self - cards:
             confirmed_recharges = card.recharge_ids.filtered(lambda r: r.state == 'confirmed')
             card.total_recharges = sum(confirmed_recharges.mapped('amount'))
             card.total_payment_amount = sum(confirmed_recharges.mapped('payment_amount'))
@@ -190,10 +382,35 @@ class DriverproCard(models.Model):
             'context': {'default_card_id': self.id}
         }
 
+    def _lock_for_consumption(self):
+        """Bloquea la fila de la tarjeta esperando como máximo CONSUME_LOCK_TIMEOUT"""
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("SELECT set_config('lock_timeout', %s, true)", [CONSUME_LOCK_TIMEOUT])
+                self.env.cr.execute("SELECT id FROM driverpro_card WHERE id = %s FOR UPDATE", [self.id])
+                self.env.cr.execute("SET LOCAL lock_timeout = DEFAULT")
+        except LockNotAvailable:
+            # Otra transacción retiene la tarjeta más de lo esperado
+            raise UserError(_('La tarjeta %s está siendo utilizada por otra operación. '
+                              'Intente de nuevo en unos segundos.') % self.name)
+
     def consume_credit(self, amount=1.0, reference=None):
-        """Consume créditos de la tarjeta"""
-        if self.balance < amount:
-            raise UserError(_('Saldo insuficiente en la tarjeta. Saldo actual: %s') % self.balance)
+        """
+        Consume créditos de la tarjeta con bloqueo de fila
+
+        Todo movimiento escribe la fila de la tarjeta (versión de
+        sincronización) en su transacción. Un consumidor cuya instantánea es
+        anterior al commit de otro consumo falla al bloquear la fila con un
+        error de serialización (REPEATABLE READ) y Odoo reintenta la petición
+        con una instantánea nueva; con el bloqueo tomado, el saldo leído
+        incluye todo consumo confirmado.
+        """
+        self.ensure_one()
+        self._lock_for_consumption()
+
+        balance = self._get_ledger_balances().get(self.id, 0.0)
+        if float_compare(balance, amount, precision_digits=2) < 0:
+            raise UserError(_('Saldo insuficiente en la tarjeta. Saldo actual: %s') % balance)
         
         # Crear movimiento de salida
         self.env['driverpro.card.movement'].create({
@@ -348,6 +565,11 @@ class DriverproCardRecharge(models.Model):
         help="Notas adicionales sobre la recarga con formato enriquecido"
     )
 
+    def init(self):
+        """Índices de recargas por tarjeta"""
+        for name, expressions, where in RECHARGE_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+
     @api.onchange('card_id')
     def _onchange_card_id(self):
         """Genera el nombre automáticamente cuando se selecciona una tarjeta"""
@@ -513,11 +735,7 @@ class DriverproCardRecharge(models.Model):
                         }
                         
                         # Enviar notificación específica al usuario
-                        self.env['bus.bus']._sendone(
-                            f'driverpro_notifications_{driver_user.id}',
-                            'notification',
-                            bus_message
-                        )
+                        self.env['driverpro.notification']._notify(driver_user, bus_message)
                         
                         _logger.info(f"Notificación de recarga enviada al usuario {driver_user.id} - Tarjeta {recharge.card_id.name}")
                         
@@ -627,6 +845,110 @@ class DriverproCardMovement(models.Model):
         store=True
     )
 
+    balance_after = fields.Float(
+        string='Saldo Resultante',
+        readonly=True,
+        copy=False,
+        help="Saldo de la tarjeta después de aplicar este movimiento"
+    )
+
+    def init(self):
+        """Índices del libro mayor y relleno del saldo acumulado en registros existentes"""
+        for name, expressions, where in MOVEMENT_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+        for name in OBSOLETE_MOVEMENT_INDEXES:
+            drop_index(self._cr, name, self._table)
+        self._cr.execute("""
+            SELECT DISTINCT card_id
+              FROM driverpro_card_movement
+             WHERE balance_after IS NULL
+        """)
+        card_ids = [row[0] for row in self._cr.fetchall()]
+        if card_ids:
+            self._rebuild_running_balance(card_ids)
+            _logger.info(f"Saldo acumulado reconstruido para {len(card_ids)} tarjetas")
+
+    @api.model
+    def _lock_cards(self, card_ids):
+        """Bloquea las tarjetas (en orden de id para evitar interbloqueos)"""
+        self.env.cr.execute("""
+            SELECT id FROM driverpro_card
+             WHERE id IN %s
+          ORDER BY id
+               FOR UPDATE
+        """, [tuple(card_ids)])
+
+    @staticmethod
+    def _signed_amount(movement_type, amount):
+        """Monto con signo según el tipo de movimiento"""
+        return amount if movement_type == 'in' else -amount
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Asigna el saldo acumulado bajo bloqueo de la tarjeta y marca la sincronización"""
+        card_ids = sorted({vals['card_id'] for vals in vals_list if vals.get('card_id')})
+        if card_ids:
+            self._lock_cards(card_ids)
+            balances = self.env['driverpro.card'].browse(card_ids)._get_ledger_balances()
+            for vals in vals_list:
+                if not vals.get('card_id'):
+                    continue
+                balance = balances.get(vals['card_id'], 0.0) + self._signed_amount(
+                    vals.get('movement_type'), vals.get('amount') or 0.0
+                )
+                vals['balance_after'] = balances[vals['card_id']] = balance
+
+        movements = super().create(vals_list)
+        movements.card_id._touch_sync_version()
+        return movements
+
+    def write(self, vals):
+        """Reconstruye el saldo acumulado si cambian montos, tipo o tarjeta"""
+        cards = self.card_id
+        res = super().write(vals)
+        if {'amount', 'movement_type', 'card_id'} & set(vals):
+            cards |= self.card_id
+            self._rebuild_running_balance(cards.ids)
+        return res
+
+    def unlink(self):
+        """Reconstruye el saldo acumulado y marca las tarjetas para la sincronización"""
+        cards = self.card_id
+        res = super().unlink()
+        if cards:
+            self._rebuild_running_balance(cards.ids)
+        cards._touch_sync_version()
+        return res
+
+    @api.model
+    def _rebuild_running_balance(self, card_ids):
+        """
+        Recalcula balance_after de todos los movimientos de las tarjetas
+
+        Usa una suma acumulada por ventana en orden de inserción; sirve para
+        rellenar libros existentes y para corregir ediciones o eliminaciones.
+        """
+        if not card_ids:
+            return
+        self.flush_model()
+        self._lock_cards(card_ids)
+        self.env.cr.execute("""
+            UPDATE driverpro_card_movement m
+               SET balance_after = r.running
+              FROM (
+                    SELECT id,
+                           SUM(CASE WHEN movement_type = 'in' THEN amount ELSE -amount END)
+                               OVER (PARTITION BY card_id ORDER BY id) AS running
+                      FROM driverpro_card_movement
+                     WHERE card_id IN %s
+                   ) r
+             WHERE m.id = r.id
+               AND m.balance_after IS DISTINCT FROM r.running
+        """, [tuple(card_ids)])
+        self.invalidate_model(['balance_after'])
+        cards = self.env['driverpro.card'].browse(card_ids).exists()
+        self.env.add_to_compute(cards._fields['balance'], cards)
+
 
 class DriverproCardAssignment(models.Model):
     """Historial de asignación tarjeta-vehículo"""
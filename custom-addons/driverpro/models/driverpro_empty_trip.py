@@ -2,17 +2,30 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools.sql import create_index
 from datetime import datetime, timedelta
 import pytz
 import logging
+import threading
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Umbrales de alerta de tiempo restante (minutos), de mayor a menor
+ALERT_THRESHOLDS = (30, 15, 5)
+
+# Búsquedas procesadas por transacción en el planificador
+SCHEDULER_BATCH_SIZE = 100
+
+# Segundos de trabajo por ejecución del planificador (por debajo de limit_time_real);
+# los eventos restantes se procesan en una ejecución disparada de inmediato
+SCHEDULER_TIME_BUDGET = 60
+
 
 class DriverproEmptyTrip(models.Model):
     _name = 'driverpro.empty_trip'
     _description = 'Viajes Vacíos - Búsqueda de Clientes'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'driverpro.sync.mixin', 'driverpro.event.mixin']
     _order = 'create_date desc'
     _rec_name = 'name'
 
@@ -76,6 +89,28 @@ class DriverproEmptyTrip(models.Model):
         store=False
     )
 
+    # Vencimiento y siguiente alerta almacenados para que los crons usen índices
+    deadline_at = fields.Datetime(
+        string='Vence el',
+        compute='_compute_deadline_at',
+        store=True,
+        help="Momento en que la búsqueda se cancela automáticamente"
+    )
+
+    next_alert_at = fields.Datetime(
+        string='Próxima Alerta',
+        compute='_compute_next_alert_at',
+        store=True,
+        help="Momento de la siguiente alerta de tiempo restante pendiente"
+    )
+
+    next_event_at = fields.Datetime(
+        string='Próximo Evento',
+        compute='_compute_next_event_at',
+        store=True,
+        help="Siguiente alerta o vencimiento que debe procesar el planificador"
+    )
+
     # Alertas enviadas
     alert_30_sent = fields.Boolean('Alerta 30min enviada', default=False)
     alert_15_sent = fields.Boolean('Alerta 15min enviada', default=False)
@@ -105,6 +140,38 @@ class DriverproEmptyTrip(models.Model):
         default=lambda self: self.env.company
     )
 
+    def init(self):
+        """Índice compuesto para la paginación por cursor (driver_id, create_date, id)"""
+        super().init()
+        create_index(
+            self._cr,
+            'driverpro_empty_trip_driver_create_date_id_idx',
+            self._table,
+            ['driver_id', 'create_date DESC', 'id DESC']
+        )
+        # Índices parciales: los crons solo recorren búsquedas activas vencidas
+        create_index(
+            self._cr,
+            'driverpro_empty_trip_searching_deadline_idx',
+            self._table,
+            ['deadline_at'],
+            where="state = 'searching' AND deadline_at IS NOT NULL"
+        )
+        create_index(
+            self._cr,
+            'driverpro_empty_trip_next_alert_idx',
+            self._table,
+            ['next_alert_at'],
+            where="next_alert_at IS NOT NULL"
+        )
+        create_index(
+            self._cr,
+            'driverpro_empty_trip_next_event_idx',
+            self._table,
+            ['next_event_at', 'id'],
+            where="state = 'searching' AND next_event_at IS NOT NULL"
+        )
+
     @api.model
     def create(self, vals):
         if vals.get('name', '/') == '/':
@@ -150,9 +217,38 @@ class DriverproEmptyTrip(models.Model):
             remaining = record.wait_limit_minutes - elapsed
             record.time_remaining = max(0, int(remaining))
 
+    @api.depends('started_at', 'wait_limit_minutes')
+    def _compute_deadline_at(self):
+        """Calcula el vencimiento de la búsqueda (inicio + límite de espera)"""
+        for record in self:
+            if not record.started_at:
+                record.deadline_at = False
+                continue
+            record.deadline_at = record.started_at + timedelta(minutes=max(record.wait_limit_minutes, 0))
+
+    @api.depends('deadline_at', 'state', 'alert_30_sent', 'alert_15_sent', 'alert_5_sent')
+    def _compute_next_alert_at(self):
+        """Calcula el momento de la siguiente alerta pendiente"""
+        for record in self:
+            pending = [minutes for minutes in ALERT_THRESHOLDS if not record[f'alert_{minutes}_sent']]
+            if record.state != 'searching' or not record.deadline_at or not pending:
+                record.next_alert_at = False
+                continue
+            record.next_alert_at = record.deadline_at - timedelta(minutes=max(pending))
+
+    @api.depends('deadline_at', 'next_alert_at', 'state')
+    def _compute_next_event_at(self):
+        """Calcula el siguiente evento (alerta o vencimiento) de la búsqueda"""
+        for record in self:
+            events = [event for event in (record.next_alert_at, record.deadline_at) if event]
+            if record.state != 'searching' or not events:
+                record.next_event_at = False
+                continue
+            record.next_event_at = min(events)
+
     def action_start_search(self):
         """Inicia la búsqueda de clientes"""
-        for record in self:
+        for record in self._for_transition():
             if record.state != 'searching':
                 raise UserError(_('Solo se pueden iniciar búsquedas en estado inicial.'))
 
@@ -173,16 +269,20 @@ class DriverproEmptyTrip(models.Model):
                 'alert_5_sent': False,
             })
 
-            record.message_post(body=_('Búsqueda de clientes iniciada. Límite: %s minutos') % record.wait_limit_minutes)
+            record._log_transition('search_start', _('Búsqueda de clientes iniciada. Límite: %s minutos') % record.wait_limit_minutes,
+                                   value=record.wait_limit_minutes)
             
             # Notificación vía bus
             record._notify_driver('success', 
                                 '🔍 Búsqueda iniciada',
                                 f'Búsqueda {record.name} activa por {record.wait_limit_minutes} minutos')
 
+        # Despertar al planificador en la primera alerta de las nuevas búsquedas
+        self._schedule_scheduler_wakeup(self.mapped('next_event_at'))
+
     def action_convert_to_trip(self):
         """Convierte el viaje vacío a un viaje normal en borrador"""
-        for record in self:
+        for record in self._for_transition():
             if record.state != 'searching':
                 raise UserError(_('Solo se pueden convertir búsquedas activas.'))
 
@@ -206,7 +306,7 @@ class DriverproEmptyTrip(models.Model):
                 'converted_at': fields.Datetime.now()
             })
 
-            record.message_post(body=_('Convertido a viaje %s') % trip.name)
+            record._log_transition('search_convert', _('Convertido a viaje %s') % trip.name, note=trip.name)
             
             # Notificación vía bus
             record._notify_driver('success', 
@@ -225,7 +325,7 @@ class DriverproEmptyTrip(models.Model):
 
     def action_cancel_search(self):
         """Cancela la búsqueda de clientes"""
-        for record in self:
+        for record in self._for_transition():
             if record.state not in ['searching']:
                 raise UserError(_('Solo se pueden cancelar búsquedas activas.'))
 
@@ -239,7 +339,8 @@ class DriverproEmptyTrip(models.Model):
                 elapsed = (fields.Datetime.now() - record.started_at).total_seconds() / 60
                 elapsed_time = int(elapsed)
 
-            record.message_post(body=_('Búsqueda cancelada. Tiempo transcurrido: %s minutos') % elapsed_time)
+            record._log_transition('search_cancel', _('Búsqueda cancelada. Tiempo transcurrido: %s minutos') % elapsed_time,
+                                   value=elapsed_time)
             
             # Notificación vía bus
             record._notify_driver('info', 
@@ -251,100 +352,158 @@ class DriverproEmptyTrip(models.Model):
         if not vehicle_id:
             return False
         
-        card = self.env['driverpro.card'].search([
-            ('vehicle_id', '=', vehicle_id),
-            ('active', '=', True)
-        ], limit=1)
-        
-        return card.id if card else False
+        return self.env['driverpro.assignment.resolver'].resolve_vehicle_card(vehicle_id).id or False
 
     @api.model
     def check_time_alerts(self):
-        """Método para verificar y enviar alertas (ejecutado por cron)"""
-        searching_trips = self.search([('state', '=', 'searching')])
-        alerts_sent = 0
-
-        for trip in searching_trips:
-            if trip.time_remaining <= 0:
-                # Tiempo agotado - cancelar automáticamente
-                trip.action_cancel_search()
-                trip.message_post(body=_('Búsqueda cancelada automáticamente por tiempo agotado.'))
-                alerts_sent += 1
-            elif trip.time_remaining <= 5 and not trip.alert_5_sent:
-                trip.alert_5_sent = True
-                trip._send_alert(5)
-                alerts_sent += 1
-            elif trip.time_remaining <= 15 and not trip.alert_15_sent:
-                trip.alert_15_sent = True
-                trip._send_alert(15)
-                alerts_sent += 1
-            elif trip.time_remaining <= 30 and not trip.alert_30_sent:
-                trip.alert_30_sent = True
-                trip._send_alert(30)
-                alerts_sent += 1
-
-        return alerts_sent
+        """Compatibilidad: delega en el planificador único de búsquedas"""
+        return self._run_search_scheduler()
 
     @api.model
     def auto_cancel_expired(self):
-        """Método para auto-cancelar búsquedas expiradas (ejecutado por cron cada 2 minutos)"""
-        from datetime import datetime, timedelta
-        
-        # Buscar búsquedas activas
-        searching_trips = self.search([('state', '=', 'searching')])
-        cancelled_count = 0
+        """Compatibilidad: delega en el planificador único de búsquedas"""
+        return self._run_search_scheduler()
 
-        for trip in searching_trips:
-            if trip.started_at and trip.wait_limit_minutes > 0:
-                # Calcular si ha expirado
-                started = trip.started_at
-                limit_time = started + timedelta(minutes=trip.wait_limit_minutes)
-                now = datetime.now()
-                
-                if now > limit_time:
-                    # Tiempo agotado - cancelar automáticamente
-                    trip.write({
-                        'state': 'cancelled',
-                        'cancelled_at': fields.Datetime.now()
-                    })
-                    
-                    elapsed_time = int((now - started).total_seconds() / 60)
-                    trip.message_post(body=_(
-                        'Búsqueda cancelada automáticamente por tiempo expirado. '
-                        'Tiempo transcurrido: %s minutos (límite: %s minutos)'
-                    ) % (elapsed_time, trip.wait_limit_minutes))
-                    
-                    # Notificación vía bus
-                    trip._notify_driver('warning', 
-                                      '⏰ Tiempo expirado',
-                                      f'Búsqueda {trip.name} cancelada automáticamente por tiempo expirado')
-                    
+    @api.model
+    def _run_search_scheduler(self, batch_size=SCHEDULER_BATCH_SIZE):
+        """
+        Procesa alertas y vencimientos de búsquedas en una sola pasada (ejecutado por cron)
+
+        Recorre en orden los eventos vencidos (next_event_at), confirma la
+        transacción por lotes y reprograma el cron para el siguiente evento.
+        Cada evento se procesa en su propio savepoint: una búsqueda que falla
+        se registra en el log y se omite hasta la siguiente ejecución del cron.
+        Al agotar SCHEDULER_TIME_BUDGET se detiene tras el lote en curso y se
+        vuelve a disparar para los eventos pendientes.
+
+        Returns:
+            int: número de eventos procesados
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        started = time.monotonic()
+        now = fields.Datetime.now()
+        processed = 0
+        cancelled_count = 0
+        failed_ids = []
+
+        while True:
+            domain = [
+                ('state', '=', 'searching'),
+                ('next_event_at', '<=', now)
+            ]
+            if failed_ids:
+                domain.append(('id', 'not in', failed_ids))
+            due_trips = self.search(domain, order='next_event_at, id', limit=batch_size)
+
+            for trip in due_trips._for_transition():
+                try:
+                    with self.env.cr.savepoint():
+                        cancelled = trip._process_scheduled_event(now)
+                except Exception as e:
+                    _logger.error(f"Error procesando el evento programado de la búsqueda {trip.id}: {str(e)}")
+                    failed_ids.append(trip.id)
+                    continue
+                if cancelled:
                     cancelled_count += 1
+                processed += 1
 
-        if cancelled_count > 0:
+            if auto_commit:
+                self.env.cr.commit()
+            if len(due_trips) < batch_size:
+                break
+            if time.monotonic() - started >= SCHEDULER_TIME_BUDGET:
+                _logger.info(f"Planificador de búsquedas detenido por tiempo tras {processed} eventos")
+                break
+
+        if cancelled_count:
             _logger.info(f"Auto-canceladas {cancelled_count} búsquedas expiradas")
-        
-        return cancelled_count
+
+        # Las búsquedas que fallaron se reintentan en la ejecución periódica, no de inmediato
+        self._schedule_scheduler_wakeup(exclude_ids=failed_ids)
+        return processed
+
+    def _process_scheduled_event(self, now):
+        """
+        Procesa el evento vencido de una búsqueda: vencimiento o alerta
+
+        Solo envía la alerta del umbral más cercano; los umbrales mayores que ya
+        pasaron se marcan como enviados para no notificar alertas atrasadas.
+
+        Returns:
+            bool: True si la búsqueda se canceló por vencimiento
+        """
+        self.ensure_one()
+        if self.deadline_at and self.deadline_at <= now:
+            # Tiempo agotado - cancelar automáticamente
+            self.write({
+                'state': 'cancelled',
+                'cancelled_at': now
+            })
+
+            elapsed_time = int((now - self.started_at).total_seconds() / 60)
+            self._log_transition('search_expired', _(
+                'Búsqueda cancelada automáticamente por tiempo expirado. '
+                'Tiempo transcurrido: %s minutos (límite: %s minutos)'
+            ) % (elapsed_time, self.wait_limit_minutes), value=elapsed_time)
+
+            # Notificación vía bus
+            self._notify_driver('warning', 
+                              '⏰ Tiempo expirado',
+                              f'Búsqueda {self.name} cancelada automáticamente por tiempo expirado')
+            return True
+
+        remaining = (self.deadline_at - now).total_seconds() / 60
+        reached = [
+            minutes for minutes in ALERT_THRESHOLDS
+            if remaining <= minutes and not self[f'alert_{minutes}_sent']
+        ]
+        if reached:
+            self.write({f'alert_{minutes}_sent': True for minutes in reached})
+            self._send_alert(min(reached))
+        return False
+
+    @api.model
+    def _schedule_scheduler_wakeup(self, at_list=None, exclude_ids=None):
+        """Programa el cron del planificador para el siguiente evento pendiente"""
+        cron = self.env.ref('driverpro.cron_empty_trip_scheduler', raise_if_not_found=False)
+        if not cron:
+            return
+        if at_list is None:
+            domain = [
+                ('state', '=', 'searching'),
+                ('next_event_at', '!=', False)
+            ]
+            if exclude_ids:
+                domain.append(('id', 'not in', exclude_ids))
+            next_event = self.search(domain, order='next_event_at', limit=1)
+            at_list = next_event.mapped('next_event_at')
+        at_list = [at for at in at_list if at]
+        if at_list:
+            cron.sudo()._trigger(at=at_list)
 
     def _send_alert(self, minutes_remaining):
         """Envía alerta de tiempo restante"""
         message = _('⚠️ ALERTA BÚSQUEDA: Quedan %s minutos - %s') % (minutes_remaining, self.name)
         
         if self.driver_id:
-            self.message_post(
-                body=message,
-                partner_ids=[self.driver_id.partner_id.id] if self.driver_id.partner_id else [],
-                message_type='notification'
-            )
+            self._log_transition('search_alert', message if not self.driver_id.partner_id else None,
+                                 value=minutes_remaining)
+            # Aviso en la bandeja del chofer, independiente del chatter de transiciones
+            if self.driver_id.partner_id:
+                self.message_post(
+                    body=message,
+                    partner_ids=[self.driver_id.partner_id.id],
+                    message_type='notification'
+                )
             
             # Enviar notificación vía bus para el frontend
             self._notify_driver('warning', 
                                f'⚠️ Tiempo restante: {minutes_remaining} min',
                                f'Tu búsqueda {self.name} está por expirar')
             
-            # Enviar notificación push
+            # Encolar notificación push (se entrega después del commit)
             try:
-                from ..utils.push import send_web_push, create_trip_notification_payload
+                from ..utils.push import create_trip_notification_payload
                 notification_type = f'empty_trip_{minutes_remaining}'
                 push_message = f'Te quedan {minutes_remaining} minutos para terminar la búsqueda.'
                 
@@ -353,9 +512,9 @@ class DriverproEmptyTrip(models.Model):
                     notification_type,
                     push_message
                 )
-                send_web_push(self.env, self.driver_id, push_payload)
+                self.env['driverpro.push.outbox'].enqueue(self.driver_id, push_payload)
                 
-                _logger.info(f"Alerta push enviada al chofer {self.driver_id.login}: {minutes_remaining} min restantes")
+                _logger.info(f"Alerta push encolada para el chofer {self.driver_id.login}: {minutes_remaining} min restantes")
                 
             except Exception as e:
                 _logger.error(f"Error enviando alerta push: {str(e)}")
@@ -380,11 +539,7 @@ class DriverproEmptyTrip(models.Model):
                 message.update(extra_data)
             
             # Enviar notificación específica al usuario usando nuestro canal estándar
-            self.env['bus.bus']._sendone(
-                f'driverpro_notifications_{self.driver_id.id}',
-                'notification',
-                message
-            )
+            self.env['driverpro.notification']._notify(self.driver_id, message)
             
             _logger.info(f"Notificación de búsqueda enviada al usuario {self.driver_id.id}: {title}")
             
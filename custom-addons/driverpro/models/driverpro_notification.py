@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+from datetime import timedelta
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Canal LISTEN/NOTIFY que despierta a los clientes en espera (long-poll y SSE)
+NOTIFICATION_CHANNEL = 'driverpro_notification'
+NOTIFY_CHUNK_SIZE = 500
+
+# Notificaciones pendientes de la transacción en cr.precommit.data
+PENDING_KEY = 'driverpro.notification.pending'
+
+# Campos que identifican la entidad de un mensaje para coalescer por chofer y tipo
+COALESCE_FIELDS = ('trip_id', 'search_id', 'recharge_id', 'vehicle_id')
+
+# Modelo de cada entidad referida por un mensaje, para descartar las eliminadas
+ENTITY_MODELS = {
+    'trip_id': 'driverpro.trip',
+    'search_id': 'driverpro.empty_trip',
+    'recharge_id': 'driverpro.card.recharge',
+    'vehicle_id': 'fleet.vehicle',
+}
+
+
+class DriverproNotification(models.Model):
+    """Feed persistente de notificaciones por chofer, consultado por cursor"""
+    _name = 'driverpro.notification'
+    _description = 'Notificación Driver Pro'
+    _order = 'id'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Chofer',
+        required=True,
+        ondelete='cascade'
+    )
+
+    notification_type = fields.Char(
+        string='Tipo'
+    )
+
+    payload = fields.Text(
+        string='Payload',
+        required=True,
+        help="Contenido JSON de la notificación"
+    )
+
+    def init(self):
+        """Índice del feed por chofer para lecturas por cursor (user_id, id)"""
+        create_index(
+            self._cr,
+            'driverpro_notification_user_id_id_idx',
+            self._table,
+            ['user_id', 'id']
+        )
+
+    @api.model
+    def _notify(self, users, message):
+        """
+        Encola una notificación para los choferes en la transacción actual
+
+        Los mensajes se acumulan por transacción y se envían al confirmarla
+        (ver _flush_pending): un _sendone al bus por mensaje coalescido (el bus
+        los agrupa en su propio precommit), una inserción en bloque en el feed
+        y un único NOTIFY de PostgreSQL para las peticiones en espera.
+
+        Args:
+            users: recordset de res.users
+            message: dict con los datos de la notificación
+        """
+        users = users.filtered('id')
+        if not users:
+            return
+
+        precommit = self.env.cr.precommit
+        if PENDING_KEY not in precommit.data:
+            precommit.data[PENDING_KEY] = {}
+            precommit.add(self._flush_pending)
+        pending = precommit.data[PENDING_KEY]
+
+        for user in users:
+            # Coalescer: el último mensaje de la misma entidad reemplaza a los anteriores
+            key = self._coalesce_key(user.id, message)
+            pending.pop(key, None)
+            pending[key] = (user.id, dict(message))
+
+    @api.model
+    def _coalesce_key(self, user_id, message):
+        """Clave de coalescencia: chofer, tipo y entidad referida por el mensaje"""
+        entity = tuple(message.get(field) for field in COALESCE_FIELDS)
+        if not any(entity):
+            # Sin entidad identificable: solo se deduplican mensajes idénticos
+            entity = (json.dumps(message, sort_keys=True, default=str),)
+        return (user_id, message.get('type')) + entity
+
+    @api.model
+    def _flush_pending(self):
+        """Envía las notificaciones acumuladas en la transacción (hook precommit)"""
+        pending = self.env.cr.precommit.data.pop(PENDING_KEY, {})
+        if not pending:
+            return
+        items = self._existing_items(list(pending.values()))
+        if not items:
+            return
+
+        Bus = self.env['bus.bus'].sudo()
+        for user_id, message in items:
+            Bus._sendone(f'driverpro_notifications_{user_id}', 'notification', message)
+        self.sudo().create([{
+            'user_id': user_id,
+            'notification_type': message.get('type'),
+            'payload': json.dumps(message, ensure_ascii=False, default=str),
+        } for user_id, message in items])
+        self._wake_listeners([user_id for user_id, message in items])
+
+    @api.model
+    def _existing_items(self, items):
+        """
+        Descarta los mensajes cuyas entidades ya no existen al confirmar
+
+        Un savepoint revertido (p. ej. el reintento uno a uno de
+        _create_trips_batch) deshace los registros pero no los mensajes ya
+        acumulados en cr.precommit.data.
+        """
+        referenced = {}
+        for user_id, message in items:
+            for field, model_name in ENTITY_MODELS.items():
+                if message.get(field):
+                    referenced.setdefault(model_name, set()).add(message[field])
+            if message.get('trip_ids'):
+                referenced.setdefault('driverpro.trip', set()).update(message['trip_ids'])
+        existing = {
+            model_name: set(self.env[model_name].browse(ids).exists().ids)
+            for model_name, ids in referenced.items()
+        }
+
+        result = []
+        for user_id, message in items:
+            if any(message.get(field) and message[field] not in existing[model_name]
+                   for field, model_name in ENTITY_MODELS.items()):
+                continue
+            if message.get('trip_ids'):
+                message['trip_ids'] = [
+                    trip_id for trip_id in message['trip_ids'] if trip_id in existing['driverpro.trip']
+                ]
+            result.append((user_id, message))
+        return result
+
+    @api.model
+    def _wake_listeners(self, user_ids):
+        """Emite NOTIFY con los choferes afectados (se entrega al hacer commit)"""
+        user_ids = sorted(set(user_ids))
+        # El payload de NOTIFY está limitado a 8000 bytes
+        for index in range(0, len(user_ids), NOTIFY_CHUNK_SIZE):
+            self.env.cr.execute("SELECT pg_notify(%s, %s)", [
+                NOTIFICATION_CHANNEL,
+                json.dumps({'db': self.env.cr.dbname, 'user_ids': user_ids[index:index + NOTIFY_CHUNK_SIZE]}),
+            ])
+
+    @api.model
+    def _fetch_since(self, user_id, last_id, limit=100):
+        """Notificaciones del chofer posteriores al cursor, en formato de mensajes del bus"""
+        self.env.cr.execute("""
+            SELECT id, payload
+              FROM driverpro_notification
+             WHERE user_id = %s AND id > %s
+          ORDER BY id
+             LIMIT %s
+        """, [user_id, last_id, limit])
+        return [{
+            'id': notification_id,
+            'message': {
+                'type': 'notification',
+                'payload': json.loads(payload),
+            },
+        } for notification_id, payload in self.env.cr.fetchall()]
+
+    @api.model
+    def _cursor_before(self, user_id, date):
+        """Cursor del chofer en una fecha: última notificación creada antes de ella"""
+        self.env.cr.execute("""
+            SELECT COALESCE(MAX(id), 0)
+              FROM driverpro_notification
+             WHERE user_id = %s AND create_date < %s
+        """, [user_id, date])
+        return self.env.cr.fetchone()[0]
+
+    @api.autovacuum
+    def _gc_old_notifications(self):
+        """Elimina notificaciones con más de 7 días"""
+        limit_date = fields.Datetime.now() - timedelta(days=7)
+        self.env.cr.execute("DELETE FROM driverpro_notification WHERE create_date < %s", [limit_date])
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+from datetime import timedelta
+import json
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Eventos tomados por lote y límites de reintento con backoff exponencial
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_SECONDS = 30
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
+
+# Marca de disparo del despachador en cr.precommit.data (una vez por transacción)
+TRIGGERED_KEY = 'driverpro.push.outbox.triggered'
+
+
+class DriverproPushOutbox(models.Model):
+    """Cola transaccional de notificaciones push pendientes de entrega"""
+    _name = 'driverpro.push.outbox'
+    _description = 'Bandeja de Salida Push Driver Pro'
+    _order = 'next_attempt_at, id'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Destinatario',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    payload = fields.Text(
+        string='Payload',
+        required=True,
+        help="Contenido JSON de la notificación"
+    )
+
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('dead', 'Descartado')
+    ], string='Estado', default='pending', required=True)
+
+    attempts = fields.Integer(
+        string='Intentos',
+        default=0
+    )
+
+    next_attempt_at = fields.Datetime(
+        string='Próximo Intento',
+        default=fields.Datetime.now,
+        required=True
+    )
+
+    sent_at = fields.Datetime(
+        string='Enviado el'
+    )
+
+    last_error = fields.Text(
+        string='Último Error'
+    )
+
+    # Vacío = todas las suscripciones activas; tras un fallo, solo las que fallaron
+    retry_subscription_ids = fields.Many2many(
+        'driverpro.push_subscription',
+        'driverpro_push_outbox_subscription_rel',
+        'outbox_id',
+        'subscription_id',
+        string='Suscripciones a Reintentar'
+    )
+
+    def init(self):
+        """Índice parcial sobre los eventos pendientes para el despachador"""
+        create_index(
+            self._cr,
+            'driverpro_push_outbox_pending_idx',
+            self._table,
+            ['next_attempt_at', 'id'],
+            where="state = 'pending'"
+        )
+
+    @api.model
+    def enqueue(self, users, payload):
+        """
+        Encola una notificación push dentro de la transacción actual
+
+        La entrega ocurre en el cron después del commit, de modo que una
+        transacción revertida nunca envía notificaciones.
+
+        Args:
+            users: recordset de res.users
+            payload: dict con los datos de la notificación
+
+        Returns:
+            recordset: eventos creados
+        """
+        users = users.filtered('id')
+        if not users:
+            return self.browse()
+        data_json = json.dumps(payload, ensure_ascii=False, default=str)
+        events = self.sudo().create([{
+            'user_id': user.id,
+            'payload': data_json,
+        } for user in users])
+        # Un solo disparador del cron por transacción aunque se encolen muchos eventos
+        if TRIGGERED_KEY not in self.env.cr.precommit.data:
+            self.env.cr.precommit.data[TRIGGERED_KEY] = True
+            self._trigger_dispatch()
+        return events
+
+    @api.model
+    def _trigger_dispatch(self, at=None):
+        """Despierta al cron despachador (el disparador se confirma con la transacción)"""
+        cron = self.env.ref('driverpro.cron_push_outbox_dispatch', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=at)
+
+    @api.model
+    def _claim_batch(self, batch_size):
+        """Toma un lote de eventos vencidos, omitiendo los bloqueados por otro despachador"""
+        self.env.cr.execute("""
+            SELECT id
+              FROM driverpro_push_outbox
+             WHERE state = 'pending' AND next_attempt_at <= %s
+          ORDER BY next_attempt_at, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [fields.Datetime.now(), batch_size])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _dispatch_pending(self, batch_size=OUTBOX_BATCH_SIZE):
+        """
+        Entrega los eventos pendientes por lotes (ejecutado por cron)
+
+        Returns:
+            int: número de eventos procesados
+        """
+        from ..utils.push import WEBPUSH_AVAILABLE
+        from ..utils.vapid import get_vapid_context
+
+        if not WEBPUSH_AVAILABLE:
+            _logger.warning("pywebpush no está disponible. La bandeja de salida push no se procesará.")
+            return 0
+        vapid = get_vapid_context(self.env)
+        if not vapid:
+            _logger.warning("VAPID keys no configuradas. La bandeja de salida push no se procesará.")
+            return 0
+
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        processed = 0
+        while True:
+            events = self.sudo()._claim_batch(batch_size)
+            if not events:
+                break
+            events._deliver(vapid)
+            processed += len(events)
+            if auto_commit:
+                self.env.cr.commit()
+            if len(events) < batch_size:
+                break
+
+        # Programar el siguiente reintento pendiente
+        next_event = self.sudo().search([('state', '=', 'pending')], limit=1)
+        if next_event:
+            self._trigger_dispatch(at=next_event.next_attempt_at)
+        return processed
+
+    def _deliver(self, vapid):
+        """Entrega un lote de eventos reintentando solo las suscripciones que fallaron"""
+        from ..utils.push import _deliver_to_subscriptions
+
+        # Suscripciones activas de todos los destinatarios del lote en una sola consulta
+        subscriptions = self.env['driverpro.push_subscription'].sudo().search([
+            ('user_id', 'in', self.user_id.ids),
+            ('enabled', '=', True)
+        ])
+        subs_by_user = {}
+        for sub in subscriptions:
+            subs_by_user.setdefault(sub.user_id.id, subscriptions.browse())
+            subs_by_user[sub.user_id.id] |= sub
+
+        now = fields.Datetime.now()
+        for event in self:
+            subs = subs_by_user.get(event.user_id.id, subscriptions.browse())
+            if event.retry_subscription_ids:
+                subs &= event.retry_subscription_ids
+            if not subs:
+                event.write({'state': 'sent', 'sent_at': now, 'retry_subscription_ids': [(5,)]})
+                continue
+
+            results = _deliver_to_subscriptions(self.env, subs, event.payload, vapid)
+            failed = [r for r in results if not r['ok'] and not r['disabled']]
+            if not failed:
+                event.write({'state': 'sent', 'sent_at': now, 'retry_subscription_ids': [(5,)]})
+                continue
+
+            attempts = event.attempts + 1
+            vals = {
+                'attempts': attempts,
+                'last_error': '\n'.join(r['error'] or '' for r in failed),
+                'retry_subscription_ids': [(6, 0, [r['subscription_id'] for r in failed])],
+            }
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                vals['state'] = 'dead'
+                _logger.warning(f"Evento push {event.id} descartado tras {attempts} intentos")
+            else:
+                delay = min(OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1)), OUTBOX_MAX_BACKOFF_SECONDS)
+                vals['next_attempt_at'] = now + timedelta(seconds=delay)
+            event.write(vals)
+
+    def action_retry(self):
+        """Reencola eventos descartados"""
+        events = self.filtered(lambda event: event.state == 'dead')
+        if not events:
+            return True
+        events.write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt_at': fields.Datetime.now(),
+        })
+        events._trigger_dispatch()
+        return True
+
+    @api.autovacuum
+    def _gc_sent_events(self):
+        """Elimina eventos entregados con más de 7 días"""
+        limit_date = fields.Datetime.now() - timedelta(days=7)
+        self.search([('state', '=', 'sent'), ('sent_at', '<', limit_date)]).unlink()
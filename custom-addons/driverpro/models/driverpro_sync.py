@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+SYNC_SEQUENCE = 'driverpro_sync_seq'
+
+# Registros a re-sellar al confirmar la transacción en cr.precommit.data: {modelo: ids}
+PENDING_KEY = 'driverpro.sync.pending'
+
+# Espacio de candados consultivos (clave, chofer) que ordena el sellado de
+# versiones de cada chofer según el orden de commit
+SYNC_LOCK_KEY = 7412930
+
+
+class DriverproSyncMixin(models.AbstractModel):
+    """Versión de sincronización monotónica para la API de choferes"""
+    _name = 'driverpro.sync.mixin'
+    _description = 'Mixin de Sincronización Driver Pro'
+
+    # Campo (o ruta) que identifica al chofer dueño del registro
+    _sync_user_field = 'driver_id'
+
+    sync_version = fields.Integer(
+        string='Versión de Sincronización',
+        readonly=True,
+        copy=False,
+        index=True,
+        help="Token del servidor asignado en el último cambio del registro"
+    )
+
+    def init(self):
+        """Crea la secuencia global de versiones de sincronización"""
+        self._cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {SYNC_SEQUENCE}")
+
+    @api.model
+    def _next_sync_version(self):
+        """Obtiene el siguiente token de sincronización"""
+        self._cr.execute("SELECT nextval(%s)", [SYNC_SEQUENCE])
+        return self._cr.fetchone()[0]
+
+    def _sync_owner_ids(self):
+        """Ids de los choferes que sincronizan estos registros"""
+        if not self._sync_user_field:
+            return set()
+        return set(self.sudo().mapped(self._sync_user_field).ids)
+
+    @api.model
+    def _sync_high_water_mark(self, user_id, card=None):
+        """
+        Versión más alta ya confirmada de los registros del chofer
+
+        Es el token de una sincronización completa: cualquier cambio posterior
+        del chofer se sella después de confirmarse los visibles (ver
+        _stamp_pending_versions), así que tendrá una versión mayor.
+        """
+        self.env.flush_all()
+        self._cr.execute("""
+            SELECT GREATEST(
+                (SELECT MAX(sync_version) FROM driverpro_trip WHERE driver_id = %(user_id)s),
+                (SELECT MAX(sync_version) FROM driverpro_empty_trip WHERE driver_id = %(user_id)s),
+                (SELECT MAX(p.sync_version)
+                   FROM driverpro_trip_pause p
+                   JOIN driverpro_trip t ON t.id = p.trip_id
+                  WHERE t.driver_id = %(user_id)s),
+                (SELECT MAX(sync_version) FROM driverpro_sync_tombstone WHERE user_id = %(user_id)s),
+                (SELECT sync_version FROM driverpro_card WHERE id = %(card_id)s)
+            )
+        """, {'user_id': user_id, 'card_id': card.id if card else None})
+        return self._cr.fetchone()[0] or 0
+
+    @api.model
+    def _register_sync_stamp(self, model_name, ids):
+        """Programa el sellado definitivo de versión de los registros al confirmar la transacción"""
+        ids = [record_id for record_id in ids if isinstance(record_id, int)]
+        if not ids:
+            return
+        precommit = self.env.cr.precommit
+        if PENDING_KEY not in precommit.data:
+            precommit.data[PENDING_KEY] = {}
+            precommit.add(self.env['driverpro.sync.mixin']._stamp_pending_versions)
+        precommit.data[PENDING_KEY].setdefault(model_name, set()).update(ids)
+
+    @api.model
+    def _stamp_pending_versions(self):
+        """
+        Re-sella con una sola versión los registros cambiados en la transacción (hook precommit)
+
+        nextval() al escribir no sigue el orden de commit: una transacción que
+        toma la versión 10 y confirma después de otra que tomó la 11 quedaría
+        oculta para el cliente que ya sincronizó hasta 11. Al confirmar, la
+        transacción toma un candado consultivo exclusivo (liberado en el commit)
+        y obtiene una versión nueva; así las versiones visibles crecen en el
+        mismo orden en que se confirman sus transacciones.
+
+        El candado es por chofer (los clientes solo sincronizan sus propios
+        registros): transacciones de choferes distintos no se esperan entre
+        sí. Se toman en orden de id para evitar interbloqueos; los registros
+        sin chofer no los sincroniza ningún cliente y no toman candado.
+        """
+        pending = self.env.cr.precommit.data.pop(PENDING_KEY, {})
+        if not pending:
+            return
+        owner_ids = set()
+        for model_name, ids in pending.items():
+            owner_ids |= self.env[model_name].browse(ids).exists()._sync_owner_ids()
+        for owner_id in sorted(owner_ids):
+            self._cr.execute("SELECT pg_advisory_xact_lock(%s, %s)", [SYNC_LOCK_KEY, owner_id])
+        version = self._next_sync_version()
+        for model_name, ids in pending.items():
+            Model = self.env[model_name]
+            self._cr.execute(
+                f'UPDATE "{Model._table}" SET sync_version = %s WHERE id IN %s',
+                [version, tuple(ids)]
+            )
+            Model.browse(ids).invalidate_recordset(['sync_version'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Asigna versión de sincronización provisional al crear (se sella al confirmar)"""
+        version = self._next_sync_version()
+        for vals in vals_list:
+            vals['sync_version'] = version
+        records = super().create(vals_list)
+        self._register_sync_stamp(self._name, records.ids)
+        return records
+
+    def write(self, vals):
+        """Asigna versión de sincronización provisional en cada cambio (se sella al confirmar)"""
+        if self and 'sync_version' not in vals:
+            vals = dict(vals, sync_version=self._next_sync_version())
+            self._register_sync_stamp(self._name, self.ids)
+        return super().write(vals)
+
+    def unlink(self):
+        """Registra tombstones para que los clientes eliminen los registros"""
+        tombstones = []
+        if self and self._sync_user_field:
+            version = self._next_sync_version()
+            for record in self.sudo():
+                user = record.mapped(self._sync_user_field)[:1]
+                if user:
+                    tombstones.append({
+                        'res_model': self._name,
+                        'res_id': record.id,
+                        'user_id': user.id,
+                        'sync_version': version,
+                    })
+        res = super().unlink()
+        if tombstones:
+            created = self.env['driverpro.sync.tombstone'].sudo().create(tombstones)
+            self._register_sync_stamp(created._name, created.ids)
+        return res
+
+    def _touch_sync_version(self):
+        """Marca registros como cambiados cuando varían valores calculados sin write()"""
+        if not self.ids:
+            return
+        self.flush_recordset(['sync_version'])
+        self._cr.execute(
+            f'UPDATE "{self._table}" SET sync_version = nextval(%s) WHERE id IN %s',
+            [SYNC_SEQUENCE, tuple(self.ids)]
+        )
+        self.invalidate_recordset(['sync_version'])
+        self._register_sync_stamp(self._name, self.ids)
+
+
+class DriverproSyncTombstone(models.Model):
+    """Registros eliminados pendientes de propagar a los clientes"""
+    _name = 'driverpro.sync.tombstone'
+    _description = 'Eliminación Sincronizada Driver Pro'
+    _order = 'sync_version'
+
+    res_model = fields.Char(
+        string='Modelo',
+        required=True
+    )
+
+    res_id = fields.Integer(
+        string='ID del Registro',
+        required=True
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Chofer',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    sync_version = fields.Integer(
+        string='Versión de Sincronización',
+        required=True,
+        index=True
+    )
+
+    def _sync_owner_ids(self):
+        """Ids de los choferes que reciben estas eliminaciones"""
+        return set(self.user_id.ids)
+
+    @api.model
+    def _get_watermark(self):
+        """Versión más alta de tombstones ya depurados"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        return int(ICP.get_param('driverpro.sync_tombstone_watermark') or 0)
+
+    @api.autovacuum
+    def _gc_old_tombstones(self):
+        """Elimina tombstones antiguos; clientes más atrasados harán sincronización completa"""
+        limit_date = fields.Datetime.now() - timedelta(days=30)
+        old_tombstones = self.search([('create_date', '<', limit_date)])
+        if not old_tombstones:
+            return
+        watermark = max(max(old_tombstones.mapped('sync_version')), self._get_watermark())
+        self.env['ir.config_parameter'].sudo().set_param('driverpro.sync_tombstone_watermark', watermark)
+        old_tombstones.unlink()
+        _logger.info(f"Depurados {len(old_tombstones)} tombstones de sincronización")
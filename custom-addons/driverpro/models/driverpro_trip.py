@@ -2,18 +2,44 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools.sql import create_index, index_exists
 from datetime import datetime, timedelta
 import pytz
 import logging
 
+from ..utils.sequences import reserve_sequence_numbers
+
 _logger = logging.getLogger(__name__)
 
+# Índices declarados: (nombre, expresiones, condición parcial)
+TRIP_INDEXES = [
+    # Listados y paginación por cursor del chofer
+    ('driverpro_trip_driver_create_date_id_idx', ['driver_id', 'create_date DESC', 'id DESC'], ''),
+    # Viaje actual / viajes por estado del chofer
+    ('driverpro_trip_driver_state_idx', ['driver_id', 'state'], ''),
+    # Viajes abiertos (borrador o vacío) del chofer
+    ('driverpro_trip_driver_open_idx', ['driver_id'], "state IN ('draft', 'empty')"),
+    # Cron de notificaciones de viajes programados
+    ('driverpro_trip_scheduled_draft_idx', ['scheduled_datetime'], "is_scheduled AND state = 'draft'"),
+    # Viajes vacíos en curso
+    ('driverpro_trip_empty_started_idx', ['empty_started_at'], "state = 'empty'"),
+    # Consumo por tarjeta (_compute_totals)
+    ('driverpro_trip_card_state_idx', ['card_id', 'state'], 'card_id IS NOT NULL'),
+]
+
+PAUSE_INDEXES = [
+    ('driverpro_trip_pause_trip_id_idx', ['trip_id', 'is_active'], ''),
+]
+
+# Índice único parcial: a lo sumo una pausa activa por viaje
+ACTIVE_PAUSE_INDEX = 'driverpro_trip_pause_one_active_idx'
+
 
 class DriverproTrip(models.Model):
     """Viajes realizados por choferes"""
     _name = 'driverpro.trip'
     _description = 'Viaje Driver Pro'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'driverpro.sync.mixin', 'driverpro.event.mixin']
     _order = 'create_date desc'
 
     name = fields.Char(
@@ -166,9 +192,11 @@ class DriverproTrip(models.Model):
         help="Archivos relacionados con el viaje (fotos, documentos, etc.)"
     )
     
+    # Almacenado: se mantiene desde ir.attachment (create/write/unlink) y document_ids
     attachment_count = fields.Integer(
         string='Adjuntos',
         compute='_compute_attachment_count',
+        store=True,
         help="Número de archivos adjuntos"
     )
     
@@ -267,7 +295,7 @@ class DriverproTrip(models.Model):
     
     pause_duration = fields.Float(
         string='Tiempo en Pausa (Horas)',
-        compute='_compute_pause_duration',
+        compute='_compute_pause_stats',
         store=True,
         help="Tiempo total pausado en horas"
     )
@@ -308,23 +336,31 @@ class DriverproTrip(models.Model):
         'trip_id',
         string='Pausas'
     )
+
+    event_ids = fields.One2many(
+        'driverpro.trip.event',
+        'trip_id',
+        string='Eventos'
+    )
     
     # Campos calculados
     pause_count = fields.Integer(
         string='Número de Pausas',
-        compute='_compute_pause_count',
+        compute='_compute_pause_stats',
         store=True
     )
     
     is_paused = fields.Boolean(
         string='Está Pausado',
-        compute='_compute_is_paused'
+        compute='_compute_pause_stats',
+        store=True
     )
     
     current_pause_id = fields.Many2one(
         'driverpro.trip.pause',
         string='Pausa Actual',
-        compute='_compute_current_pause'
+        compute='_compute_pause_stats',
+        store=True
     )
     
     # Campos de auditoría
@@ -335,6 +371,12 @@ class DriverproTrip(models.Model):
         required=True
     )
 
+    def init(self):
+        """Índices compuestos y parciales de las consultas frecuentes de la API y los crons"""
+        super().init()
+        for name, expressions, where in TRIP_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+
     @api.depends('card_id.balance')
     def _compute_card_credits_warning(self):
         """Calcula el estado de las recargas de la tarjeta"""
@@ -358,45 +400,82 @@ class DriverproTrip(models.Model):
                 total_mxn += trip.amount_usd * trip.exchange_rate
             trip.total_amount_mxn = total_mxn
 
-    @api.model
-    def create(self, vals):
-        """Asignar secuencia al crear"""
-        if not vals.get('name') or vals.get('name') in ('/', _('Nuevo'), 'New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('driverpro.trip') or 'TRIP-000001'
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Asignar secuencias en bloque al crear"""
+        unnamed = [vals for vals in vals_list if not vals.get('name') or vals.get('name') in ('/', _('Nuevo'), 'New')]
+        if unnamed:
+            names = reserve_sequence_numbers(self.env, 'driverpro.trip', len(unnamed))
+            for vals, name in zip(unnamed, names):
+                vals['name'] = name or 'TRIP-000001'
         
-        trip = super().create(vals)
+        trips = super().create(vals_list)
+        trips.filtered('document_ids')._dedup_documents()
         
-        # Enviar notificación si se asigna un driver al crear
-        if vals.get('driver_id'):
+        # Enviar notificaciones del lote si se asigna un driver al crear
+        assigned = trips.browse([trip.id for trip, vals in zip(trips, vals_list) if vals.get('driver_id')])
+        if assigned:
+            assigned._notify_trips_created()
+        
+        return trips
+
+    def _dedup_documents(self):
+        """
+        Colapsa en document_ids los archivos con el mismo checksum, conservando el más antiguo
+
+        Los duplicados solo se desvinculan de document_ids: pueden estar
+        referidos por mensajes, otros documentos o campos binarios, y el blob
+        del filestore ya es compartido, así que eliminarlos no libera espacio.
+        """
+        for trip in self:
+            kept = set()
+            duplicates = self.env['ir.attachment']
+            for attachment in trip.document_ids.sorted('id'):
+                if not attachment.checksum:
+                    continue
+                if attachment.checksum in kept:
+                    duplicates |= attachment
+                else:
+                    kept.add(attachment.checksum)
+            if not duplicates:
+                continue
+            super(DriverproTrip, trip).write({'document_ids': [(3, attachment.id) for attachment in duplicates]})
+
+    def _notify_trips_created(self):
+        """Notifica a cada chofer los viajes creados en el lote (un mensaje por chofer)"""
+        for driver, trips in self.grouped('driver_id').items():
             try:
+                if len(trips) == 1:
+                    body = f'Se ha creado el viaje {trips.name} y se te ha asignado'
+                else:
+                    body = f'Se han creado {len(trips)} viajes y se te han asignado'
                 bus_message = {
                     'type': 'trip_created',
                     'title': 'Nuevo Viaje Creado',
-                    'body': f'Se ha creado el viaje {trip.name} y se te ha asignado',
-                    'trip_id': trip.id,
-                    'trip_name': trip.name,
-                    'user_id': trip.driver_id.id,
+                    'body': body,
+                    'trip_id': trips[0].id,
+                    'trip_name': trips[0].name,
+                    'trip_ids': trips.ids,
+                    'user_id': driver.id,
                     'timestamp': fields.Datetime.now().isoformat()
                 }
                 
                 # Enviar notificación específica al usuario
-                self.env['bus.bus']._sendone(
-                    f'driverpro_notifications_{trip.driver_id.id}',
-                    'notification',
-                    bus_message
-                )
+                self.env['driverpro.notification']._notify(driver, bus_message)
                 
-                _logger.info(f"Notificación de viaje creado enviada al usuario {trip.driver_id.id} para viaje {trip.name}")
+                _logger.info(f"Notificación de {len(trips)} viaje(s) creado(s) enviada al usuario {driver.id}")
                 
             except Exception as e:
                 _logger.error(f"Error enviando notificación de viaje creado: {str(e)}")
-        
-        return trip
 
     def write(self, vals):
         """Manejar cambios en el viaje, especialmente asignación de driver"""
         result = super().write(vals)
         
+        # Archivos con el mismo contenido en document_ids: conservar solo uno
+        if 'document_ids' in vals:
+            self._dedup_documents()
+        
         # Si se cambia el driver, enviar notificación al nuevo driver
         if vals.get('driver_id'):
             for trip in self:
@@ -412,20 +491,16 @@ class DriverproTrip(models.Model):
                     }
                     
                     # Enviar notificación específica al nuevo usuario (bus)
-                    self.env['bus.bus']._sendone(
-                        f'driverpro_notifications_{trip.driver_id.id}',
-                        'notification',
-                        bus_message
-                    )
+                    self.env['driverpro.notification']._notify(trip.driver_id, bus_message)
                     
-                    # Enviar notificación push
-                    from ..utils.push import send_web_push, create_trip_notification_payload
+                    # Encolar notificación push (se entrega después del commit)
+                    from ..utils.push import create_trip_notification_payload
                     push_payload = create_trip_notification_payload(
                         trip, 
                         'assigned_trip',
                         f'Se te ha reasignado el viaje {trip.name}'
                     )
-                    send_web_push(self.env, trip.driver_id, push_payload)
+                    self.env['driverpro.push.outbox'].enqueue(trip.driver_id, push_payload)
                     
                     _logger.info(f"Notificaciones (bus + push) de reasignación enviadas al usuario {trip.driver_id.id} para viaje {trip.name}")
                     
@@ -475,23 +550,14 @@ class DriverproTrip(models.Model):
                 'warnings': [_('El usuario no existe o no tiene un contacto asociado.')]
             }
         
-        # Buscar vehículo asignado al partner en Fleet
-        vehicle = self.env['fleet.vehicle'].search([
-            ('driver_id', '=', user.partner_id.id),
-            ('active', '=', True)
-        ], limit=1)
+        # Vehículo asignado al partner en Fleet y su tarjeta activa (cacheados por chofer)
+        vehicle, card = self.env['driverpro.assignment.resolver'].resolve(user)
         
         result = {'vehicle_id': False, 'card_id': False, 'warnings': []}
         
         if vehicle:
             result['vehicle_id'] = vehicle.id
             
-            # Buscar tarjeta activa para el vehículo
-            card = self.env['driverpro.card'].search([
-                ('vehicle_id', '=', vehicle.id),
-                ('active', '=', True)
-            ], limit=1)
-            
             if card:
                 result['card_id'] = card.id
                 if card.balance <= 0:
@@ -522,20 +588,12 @@ class DriverproTrip(models.Model):
                     }
                 }
             
-            # Buscar vehículo asignado al partner en el módulo Fleet
-            vehicle = self.env['fleet.vehicle'].search([
-                ('driver_id', '=', partner_id),
-                ('active', '=', True)
-            ], limit=1)
+            # Vehículo asignado al partner en el módulo Fleet y su tarjeta activa
+            vehicle, card = self.env['driverpro.assignment.resolver'].resolve(self.driver_id)
             
             if vehicle:
                 self.vehicle_id = vehicle
                 # Auto-completar tarjeta basada en el vehículo
-                card = self.env['driverpro.card'].search([
-                    ('vehicle_id', '=', vehicle.id),
-                    ('active', '=', True)
-                ], limit=1)
-                
                 if card:
                     self.card_id = card
                     # Validar recargas disponibles y mostrar advertencia
@@ -596,11 +654,8 @@ class DriverproTrip(models.Model):
                         }
                     }
             
-            # Buscar tarjeta activa asociada al vehículo
-            card = self.env['driverpro.card'].search([
-                ('vehicle_id', '=', self.vehicle_id.id),
-                ('active', '=', True)
-            ], limit=1)
+            # Tarjeta activa asociada al vehículo (cacheada por vehículo)
+            card = self.env['driverpro.assignment.resolver'].resolve_vehicle_card(self.vehicle_id)
             
             if card:
                 self.card_id = card
@@ -625,20 +680,34 @@ class DriverproTrip(models.Model):
         else:
             self.card_id = False
 
+    @api.depends('document_ids')
     def _compute_attachment_count(self):
-        """Cuenta archivos adjuntos"""
-        for trip in self:
-            # Contar archivos en many2many + adjuntos generales
-            count = len(trip.document_ids)
-            
-            # Adjuntos generales del modelo
-            count += self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', trip.id),
-                ('id', 'not in', trip.document_ids.ids)
-            ])
-            
-            trip.attachment_count = count
+        """Cuenta archivos adjuntos (many2many + adjuntos generales) en una sola consulta"""
+        trips = self.filtered('id')
+        counts = {}
+        if trips:
+            self.env['ir.attachment'].flush_model(['res_model', 'res_id', 'res_field'])
+            trips.flush_recordset(['document_ids'])
+            self.env.cr.execute("""
+                SELECT trip_id, COUNT(DISTINCT attachment_id)
+                  FROM (
+                        SELECT trip_id, attachment_id
+                          FROM driverpro_trip_attachment_rel
+                         WHERE trip_id IN %(ids)s
+                         UNION
+                        SELECT res_id, id
+                          FROM ir_attachment
+                         WHERE res_model = %(model)s AND res_id IN %(ids)s AND res_field IS NULL
+                       ) attachments
+              GROUP BY trip_id
+            """, {'ids': tuple(trips.ids), 'model': self._name})
+            counts = dict(self.env.cr.fetchall())
+        for trip in trips:
+            trip.attachment_count = counts.get(trip.id, 0)
+
+        # Registros nuevos (formularios sin guardar): solo los archivos del many2many
+        for trip in self - trips:
+            trip.attachment_count = len(trip.document_ids)
 
     def action_view_attachments(self):
         """Ver archivos adjuntos"""
@@ -661,11 +730,54 @@ class DriverproTrip(models.Model):
             else:
                 trip.duration = 0.0
 
-    @api.depends('pause_ids.duration')
-    def _compute_pause_duration(self):
-        """Calcula el tiempo total en pausa"""
-        for trip in self:
+    def _get_pause_stats(self):
+        """
+        Agregados de pausas de los viajes en una sola consulta agrupada
+
+        Returns:
+            dict: {trip_id: (número de pausas, horas en pausas cerradas, id de pausa activa, inicio de pausa activa)}
+        """
+        if not self.ids:
+            return {}
+        self.env['driverpro.trip.pause'].flush_model(['trip_id', 'start_datetime', 'duration', 'is_active'])
+        self.env.cr.execute("""
+            SELECT trip_id,
+                   COUNT(*),
+                   COALESCE(SUM(duration), 0),
+                   MAX(id) FILTER (WHERE is_active),
+                   MAX(start_datetime) FILTER (WHERE is_active)
+              FROM driverpro_trip_pause
+             WHERE trip_id IN %s
+          GROUP BY trip_id
+        """, [tuple(self.ids)])
+        return {
+            trip_id: (count, float(hours), active_id, active_start)
+            for trip_id, count, hours, active_id, active_start in self.env.cr.fetchall()
+        }
+
+    @api.depends('pause_ids', 'pause_ids.duration', 'pause_ids.is_active')
+    def _compute_pause_stats(self):
+        """
+        Calcula número de pausas, tiempo en pausas cerradas y pausa activa
+
+        Los cuatro campos salen de una sola consulta agrupada por lote.
+        """
+        trips = self.filtered('id')
+        stats = trips._get_pause_stats()
+        for trip in trips:
+            count, hours, active_id, _active_start = stats.get(trip.id, (0, 0.0, None, None))
+            trip.pause_count = count
+            trip.pause_duration = hours
+            trip.is_paused = bool(active_id)
+            trip.current_pause_id = active_id or False
+
+        # Registros nuevos (formularios sin guardar): no existen en base de datos
+        for trip in self - trips:
+            current_pause = trip.pause_ids.filtered('is_active')
+            trip.pause_count = len(trip.pause_ids)
             trip.pause_duration = sum(trip.pause_ids.mapped('duration'))
+            trip.is_paused = bool(current_pause)
+            trip.current_pause_id = current_pause[:1]
 
     @api.depends('duration', 'pause_duration')
     def _compute_effective_duration(self):
@@ -673,25 +785,6 @@ class DriverproTrip(models.Model):
         for trip in self:
             trip.effective_duration = trip.duration - trip.pause_duration
 
-    @api.depends('pause_ids')
-    def _compute_pause_count(self):
-        """Cuenta el número de pausas"""
-        for trip in self:
-            trip.pause_count = len(trip.pause_ids)
-
-    @api.depends('pause_ids.is_active')
-    def _compute_is_paused(self):
-        """Determina si el viaje está pausado actualmente"""
-        for trip in self:
-            trip.is_paused = any(trip.pause_ids.mapped('is_active'))
-
-    @api.depends('pause_ids.is_active')
-    def _compute_current_pause(self):
-        """Encuentra la pausa actual si existe"""
-        for trip in self:
-            current_pause = trip.pause_ids.filtered('is_active')
-            trip.current_pause_id = current_pause[0] if current_pause else False
-
     @api.depends('empty_started_at', 'empty_wait_limit_minutes', 'state')
     def _compute_empty_time_remaining(self):
         """Calcula el tiempo restante para viajes vacíos"""
@@ -795,7 +888,7 @@ class DriverproTrip(models.Model):
 
     def action_start(self):
         """Inicia el viaje"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'draft':
                 raise UserError(_('Solo se pueden iniciar viajes en borrador.'))
             
@@ -859,11 +952,7 @@ class DriverproTrip(models.Model):
                 }
                 
                 # Enviar notificación específica al usuario
-                self.env['bus.bus']._sendone(
-                    f'driverpro_notifications_{trip.driver_id.id}',
-                    'notification',
-                    bus_message
-                )
+                self.env['driverpro.notification']._notify(trip.driver_id, bus_message)
                 
                 _logger.info(f"Notificación enviada al usuario {trip.driver_id.id} para viaje {trip.name}")
                 
@@ -871,13 +960,14 @@ class DriverproTrip(models.Model):
                 _logger.error(f"Error enviando notificación: {str(e)}")
             
             if trip.is_recharge_trip:
-                trip.message_post(body=_('Viaje con recarga iniciado. Recarga consumida: %s') % trip.consumed_credits)
+                trip._log_transition('start', _('Viaje con recarga iniciado. Recarga consumida: %s') % trip.consumed_credits,
+                                     value=trip.consumed_credits)
             else:
-                trip.message_post(body=_('Viaje iniciado (sin consumo de recarga).'))
+                trip._log_transition('start', _('Viaje iniciado (sin consumo de recarga).'))
 
     def action_pause(self, reason_id=None, notes=None):
         """Pausa el viaje"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'active':
                 raise UserError(_('Solo se pueden pausar viajes activos.'))
             
@@ -898,11 +988,11 @@ class DriverproTrip(models.Model):
             self.env['driverpro.trip.pause'].create(pause_vals)
             
             trip.state = 'paused'
-            trip.message_post(body=_('Viaje pausado.'))
+            trip._log_transition('pause', _('Viaje pausado.'))
 
     def action_resume(self):
         """Reanuda el viaje"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'paused':
                 raise UserError(_('Solo se pueden reanudar viajes pausados.'))
             
@@ -912,11 +1002,11 @@ class DriverproTrip(models.Model):
                 current_pause.action_end()
             
             trip.state = 'active'
-            trip.message_post(body=_('Viaje reanudado.'))
+            trip._log_transition('resume', _('Viaje reanudado.'))
 
     def action_done(self):
         """Termina el viaje"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state not in ['active', 'paused']:
                 raise UserError(_('Solo se pueden terminar viajes activos o pausados.'))
             
@@ -929,25 +1019,24 @@ class DriverproTrip(models.Model):
                 'end_datetime': fields.Datetime.now()
             })
             
-            trip.message_post(body=_('Viaje terminado. Duración: %s horas') % trip.duration)
+            trip._log_transition('done', _('Viaje terminado. Duración: %s horas') % trip.duration, value=trip.duration)
 
     def action_cancel(self):
         """Cancela el viaje"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state == 'done':
                 raise UserError(_('No se pueden cancelar viajes terminados.'))
             
-            # Finalizar pausas activas
-            active_pauses = trip.pause_ids.filtered('is_active')
-            for pause in active_pauses:
-                pause.action_end()
+            # Finalizar la pausa activa
+            if trip.is_paused:
+                trip.current_pause_id.action_end()
             
             trip.state = 'cancelled'
-            trip.message_post(body=_('Viaje cancelado.'))
+            trip._log_transition('cancel', _('Viaje cancelado.'))
 
     def action_refund_credit(self):
         """Reembolsa la recarga consumida por el viaje cancelado"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'cancelled':
                 raise UserError(_('Solo se puede reembolsar recargas de viajes cancelados.'))
             
@@ -971,11 +1060,12 @@ class DriverproTrip(models.Model):
             })
             
             trip.credit_refunded = True
-            trip.message_post(body=_('Recarga reembolsada: %s créditos') % trip.consumed_credits)
+            trip._log_transition('refund', _('Recarga reembolsada: %s créditos') % trip.consumed_credits,
+                                 value=trip.consumed_credits)
 
     def action_start_empty(self):
         """Inicia un viaje vacío (búsqueda de clientes en aeropuerto/zona)"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'draft':
                 raise UserError(_('Solo se pueden iniciar viajes vacíos desde borrador.'))
             
@@ -1004,11 +1094,12 @@ class DriverproTrip(models.Model):
                 'empty_alert_5_sent': False,
             })
             
-            trip.message_post(body=_('Viaje vacío iniciado. Límite de tiempo: %s minutos') % trip.empty_wait_limit_minutes)
+            trip._log_transition('empty_start', _('Viaje vacío iniciado. Límite de tiempo: %s minutos') % trip.empty_wait_limit_minutes,
+                                 value=trip.empty_wait_limit_minutes)
 
     def action_convert_empty_to_active(self, trip_data=None):
         """Convierte un viaje vacío a viaje activo cuando encuentra cliente"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'empty':
                 raise UserError(_('Solo se pueden convertir viajes en estado vacío.'))
             
@@ -1055,11 +1146,11 @@ class DriverproTrip(models.Model):
                 'client': trip_data.get('client_name')
             }
             
-            trip.message_post(body=message_body)
+            trip._log_transition('empty_convert', message_body, note=trip_data.get('client_name'))
 
     def action_cancel_empty(self):
         """Cancela un viaje vacío"""
-        for trip in self:
+        for trip in self._for_transition():
             if trip.state != 'empty':
                 raise UserError(_('Solo se pueden cancelar viajes en estado vacío.'))
             
@@ -1068,8 +1159,10 @@ class DriverproTrip(models.Model):
                 'end_datetime': fields.Datetime.now()
             })
             
-            trip.message_post(body=_('Viaje vacío cancelado. Tiempo transcurrido: %s minutos') % 
-                            (trip.empty_wait_limit_minutes - trip.empty_time_remaining if trip.empty_time_remaining > 0 else trip.empty_wait_limit_minutes))
+            elapsed_minutes = (trip.empty_wait_limit_minutes - trip.empty_time_remaining
+                               if trip.empty_time_remaining > 0 else trip.empty_wait_limit_minutes)
+            trip._log_transition('empty_cancel', _('Viaje vacío cancelado. Tiempo transcurrido: %s minutos') % elapsed_minutes,
+                                 value=elapsed_minutes)
 
     @api.model
     def check_empty_trip_alerts(self):
@@ -1081,11 +1174,11 @@ class DriverproTrip(models.Model):
         
         alerts_sent = 0
         
-        for trip in empty_trips:
+        for trip in empty_trips._for_transition():
             if trip.empty_time_remaining <= 0:
                 # Tiempo agotado - cancelar automáticamente
                 trip.action_cancel_empty()
-                trip.message_post(body=_('Viaje vacío cancelado automáticamente por tiempo agotado.'))
+                trip._log_transition('empty_expired', _('Viaje vacío cancelado automáticamente por tiempo agotado.'))
                 alerts_sent += 1
             elif trip.empty_time_remaining <= 5 and not trip.empty_alert_5_sent:
                 # Alerta de 5 minutos
@@ -1109,16 +1202,17 @@ class DriverproTrip(models.Model):
         """Envía alerta de tiempo restante para viaje vacío"""
         message = _('⚠️ ALERTA VIAJE VACÍO: Quedan %s minutos para que se cancele automáticamente el viaje %s') % (minutes_remaining, self.name)
         
-        # Notificar al chofer
-        if self.driver_id:
+        # Notificar al chofer: aviso en su bandeja, independiente del chatter de transiciones
+        if self.driver_id.partner_id:
+            self._log_transition('empty_alert', value=minutes_remaining)
             self.message_post(
                 body=message,
-                partner_ids=[self.driver_id.partner_id.id] if self.driver_id.partner_id else [],
+                partner_ids=[self.driver_id.partner_id.id],
                 message_type='notification'
             )
-        
-        # También registrar en el chatter del viaje
-        self.message_post(body=message)
+        else:
+            # Sin chofer: solo registrar en el chatter del viaje
+            self._log_transition('empty_alert', message, value=minutes_remaining)
 
     def action_view_pauses(self):
         """Ver pausas del viaje"""
@@ -1146,7 +1240,7 @@ class DriverproTrip(models.Model):
             ('state', '=', 'draft')
         ])
         
-        for trip in trips_30_min:
+        for trip in trips_30_min._for_transition():
             trip._send_driver_notification(30)
             trip.scheduled_notification_30_sent = True
             total_notifications += 1
@@ -1161,7 +1255,7 @@ class DriverproTrip(models.Model):
             ('state', '=', 'draft')
         ])
         
-        for trip in trips_15_min:
+        for trip in trips_15_min._for_transition():
             trip._send_driver_notification(15)
             trip.scheduled_notification_sent = True
             total_notifications += 1
@@ -1223,31 +1317,29 @@ class DriverproTrip(models.Model):
             }
             
             # Enviar notificación específica al usuario (bus)
-            self.env['bus.bus']._sendone(
-                f'driverpro_notifications_{self.driver_id.id}',
-                'notification',
-                bus_message
-            )
+            self.env['driverpro.notification']._notify(self.driver_id, bus_message)
             
-            # Enviar notificación push
-            from ..utils.push import send_web_push, create_trip_notification_payload
+            # Encolar notificación push (se entrega después del commit)
+            from ..utils.push import create_trip_notification_payload
             push_payload = create_trip_notification_payload(
                 self, 
                 'scheduled_trip_reminder',
                 f'Tu viaje inicia en {time_formatted}. De {self.origin} a {self.destination}'
             )
-            send_web_push(self.env, self.driver_id, push_payload)
+            self.env['driverpro.push.outbox'].enqueue(self.driver_id, push_payload)
             
             _logger.info(f"Notificaciones (bus + push) de viaje programado enviadas al usuario {self.driver_id.id} para viaje {self.name}")
             
         except Exception as e:
             _logger.error(f"Error enviando notificación de viaje programado: {str(e)}")
         
-        # Enviar mensaje en el chatter
-        self.message_post(
-            body=_(
+        # Registrar el recordatorio (y en el chatter si está activo)
+        self._log_transition(
+            'scheduled_reminder',
+            _(
                 '📧 Notificación enviada al chofer <strong>%s</strong>: Viaje programado en <strong>%s</strong>'
             ) % (self.driver_id.name, time_formatted),
+            value=minutes_ahead or 0,
             subtype_xmlid="mail.mt_note",
         )
 
@@ -1293,7 +1385,9 @@ class DriverproTripPause(models.Model):
     """Pausas durante un viaje"""
     _name = 'driverpro.trip.pause'
     _description = 'Pausa de Viaje'
+    _inherit = ['driverpro.sync.mixin']
     _order = 'start_datetime desc'
+    _sync_user_field = 'trip_id.driver_id'
 
     trip_id = fields.Many2one(
         'driverpro.trip',
@@ -1338,17 +1432,95 @@ class DriverproTripPause(models.Model):
         store=True
     )
 
+    def init(self):
+        """Índices de pausas por viaje y unicidad de la pausa activa"""
+        super().init()
+        for name, expressions, where in PAUSE_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+        if not index_exists(self._cr, ACTIVE_PAUSE_INDEX):
+            self._fix_active_pauses()
+            self._cr.execute(
+                f'CREATE UNIQUE INDEX "{ACTIVE_PAUSE_INDEX}" ON "{self._table}" (trip_id) WHERE is_active'
+            )
+
+    def _fix_active_pauses(self):
+        """
+        Prepara los datos existentes para el índice único de pausa activa
+
+        Cierra las pausas activas duplicadas (se conserva la más reciente de cada
+        viaje), pone en cero la duración congelada de las pausas activas y
+        recalcula por SQL los agregados de los viajes afectados.
+        """
+        cr = self._cr
+        cr.execute("""
+            WITH kept AS (
+                SELECT DISTINCT ON (trip_id) id, trip_id, start_datetime
+                  FROM driverpro_trip_pause
+                 WHERE is_active
+              ORDER BY trip_id, start_datetime DESC, id DESC
+            )
+            UPDATE driverpro_trip_pause p
+               SET is_active = FALSE,
+                   end_datetime = GREATEST(kept.start_datetime, p.start_datetime),
+                   duration = EXTRACT(EPOCH FROM GREATEST(kept.start_datetime, p.start_datetime) - p.start_datetime) / 3600.0
+              FROM kept
+             WHERE p.trip_id = kept.trip_id AND p.is_active AND p.id != kept.id
+         RETURNING p.trip_id
+        """)
+        trip_ids = {row[0] for row in cr.fetchall()}
+        if trip_ids:
+            _logger.warning(f"Cerradas pausas activas duplicadas en {len(trip_ids)} viajes")
+
+        cr.execute("""
+            UPDATE driverpro_trip_pause
+               SET duration = 0
+             WHERE end_datetime IS NULL AND duration != 0
+         RETURNING trip_id
+        """)
+        trip_ids |= {row[0] for row in cr.fetchall()}
+        if not trip_ids:
+            return
+
+        cr.execute("""
+            UPDATE driverpro_trip t
+               SET pause_count = s.pause_count,
+                   pause_duration = s.pause_duration,
+                   effective_duration = COALESCE(t.duration, 0) - s.pause_duration,
+                   is_paused = s.active_id IS NOT NULL,
+                   current_pause_id = s.active_id
+              FROM (
+                    SELECT trip_id, COUNT(*) AS pause_count, COALESCE(SUM(duration), 0) AS pause_duration,
+                           MAX(id) FILTER (WHERE is_active) AS active_id
+                      FROM driverpro_trip_pause
+                     WHERE trip_id IN %s
+                  GROUP BY trip_id
+                   ) s
+             WHERE t.id = s.trip_id
+        """, [tuple(trip_ids)])
+
     @api.depends('start_datetime', 'end_datetime')
     def _compute_duration(self):
-        """Calcula la duración de la pausa"""
+        """Calcula la duración de la pausa cerrada (las activas se miden al consultarlas)"""
         for pause in self:
-            if pause.start_datetime:
-                end_time = pause.end_datetime or fields.Datetime.now()
-                delta = end_time - pause.start_datetime
+            if pause.start_datetime and pause.end_datetime:
+                delta = pause.end_datetime - pause.start_datetime
                 pause.duration = delta.total_seconds() / 3600
             else:
                 pause.duration = 0.0
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Propaga el cambio de agregados de pausa a la versión del viaje"""
+        pauses = super().create(vals_list)
+        pauses.trip_id._touch_sync_version()
+        return pauses
+
+    def write(self, vals):
+        """Propaga el cambio de agregados de pausa a la versión del viaje"""
+        res = super().write(vals)
+        self.trip_id._touch_sync_version()
+        return res
+
     def action_end(self):
         """Finaliza la pausa"""
         for pause in self:
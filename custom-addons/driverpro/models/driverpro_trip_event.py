@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Eventos pendientes de la transacción en cr.precommit.data
+PENDING_KEY = 'driverpro.trip.event.pending'
+
+# Parámetro que activa los mensajes de chatter en las transiciones (inactivo si no existe)
+CHATTER_PARAM = 'driverpro.transition_chatter'
+
+# Contexto de las transiciones sin chatter: sin valores de seguimiento ni suscripciones
+NO_CHATTER_CONTEXT = {
+    'mail_notrack': True,
+    'tracking_disable': True,
+}
+
+# Campo del evento según el modelo del registro
+RECORD_FIELDS = {
+    'driverpro.trip': 'trip_id',
+    'driverpro.empty_trip': 'search_id',
+}
+
+# Índices declarados: (nombre, expresiones, condición parcial)
+EVENT_INDEXES = [
+    ('driverpro_trip_event_trip_id_idx', ['trip_id', 'id'], 'trip_id IS NOT NULL'),
+    ('driverpro_trip_event_search_id_idx', ['search_id', 'id'], 'search_id IS NOT NULL'),
+]
+
+
+class DriverproTripEvent(models.Model):
+    """Bitácora compacta y de solo inserción de transiciones de viajes y búsquedas"""
+    _name = 'driverpro.trip.event'
+    _description = 'Evento de Viaje Driver Pro'
+    _order = 'id desc'
+    _log_access = False
+
+    event_type = fields.Selection([
+        ('start', 'Viaje iniciado'),
+        ('pause', 'Viaje pausado'),
+        ('resume', 'Viaje reanudado'),
+        ('done', 'Viaje terminado'),
+        ('cancel', 'Viaje cancelado'),
+        ('refund', 'Recarga reembolsada'),
+        ('empty_start', 'Viaje vacío iniciado'),
+        ('empty_convert', 'Viaje vacío convertido'),
+        ('empty_cancel', 'Viaje vacío cancelado'),
+        ('empty_expired', 'Viaje vacío vencido'),
+        ('empty_alert', 'Alerta de viaje vacío'),
+        ('scheduled_reminder', 'Recordatorio de viaje programado'),
+        ('search_start', 'Búsqueda iniciada'),
+        ('search_convert', 'Búsqueda convertida'),
+        ('search_cancel', 'Búsqueda cancelada'),
+        ('search_expired', 'Búsqueda vencida'),
+        ('search_alert', 'Alerta de búsqueda'),
+    ], string='Evento', required=True, readonly=True)
+
+    event_date = fields.Datetime(
+        string='Fecha',
+        required=True,
+        readonly=True,
+        default=fields.Datetime.now
+    )
+
+    trip_id = fields.Many2one(
+        'driverpro.trip',
+        string='Viaje',
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    search_id = fields.Many2one(
+        'driverpro.empty_trip',
+        string='Búsqueda',
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Usuario',
+        readonly=True,
+        ondelete='set null'
+    )
+
+    value = fields.Float(
+        string='Valor',
+        readonly=True,
+        help="Dato numérico del evento: créditos, minutos u horas según el tipo"
+    )
+
+    note = fields.Char(
+        string='Detalle',
+        readonly=True
+    )
+
+    def init(self):
+        """Índices de la bitácora por viaje y por búsqueda"""
+        super().init()
+        for name, expressions, where in EVENT_INDEXES:
+            create_index(self._cr, name, self._table, expressions, where=where)
+
+    def write(self, vals):
+        """La bitácora es de solo inserción"""
+        raise UserError(_('Los eventos de viaje no se pueden modificar.'))
+
+    @api.model
+    def _log(self, records, event_type, value=0.0, note=None):
+        """
+        Registra un evento por registro en la transacción actual
+
+        Los eventos se acumulan por transacción y se insertan en bloque al
+        confirmarla (ver _flush_pending); si la transacción se revierte, no se
+        registran.
+
+        Args:
+            records: recordset de driverpro.trip o driverpro.empty_trip
+            event_type: tipo de evento
+            value: dato numérico del evento (opcional)
+            note: detalle breve del evento (opcional)
+        """
+        record_field = RECORD_FIELDS[records._name]
+        records = records.filtered('id')
+        if not records:
+            return
+
+        precommit = self.env.cr.precommit
+        if PENDING_KEY not in precommit.data:
+            precommit.data[PENDING_KEY] = []
+            precommit.add(self._flush_pending)
+        now = fields.Datetime.now()
+        precommit.data[PENDING_KEY].extend({
+            'event_type': event_type,
+            'event_date': now,
+            record_field: record.id,
+            'user_id': self.env.uid,
+            'value': value or 0.0,
+            'note': note or False,
+        } for record in records)
+
+    @api.model
+    def _flush_pending(self):
+        """Inserta en bloque los eventos acumulados en la transacción (hook precommit)"""
+        pending = self.env.cr.precommit.data.pop(PENDING_KEY, [])
+        if not pending:
+            return
+
+        # Registros eliminados o revertidos por savepoint dentro de la transacción
+        existing = {}
+        for model_name, record_field in RECORD_FIELDS.items():
+            ids = {vals[record_field] for vals in pending if vals.get(record_field)}
+            existing[record_field] = set(self.env[model_name].browse(ids).exists().ids) if ids else set()
+        events = [
+            vals for vals in pending
+            if any(vals.get(record_field) in existing[record_field] for record_field in RECORD_FIELDS.values())
+        ]
+        if events:
+            self.sudo().create(events)
+
+    @api.model
+    def _chatter_enabled(self):
+        """Indica si las transiciones también se publican en el chatter"""
+        value = self.env['ir.config_parameter'].sudo().get_param(CHATTER_PARAM, 'False')
+        return str(value).strip().lower() not in ('0', 'false', 'no', '')
+
+
+class DriverproEventMixin(models.AbstractModel):
+    """Registro de transiciones en la bitácora de eventos con chatter opcional"""
+    _name = 'driverpro.event.mixin'
+    _description = 'Mixin de Eventos Driver Pro'
+
+    def _for_transition(self):
+        """Registros para aplicar una transición: sin seguimiento si el chatter está desactivado"""
+        if self.env['driverpro.trip.event']._chatter_enabled():
+            return self
+        return self.with_context(**NO_CHATTER_CONTEXT)
+
+    def _log_transition(self, event_type, body=None, value=0.0, note=None, **post_kwargs):
+        """
+        Registra la transición en la bitácora y, si está activo, en el chatter
+
+        Solo para mensajes de registro: los avisos dirigidos al chofer
+        (partner_ids) se publican aparte con message_post y no dependen del
+        parámetro de chatter.
+
+        Args:
+            event_type: tipo de evento de driverpro.trip.event
+            body: mensaje del chatter (opcional)
+            value: dato numérico del evento (opcional)
+            note: detalle breve del evento (opcional)
+            **post_kwargs: argumentos adicionales de message_post
+        """
+        self.env['driverpro.trip.event']._log(self, event_type, value=value, note=note)
+        if body and self.env['driverpro.trip.event']._chatter_enabled():
+            for record in self:
+                record.message_post(body=body, **post_kwargs)
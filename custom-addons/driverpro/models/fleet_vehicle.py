@@ -5,13 +5,31 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
+# Campos del vehículo que cambian la resolución chofer → vehículo
+ASSIGNMENT_FIELDS = ('driver_id', 'active')
+
 
 class FleetVehicle(models.Model):
     _inherit = 'fleet.vehicle'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Invalidar el caché de asignaciones al dar de alta vehículos con conductor"""
+        vehicles = super().create(vals_list)
+        if vehicles.filtered('driver_id'):
+            self.env['driverpro.assignment.resolver']._invalidate()
+        return vehicles
+
     def write(self, vals):
         """Extender write para notificar cuando se asigna un conductor al vehículo"""
+        resolver = self.env['driverpro.assignment.resolver']
+        tracked = [name for name in ASSIGNMENT_FIELDS if name in vals]
+        before = resolver._assignment_values(self, tracked) if tracked else None
         result = super().write(vals)
+
+        # El conductor o el archivado cambian la asignación chofer → vehículo
+        if tracked and resolver._assignment_values(self, tracked) != before:
+            resolver._invalidate()
         
         # Si se cambia el conductor, enviar notificación
         if vals.get('driver_id'):
@@ -37,15 +55,10 @@ class FleetVehicle(models.Model):
                             }
                             
                             # Enviar notificación específica al usuario (bus)
-                            self.env['bus.bus']._sendone(
-                                f'driverpro_notifications_{user.id}',
-                                'notification',
-                                bus_message
-                            )
+                            self.env['driverpro.notification']._notify(user, bus_message)
                             
-                            # Enviar notificación push
+                            # Encolar notificación push (se entrega después del commit)
                             try:
-                                from ..utils.push import send_web_push
                                 push_payload = {
                                     "type": "vehicle_assigned",
                                     "title": "Vehículo Asignado - Driver Pro",
@@ -53,9 +66,9 @@ class FleetVehicle(models.Model):
                                     "vehicle_id": vehicle.id,
                                     "timestamp": fields.Datetime.now().isoformat(),
                                 }
-                                send_web_push(self.env, user, push_payload)
+                                self.env['driverpro.push.outbox'].enqueue(user, push_payload)
                                 
-                                _logger.info(f"Notificación de asignación de vehículo enviada al usuario {user.login} para vehículo {vehicle.name}")
+                                _logger.info(f"Notificación de asignación de vehículo encolada para el usuario {user.login} para vehículo {vehicle.name}")
                                 
                             except Exception as e:
                                 _logger.error(f"Error enviando notificación push de vehículo: {str(e)}")
@@ -63,4 +76,12 @@ class FleetVehicle(models.Model):
                         except Exception as e:
                             _logger.error(f"Error enviando notificación de asignación de vehículo: {str(e)}")
         
-        return result
\ No newline at end of file
+        return result
+
+    def unlink(self):
+        """Invalidar el caché de asignaciones al eliminar vehículos con conductor"""
+        assigned = bool(self.filtered('driver_id'))
+        result = super().unlink()
+        if assigned:
+            self.env['driverpro.assignment.resolver']._invalidate()
+        return result
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+import base64
+import logging
+import threading
+
+from ..utils.previews import can_preview, make_preview, PREVIEW_MAX_SOURCE_BYTES
+
+_logger = logging.getLogger(__name__)
+
+# Adjuntos procesados por lote en la generación de vistas previas
+PREVIEW_BATCH_SIZE = 50
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    # Vista previa reducida (WebP/JPEG) para la app de choferes; se guarda en columna, no en filestore
+    driverpro_preview = fields.Binary(
+        string='Vista Previa',
+        attachment=False
+    )
+
+    driverpro_preview_mimetype = fields.Char(
+        string='Tipo de Vista Previa'
+    )
+
+    driverpro_preview_state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Generada'),
+        ('none', 'Sin Vista Previa')
+    ], string='Estado de Vista Previa', copy=False)
+
+    def init(self):
+        """Índice parcial sobre las vistas previas pendientes"""
+        super().init()
+        create_index(
+            self._cr,
+            'ir_attachment_driverpro_preview_pending_idx',
+            self._table,
+            ['id'],
+            where="driverpro_preview_state = 'pending'"
+        )
+
+    def _get_counted_trip_ids(self):
+        """Viajes cuyo contador de adjuntos depende de estos archivos"""
+        if not self.ids:
+            return set()
+        self.flush_recordset(['res_model', 'res_id'])
+        self.env.cr.execute("""
+            SELECT res_id FROM ir_attachment
+             WHERE id IN %(ids)s AND res_model = 'driverpro.trip' AND res_id IS NOT NULL
+             UNION
+            SELECT trip_id FROM driverpro_trip_attachment_rel
+             WHERE attachment_id IN %(ids)s
+        """, {'ids': tuple(self.ids)})
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _recompute_trip_attachment_count(self, trip_ids):
+        """Programa el recálculo del contador almacenado de los viajes indicados"""
+        if not trip_ids:
+            return
+        trips = self.env['driverpro.trip'].sudo().browse(trip_ids).exists()
+        if trips:
+            self.env.add_to_compute(trips._fields['attachment_count'], trips)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Actualizar el contador de adjuntos de los viajes al adjuntar archivos"""
+        attachments = super().create(vals_list)
+        if any(vals.get('res_model') == 'driverpro.trip' for vals in vals_list):
+            self._recompute_trip_attachment_count(attachments._get_counted_trip_ids())
+            attachments.filtered(
+                lambda a: a.res_model == 'driverpro.trip' and not a.res_field
+            )._driverpro_queue_previews()
+        return attachments
+
+    def write(self, vals):
+        """Actualizar el contador de adjuntos si un archivo cambia de documento"""
+        if 'res_model' not in vals and 'res_id' not in vals:
+            return super().write(vals)
+        trip_ids = self._get_counted_trip_ids()
+        result = super().write(vals)
+        self._recompute_trip_attachment_count(trip_ids | self._get_counted_trip_ids())
+        return result
+
+    def unlink(self):
+        """Actualizar el contador de adjuntos de los viajes al eliminar archivos"""
+        trip_ids = self._get_counted_trip_ids()
+        result = super().unlink()
+        self._recompute_trip_attachment_count(trip_ids)
+        return result
+
+    def _driverpro_set_stored_file(self, fname, file_size, checksum, head):
+        """
+        Registra en el adjunto un archivo ya copiado por bloques al filestore
+
+        create/write descartan store_fname, file_size y checksum porque los
+        derivan del contenido completo, que aquí nunca está en memoria: se
+        escriben junto con index_content, calculado con _index sobre el primer
+        bloque. El archivo ya quedó marcado para el GC del filestore al
+        copiarse (ver utils.uploads).
+        """
+        self.ensure_one()
+        self.flush_recordset()
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, file_size = %s, checksum = %s, index_content = %s
+             WHERE id = %s
+        """, [fname, file_size, checksum, self._index(head, self.mimetype, checksum=checksum), self.id])
+        self.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'index_content', 'datas', 'raw'])
+
+    def _driverpro_queue_previews(self):
+        """Marca las imágenes sin vista previa como pendientes y despierta al cron"""
+        images = self.filtered(lambda a: not a.driverpro_preview_state and can_preview(a.mimetype))
+        if not images:
+            return
+        images.sudo().write({'driverpro_preview_state': 'pending'})
+        cron = self.env.ref('driverpro.cron_attachment_previews', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _driverpro_generate_previews(self, batch_size=PREVIEW_BATCH_SIZE):
+        """
+        Genera vistas previas pendientes por lotes (ejecutado por cron)
+
+        Returns:
+            int: número de adjuntos procesados
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        processed = 0
+        while True:
+            attachments = self.sudo().search([('driverpro_preview_state', '=', 'pending')], order='id', limit=batch_size)
+            if not attachments:
+                break
+            for attachment in attachments:
+                attachment._driverpro_generate_preview()
+            processed += len(attachments)
+            if auto_commit:
+                self.env.cr.commit()
+            if len(attachments) < batch_size:
+                break
+        return processed
+
+    def _driverpro_generate_preview(self):
+        """Genera (o reutiliza por checksum) la vista previa de un adjunto"""
+        self.ensure_one()
+        # Mismo contenido ya procesado: se comparte la vista previa
+        twin = self.search([
+            ('checksum', '=', self.checksum),
+            ('driverpro_preview_state', '=', 'done'),
+            ('id', '!=', self.id)
+        ], limit=1) if self.checksum else self.browse()
+        if twin:
+            self.write({
+                'driverpro_preview': twin.driverpro_preview,
+                'driverpro_preview_mimetype': twin.driverpro_preview_mimetype,
+                'driverpro_preview_state': 'done',
+            })
+            return
+
+        if not self.file_size or self.file_size > PREVIEW_MAX_SOURCE_BYTES:
+            self.driverpro_preview_state = 'none'
+            return
+        try:
+            preview, mimetype = make_preview(self.raw)
+        except Exception as e:
+            _logger.warning(f"No se pudo generar la vista previa del adjunto {self.id}: {str(e)}")
+            self.driverpro_preview_state = 'none'
+            return
+        self.write({
+            'driverpro_preview': base64.b64encode(preview),
+            'driverpro_preview_mimetype': mimetype,
+            'driverpro_preview_state': 'done',
+        })
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    def write(self, vals):
+        """Invalidar el caché de asignaciones si cambia el contacto del usuario"""
+        resolver = self.env['driverpro.assignment.resolver']
+        before = resolver._assignment_values(self, ['partner_id']) if 'partner_id' in vals else None
+        result = super().write(vals)
+        if 'partner_id' in vals and resolver._assignment_values(self, ['partner_id']) != before:
+            resolver._invalidate()
+        return result
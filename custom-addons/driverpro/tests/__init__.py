@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import test_sync_versions
+from . import test_card_consumption
+from . import test_trip_serializer
+from . import test_query_plans
+from . import test_etag
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from psycopg2.errors import SerializationFailure
+
+from odoo import api, sql_db, SUPERUSER_ID
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+# Viajes iniciados en paralelo y créditos disponibles en la tarjeta
+CONSUMERS = 8
+CREDITS = 3
+
+# Reintentos por viaje ante errores de serialización (como el reintento de Odoo)
+MAX_RETRIES = 20
+
+
+@tagged('post_install', '-at_install')
+class TestParallelConsumption(TransactionCase):
+    """Viajes con recarga iniciados a la vez sobre una misma tarjeta no gastan más que su saldo"""
+
+    def _real_env(self):
+        """Entorno sobre una conexión propia que confirma de verdad (fuera del cursor de prueba)"""
+        cr = sql_db.db_connect(self.env.cr.dbname).cursor()
+        return api.Environment(cr, SUPERUSER_ID, {})
+
+    def setUp(self):
+        super().setUp()
+        env = self._real_env()
+        try:
+            driver = env['res.users'].create({
+                'name': 'Chofer Consumo Paralelo',
+                'login': 'driverpro.parallel.consume',
+                'groups_id': [(6, 0, [env.ref('driverpro.group_portal_driver').id])],
+            })
+            brand = env['fleet.vehicle.model.brand'].create({'name': 'Marca Consumo Paralelo'})
+            model = env['fleet.vehicle.model'].create({'name': 'Modelo Consumo Paralelo', 'brand_id': brand.id})
+            vehicle = env['fleet.vehicle'].create({
+                'model_id': model.id,
+                'license_plate': 'TEST-PARALLEL-001',
+                'driver_id': driver.partner_id.id,
+            })
+            card = env['driverpro.card'].create({
+                'name': 'TEST-PARALLEL-CONSUME',
+                'vehicle_id': vehicle.id,
+            })
+            env['driverpro.card.movement'].create({
+                'card_id': card.id,
+                'movement_type': 'in',
+                'amount': CREDITS,
+                'reference': 'TEST-PARALLEL-CONSUME',
+            })
+            trips = env['driverpro.trip'].create([{
+                'driver_id': driver.id,
+                'vehicle_id': vehicle.id,
+                'card_id': card.id,
+                'origin': f'Origen {index}',
+                'destination': f'Destino {index}',
+                'is_recharge_trip': True,
+            } for index in range(CONSUMERS)])
+            env.cr.commit()
+            self.driver_id, self.vehicle_id, self.card_id = driver.id, vehicle.id, card.id
+            self.model_ids, self.trip_ids = (brand.id, model.id), trips.ids
+        finally:
+            env.cr.close()
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        env = self._real_env()
+        try:
+            env['driverpro.trip'].browse(self.trip_ids).exists().unlink()
+            env['driverpro.card'].browse(self.card_id).exists().unlink()
+            env['fleet.vehicle'].browse(self.vehicle_id).exists().unlink()
+            env['fleet.vehicle.model'].browse(self.model_ids[1]).exists().unlink()
+            env['fleet.vehicle.model.brand'].browse(self.model_ids[0]).exists().unlink()
+            env['res.users'].browse(self.driver_id).exists().unlink()
+            env.cr.commit()
+        finally:
+            env.cr.close()
+
+    def _start(self, trip_id, barrier, outcomes):
+        """Un viaje: toma su instantánea, espera a los demás e inicia con reintentos"""
+        env = self._real_env()
+        try:
+            for attempt in range(MAX_RETRIES):
+                # Fijar la instantánea antes de que otros viajes confirmen
+                env.cr.execute("SELECT 1")
+                if attempt == 0:
+                    barrier.wait()
+                trip = env['driverpro.trip'].browse(trip_id)
+                try:
+                    trip.action_start()
+                    env.cr.commit()
+                    outcomes.append('ok')
+                    return
+                except SerializationFailure:
+                    env.cr.rollback()
+                    env.invalidate_all()
+                except UserError:
+                    env.cr.rollback()
+                    env.invalidate_all()
+                    # Saldo insuficiente es definitivo; tarjeta ocupada se reintenta
+                    balances = env['driverpro.card'].browse(self.card_id)._get_ledger_balances()
+                    if balances.get(self.card_id, 0.0) < 1.0:
+                        outcomes.append('insufficient')
+                        return
+            outcomes.append('exhausted')
+        finally:
+            env.cr.close()
+
+    def test_parallel_trip_start(self):
+        """N viajes iniciados en paralelo: exactamente CREDITS arrancan y el saldo queda en cero"""
+        barrier = threading.Barrier(CONSUMERS)
+        outcomes = []
+        threads = [
+            threading.Thread(target=self._start, args=(trip_id, barrier, outcomes))
+            for trip_id in self.trip_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('ok'), CREDITS)
+        self.assertEqual(outcomes.count('insufficient'), CONSUMERS - CREDITS)
+
+        env = self._real_env()
+        try:
+            trips = env['driverpro.trip'].browse(self.trip_ids)
+            self.assertEqual(len(trips.filtered(lambda trip: trip.state == 'active')), CREDITS)
+            self.assertEqual(len(trips.filtered('credit_consumed')), CREDITS)
+            card = env['driverpro.card'].browse(self.card_id)
+            movements = env['driverpro.card.movement'].search([
+                ('card_id', '=', card.id),
+                ('movement_type', '=', 'out'),
+            ])
+            self.assertEqual(len(movements), CREDITS)
+            self.assertEqual(card._get_ledger_balances().get(card.id), 0.0)
+            self.assertFalse(card._check_running_balance())
+        finally:
+            env.cr.close()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import HttpCase, tagged
+
+DRIVER_LOGIN = 'driverpro.etag.test'
+DRIVER_PASSWORD = 'driverpro.etag.test'
+
+
+@tagged('post_install', '-at_install')
+class TestConditionalResponses(HttpCase):
+    """Respuestas condicionales de la API: 304 sin cuerpo y ETag nuevo tras un cambio"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.driver = cls.env['res.users'].create({
+            'name': 'Chofer ETag',
+            'login': DRIVER_LOGIN,
+            'password': DRIVER_PASSWORD,
+            'groups_id': [(6, 0, [cls.env.ref('driverpro.group_portal_driver').id])],
+        })
+        cls.trip = cls.env['driverpro.trip'].create({
+            'driver_id': cls.driver.id,
+            'origin': 'Origen ETag',
+            'destination': 'Destino ETag',
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(DRIVER_LOGIN, DRIVER_PASSWORD)
+
+    def _get(self, path, etag=None):
+        headers = {'If-None-Match': etag} if etag else None
+        return self.url_open(path, headers=headers)
+
+    def _assert_conditional(self, path):
+        """Primera respuesta 200 con ETag; reenviarlo da 304 sin cuerpo y el mismo ETag"""
+        response = self._get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers.get('ETag')
+        self.assertTrue(etag)
+
+        not_modified = self._get(path, etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified.headers.get('ETag'), etag)
+        return etag
+
+    def test_trips_not_modified(self):
+        """GET /driverpro/api/trips responde 304 sin cuerpo si el ETag coincide"""
+        self._assert_conditional('/driverpro/api/trips')
+
+    def test_trips_etag_changes_on_mutation(self):
+        """Modificar un viaje del chofer cambia el ETag del listado"""
+        path = '/driverpro/api/trips'
+        etag = self._assert_conditional(path)
+
+        self.trip.write({'destination': 'Destino ETag 2'})
+        self.env.flush_all()
+
+        response = self._get(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+        destinations = [trip['destination'] for trip in response.json()['data']]
+        self.assertIn('Destino ETag 2', destinations)
+
+    def test_pause_reasons_etag_changes_on_mutation(self):
+        """Agregar un motivo de pausa activo cambia el ETag del catálogo"""
+        path = '/driverpro/api/pause-reasons'
+        etag = self._assert_conditional(path)
+
+        self.env['driverpro.pause.reason'].create({
+            'name': 'Motivo ETag',
+            'code': 'TEST_ETAG',
+        })
+        self.env.flush_all()
+
+        response = self._get(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
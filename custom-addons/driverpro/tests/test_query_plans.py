@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+from odoo.tools.sql import index_exists
+
+from ..benchmarks import seed_fleet
+from ..utils.query_plans import HOT_QUERIES, explain_hot_queries
+
+
+@tagged('post_install', '-at_install')
+class TestHotQueryPlans(TransactionCase):
+    """
+    Prueba de humo del catálogo de consultas frecuentes
+
+    El uso de índices se verifica a escala en los benchmarks
+    (check_query_plans); con los pocos datos de una prueba el planificador
+    prefiere, con razón, recorrer las tablas.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        seed_fleet(cls.env, drivers=2, trips_per_driver=5, empty_trips_per_driver=1)
+
+    def test_declared_indexes_exist(self):
+        """Cada índice declarado en el catálogo existe en su tabla"""
+        for label, table, index, _query in HOT_QUERIES:
+            with self.subTest(query=label):
+                self.assertTrue(index_exists(self.env.cr, index), f"{label}: falta {index} en {table}")
+
+    def test_hot_queries_explain(self):
+        """EXPLAIN (FORMAT JSON) de cada consulta frecuente devuelve un plan que lee su tabla"""
+        report = explain_hot_queries(self.env.cr)
+        self.assertEqual([entry['label'] for entry in report], [label for label, *_rest in HOT_QUERIES])
+        for entry in report:
+            with self.subTest(query=entry['label']):
+                self.assertTrue(entry['scans'], f"{entry['label']} no lee {entry['table']}")
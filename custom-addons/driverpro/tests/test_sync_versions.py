@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, sql_db, SUPERUSER_ID
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSyncVersionOrdering(TransactionCase):
+    """Las versiones de sincronización siguen el orden de commit de las transacciones"""
+
+    def _real_env(self):
+        """Entorno sobre una conexión propia que confirma de verdad (fuera del cursor de prueba)"""
+        cr = sql_db.db_connect(self.env.cr.dbname).cursor()
+        self.addCleanup(cr.close)
+        return api.Environment(cr, SUPERUSER_ID, {})
+
+    def setUp(self):
+        super().setUp()
+        env = self._real_env()
+        cards = env['driverpro.card'].create([
+            {'name': 'TEST-SYNC-ORDER-A'},
+            {'name': 'TEST-SYNC-ORDER-B'},
+        ])
+        env.cr.commit()
+        self.card_a_id, self.card_b_id = cards.ids
+        self.addCleanup(self._cleanup_cards, cards.ids)
+
+    def _cleanup_cards(self, card_ids):
+        env = self._real_env()
+        env['driverpro.card'].browse(card_ids).exists().unlink()
+        env.cr.commit()
+
+    def _read_versions(self):
+        """Versiones confirmadas, leídas con un snapshot nuevo"""
+        env = self._real_env()
+        cards = env['driverpro.card'].browse([self.card_a_id, self.card_b_id])
+        return {card.id: card.sync_version for card in cards}
+
+    def test_interleaved_commits(self):
+        """A toma versión antes que B pero confirma después: el cliente sincronizado con B ve A"""
+        env_a = self._real_env()
+        env_b = self._real_env()
+
+        # A escribe primero (versión provisional menor) y queda abierta
+        env_a['driverpro.card'].browse(self.card_a_id).write({'name': 'TEST-SYNC-ORDER-A2'})
+        env_a.flush_all()
+
+        # B escribe después y confirma antes que A
+        env_b['driverpro.card'].browse(self.card_b_id).write({'name': 'TEST-SYNC-ORDER-B2'})
+        env_b.cr.commit()
+
+        # El cliente sincroniza entre ambos commits y guarda el token de B
+        token = self._read_versions()[self.card_b_id]
+
+        env_a.cr.commit()
+
+        versions = self._read_versions()
+        self.assertGreater(versions[self.card_a_id], token)
+
+        env = self._real_env()
+        changed = env['driverpro.card'].search([
+            ('id', 'in', [self.card_a_id, self.card_b_id]),
+            ('sync_version', '>', token),
+        ])
+        self.assertEqual(changed.ids, [self.card_a_id])
+
+    def test_same_transaction_single_version(self):
+        """Los registros de una misma transacción se sellan con una sola versión"""
+        env = self._real_env()
+        cards = env['driverpro.card'].browse([self.card_a_id, self.card_b_id])
+        cards[0].write({'name': 'TEST-SYNC-ORDER-A3'})
+        cards[1].write({'name': 'TEST-SYNC-ORDER-B3'})
+        env.cr.commit()
+
+        versions = self._read_versions()
+        self.assertEqual(versions[self.card_a_id], versions[self.card_b_id])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils.serializers import TripSerializer
+
+# Viajes del primer listado y del listado ampliado
+SMALL_BATCH = 3
+LARGE_BATCH = 30
+
+
+@tagged('post_install', '-at_install')
+class TestTripSerializerQueries(TransactionCase):
+    """Listar viajes cuesta un número constante de consultas, sin importar cuántos sean"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.driver = cls.env['res.users'].create({
+            'name': 'Chofer Serializador',
+            'login': 'driverpro.serializer.test',
+            'groups_id': [(6, 0, [cls.env.ref('driverpro.group_portal_driver').id])],
+        })
+        brand = cls.env['fleet.vehicle.model.brand'].create({'name': 'Marca Serializador'})
+        model = cls.env['fleet.vehicle.model'].create({'name': 'Modelo Serializador', 'brand_id': brand.id})
+        cls.vehicle = cls.env['fleet.vehicle'].create({
+            'model_id': model.id,
+            'license_plate': 'TEST-SER-001',
+            'driver_id': cls.driver.partner_id.id,
+        })
+        cls.card = cls.env['driverpro.card'].create({
+            'name': 'TEST-SERIALIZER',
+            'vehicle_id': cls.vehicle.id,
+        })
+
+    def _create_trips(self, count):
+        return self.env['driverpro.trip'].create([{
+            'driver_id': self.driver.id,
+            'vehicle_id': self.vehicle.id,
+            'card_id': self.card.id,
+            'origin': f'Origen {index}',
+            'destination': f'Destino {index}',
+        } for index in range(count)])
+
+    def _serialize(self):
+        """Listado del chofer con el caché vacío, como en una petición nueva"""
+        self.env.invalidate_all()
+        return TripSerializer(self.env).search_serialize([('driver_id', '=', self.driver.id)])
+
+    def test_listing_query_count_is_constant(self):
+        """El listado de LARGE_BATCH viajes no hace más consultas que el de SMALL_BATCH"""
+        self._create_trips(SMALL_BATCH)
+        self.env.flush_all()
+        # Calentar cachés de proceso (ormcache, zona horaria, reglas)
+        self._serialize()
+
+        self.env.flush_all()
+        start = self.env.cr.sql_log_count
+        self.assertEqual(len(self._serialize()), SMALL_BATCH)
+        baseline = self.env.cr.sql_log_count - start
+
+        self._create_trips(LARGE_BATCH - SMALL_BATCH)
+        self.env.flush_all()
+        with self.assertQueryCount(baseline):
+            trips_data = self._serialize()
+        self.assertEqual(len(trips_data), LARGE_BATCH)
+        self.assertTrue(all(trip['vehicle'] and trip['card'] for trip in trips_data))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+
+
+def compute_etag(*parts):
+    """
+    Calcula un ETag débil a partir de una huella de versión
+
+    Args:
+        *parts: valores que identifican el contenido (alcance, parámetros y
+            huella de las filas subyacentes)
+
+    Returns:
+        str: ETag débil, p.ej. W/"3f2a..."
+    """
+    raw = json.dumps(parts, default=str, sort_keys=True, ensure_ascii=False)
+    return 'W/"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """Compara un encabezado If-None-Match con el ETag actual (comparación débil)"""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(',')}
+    if '*' in candidates:
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    return etag in candidates or opaque in candidates
+
+
+def trips_fingerprint(cr, user_id, since_date, state=None):
+    """
+    Huella de los viajes del chofer: conteo, última escritura y versión de
+    viajes, tarjetas y vehículos referenciados
+
+    Incluye el número de viajes pausados porque la duración de su pausa activa
+    cambia con el tiempo aunque las filas no cambien.
+    """
+    query = """
+        SELECT COUNT(t.id), MAX(t.write_date), MAX(t.sync_version),
+               MAX(c.write_date), MAX(c.sync_version), MAX(v.write_date),
+               COUNT(t.id) FILTER (WHERE t.is_paused)
+          FROM driverpro_trip t
+     LEFT JOIN driverpro_card c ON c.id = t.card_id
+     LEFT JOIN fleet_vehicle v ON v.id = t.vehicle_id
+         WHERE t.driver_id = %s AND t.create_date >= %s
+    """
+    params = [user_id, since_date]
+    if state:
+        query += " AND t.state = %s"
+        params.append(state)
+    cr.execute(query, params)
+    return cr.fetchone()
+
+
+def empty_trips_fingerprint(cr, user_id, since_date):
+    """
+    Huella de las búsquedas del chofer
+
+    Incluye el número de búsquedas activas porque su tiempo restante cambia
+    cada minuto aunque las filas no cambien.
+    """
+    cr.execute("""
+        SELECT COUNT(e.id), MAX(e.write_date), MAX(e.sync_version),
+               COUNT(e.id) FILTER (WHERE e.state = 'searching'),
+               MAX(v.write_date)
+          FROM driverpro_empty_trip e
+     LEFT JOIN fleet_vehicle v ON v.id = e.vehicle_id
+         WHERE e.driver_id = %s AND e.create_date >= %s
+    """, [user_id, since_date])
+    return cr.fetchone()
+
+
+def pause_reasons_fingerprint(cr):
+    """Huella del catálogo de motivos de pausa activos"""
+    cr.execute("""
+        SELECT COUNT(id), MAX(write_date)
+          FROM driverpro_pause_reason
+         WHERE active
+    """)
+    return cr.fetchone()
+
+
+def assignment_fingerprint(cr, partner_id):
+    """Huella de la asignación chofer → vehículo → tarjeta"""
+    cr.execute("""
+        SELECT p.write_date,
+               COUNT(v.id), MAX(v.write_date),
+               COUNT(c.id), MAX(c.write_date), MAX(c.sync_version)
+          FROM res_partner p
+     LEFT JOIN fleet_vehicle v ON v.driver_id = p.id AND v.active
+     LEFT JOIN driverpro_card c ON c.vehicle_id = v.id AND c.active
+         WHERE p.id = %s
+      GROUP BY p.id, p.write_date
+    """, [partner_id])
+    return cr.fetchone()
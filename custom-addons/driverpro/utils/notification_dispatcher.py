@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import selectors
+import threading
+import time
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.tools import config
+
+from ..models.driverpro_notification import NOTIFICATION_CHANNEL
+
+_logger = logging.getLogger(__name__)
+
+# Segundos de espera del selector y pausa antes de reconectar tras un error
+LISTEN_TIMEOUT = 50
+RECONNECT_DELAY = 5
+
+
+def can_wait():
+    """
+    Indica si el proceso puede retener peticiones en espera
+
+    Solo el worker gevent (gevent_port, 8072) o un servidor con hilos
+    (workers = 0); un worker prefork síncrono nunca espera, porque cada
+    petición retenida ocupa el proceso completo hasta limit_time_real.
+    """
+    return odoo.evented or not config['workers']
+
+
+class NotificationDispatcher(threading.Thread):
+    """
+    Hilo del proceso que escucha NOTIFY de PostgreSQL y despierta a las
+    peticiones en espera de nuevas notificaciones de un chofer
+
+    Una sola conexión LISTEN por proceso atiende a todos los clientes; una
+    petición en espera solo mantiene un threading.Event, sin cursor abierto.
+    En el worker gevent el hilo y los eventos son greenlets.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name=f'{__name__}.NotificationDispatcher')
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, dbname, user_id):
+        """Registra un evento que se activa al llegar notificaciones del chofer"""
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault((dbname, user_id), set()).add(event)
+        return event
+
+    def unsubscribe(self, dbname, user_id, event):
+        """Elimina el evento registrado por subscribe"""
+        with self._lock:
+            events = self._waiters.get((dbname, user_id))
+            if events:
+                events.discard(event)
+                if not events:
+                    del self._waiters[(dbname, user_id)]
+
+    def _dispatch(self, payload):
+        """Activa los eventos de los choferes incluidos en un NOTIFY"""
+        data = json.loads(payload)
+        with self._lock:
+            for user_id in data.get('user_ids', []):
+                for event in self._waiters.get((data.get('db'), user_id), ()):
+                    event.set()
+
+    def _loop(self):
+        """Escucha el canal y despacha notificaciones hasta que falle la conexión"""
+        _logger.info(f"Escuchando notificaciones Driver Pro en el canal {NOTIFICATION_CHANNEL}")
+        with odoo.sql_db.db_connect('postgres').cursor() as cr, selectors.DefaultSelector() as sel:
+            cr.execute(f"LISTEN {NOTIFICATION_CHANNEL}")
+            cr.commit()
+            conn = cr._cnx
+            sel.register(conn, selectors.EVENT_READ)
+            while True:
+                if sel.select(LISTEN_TIMEOUT):
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+
+    def run(self):
+        while True:
+            try:
+                self._loop()
+            except Exception as e:
+                _logger.error(f"Error en el despachador de notificaciones: {str(e)}")
+                time.sleep(RECONNECT_DELAY)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Devuelve el despachador del proceso, iniciándolo en el primer uso"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                dispatcher = NotificationDispatcher()
+                dispatcher.start()
+                _dispatcher = dispatcher
+    return _dispatcher
+
+
+def fetch_notifications(registry, user_id, last_id, limit=100):
+    """Lee el feed con un cursor nuevo y breve (sin retener uno durante la espera)"""
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        return env['driverpro.notification']._fetch_since(user_id, last_id, limit)
+
+
+def wait_for_notifications(registry, user_id, last_id, timeout, limit=100):
+    """
+    Devuelve las notificaciones posteriores a last_id, esperando hasta
+    timeout segundos si todavía no hay ninguna
+
+    El evento se registra antes de la primera lectura para no perder un
+    NOTIFY emitido entre la lectura y la espera. Fuera de un proceso que
+    pueda esperar (ver can_wait) la lectura es inmediata.
+    """
+    if timeout <= 0 or not can_wait():
+        return fetch_notifications(registry, user_id, last_id, limit)
+
+    dispatcher = get_dispatcher()
+    dbname = registry.db_name
+    event = dispatcher.subscribe(dbname, user_id)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            notifications = fetch_notifications(registry, user_id, last_id, limit)
+            remaining = deadline - time.monotonic()
+            if notifications or remaining <= 0:
+                return notifications
+            event.wait(remaining)
+            event.clear()
+    finally:
+        dispatcher.unsubscribe(dbname, user_id, event)
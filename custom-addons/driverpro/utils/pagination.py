@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+from datetime import datetime
+
+from odoo.tools import SQL
+
+
+def encode_cursor(create_date, record_id):
+    """
+    Genera un cursor opaco a partir de la clave (create_date, id)
+
+    Args:
+        create_date: datetime UTC del último registro de la página
+        record_id: id del último registro de la página
+
+    Returns:
+        str: cursor en base64 url-safe
+    """
+    key = json.dumps([create_date.isoformat(), record_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica un cursor generado por encode_cursor
+
+    Returns:
+        tuple: (create_date, id)
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode((cursor + padding).encode('ascii'))
+        create_date, record_id = json.loads(raw.decode('utf-8'))
+        return datetime.fromisoformat(create_date), int(record_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def search_keyset(model, domain, limit, cursor=None):
+    """
+    Busca una página ordenada por (create_date desc, id desc) usando keyset
+
+    La condición de corte es una comparación de filas sobre (create_date, id),
+    de modo que PostgreSQL puede recorrer directamente el índice compuesto en
+    lugar de descartar los registros de las páginas anteriores.
+
+    Args:
+        model: modelo de Odoo (recordset vacío)
+        domain: dominio de búsqueda
+        limit: tamaño de página
+        cursor: cursor devuelto por la página anterior (None para la primera)
+
+    Returns:
+        tuple: (recordset de la página, next_cursor o None)
+    """
+    query = model._search(domain, order='create_date desc, id desc', limit=limit + 1)
+    if cursor:
+        create_date, record_id = decode_cursor(cursor)
+        query.add_where(SQL(
+            "(%s, %s) < (%s, %s)",
+            SQL.identifier(query.table, 'create_date'),
+            SQL.identifier(query.table, 'id'),
+            create_date,
+            record_id,
+        ))
+
+    model.env.cr.execute(query.select())
+    ids = [row[0] for row in model.env.cr.fetchall()]
+
+    records = model.browse(ids[:limit])
+    next_cursor = None
+    if len(ids) > limit and records:
+        last = records[-1]
+        next_cursor = encode_cursor(last.create_date, last.id)
+    return records, next_cursor
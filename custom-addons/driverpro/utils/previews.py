@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+    WEBP_AVAILABLE = features.check('webp')
+except ImportError:
+    PIL_AVAILABLE = False
+    WEBP_AVAILABLE = False
+
+# Caja máxima de la vista previa y calidad de compresión
+PREVIEW_MAX_SIZE = (640, 640)
+PREVIEW_QUALITY = 70
+
+# Originales que no se procesan: archivos demasiado grandes o imágenes con demasiados píxeles
+PREVIEW_MAX_SOURCE_BYTES = 30 * 1024 * 1024
+PREVIEW_MAX_PIXELS = 50 * 1000 * 1000
+
+
+def can_preview(mimetype):
+    """Indica si se puede generar vista previa para el tipo MIME"""
+    return PIL_AVAILABLE and bool(mimetype) and mimetype.startswith('image/') and mimetype != 'image/svg+xml'
+
+
+def make_preview(raw):
+    """
+    Genera una vista previa reducida (WebP, o JPEG si PIL no soporta WebP)
+
+    Args:
+        raw: bytes de la imagen original
+
+    Returns:
+        tuple: (bytes de la vista previa, tipo MIME)
+    """
+    image = Image.open(io.BytesIO(raw))
+    if image.width * image.height > PREVIEW_MAX_PIXELS:
+        raise ValueError(f'Imagen demasiado grande para vista previa: {image.width}x{image.height}')
+
+    # Respetar la orientación EXIF de las fotos tomadas con el teléfono
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(PREVIEW_MAX_SIZE)
+
+    output = io.BytesIO()
+    if WEBP_AVAILABLE:
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.save(output, format='WEBP', quality=PREVIEW_QUALITY, method=4)
+        return output.getvalue(), 'image/webp'
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(output, format='JPEG', quality=PREVIEW_QUALITY, optimize=True)
+    return output.getvalue(), 'image/jpeg'
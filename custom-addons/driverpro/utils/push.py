@@ -2,44 +2,156 @@
 
 from odoo import fields
 from odoo.tools.safe_eval import safe_eval
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 
+from .vapid import get_vapid_context
+
 _logger = logging.getLogger(__name__)
 
 try:
-    from pywebpush import webpush, WebPushException
+    from pywebpush import WebPusher, WebPushException
     WEBPUSH_AVAILABLE = True
 except ImportError:
     WEBPUSH_AVAILABLE = False
     _logger.warning("pywebpush no está instalado. Las notificaciones push no funcionarán.")
 
 
-def send_web_push(env, user, payload):
+# Entrega concurrente: hilos máximos por envío y timeout por endpoint (segundos)
+PUSH_MAX_WORKERS = 8
+PUSH_TIMEOUT = 10
+
+# Hilos para difusiones a muchos usuarios (toda la flota)
+PUSH_FANOUT_MAX_WORKERS = 32
+
+# Códigos HTTP del servicio push que indican que la suscripción ya no es válida
+PERMANENT_STATUS_CODES = (404, 410, 403)
+
+
+def _webpush_one(subscription_info, data_json, vapid):
+    """
+    Envía un push a un endpoint (se ejecuta en un hilo del pool, sin acceso a BD)
+
+    Usa los encabezados VAPID ya firmados del contexto en lugar de volver a
+    parsear la clave y firmar un JWT por suscripción.
+
+    Returns:
+        tuple: (ok, status, error)
+    """
+    try:
+        response = WebPusher(subscription_info).send(
+            data_json,
+            headers=vapid.headers_for(subscription_info['endpoint']),
+            ttl=0,
+            timeout=PUSH_TIMEOUT
+        )
+        if response.status_code > 202:
+            raise WebPushException(
+                f"Push failed: {response.status_code} {response.reason}\nResponse body:{response.text}",
+                response=response
+            )
+        return True, None, None
+    except WebPushException as e:
+        status = e.response.status_code if getattr(e, 'response', None) is not None else None
+        return False, status, str(e)
+    except Exception as e:
+        return False, None, str(e)
+
+
+def _deliver_to_subscriptions(env, subs, data_json, vapid, max_workers=PUSH_MAX_WORKERS):
+    """
+    Entrega un payload a varias suscripciones de forma concurrente
+
+    Solo las peticiones HTTP se ejecutan en el pool de hilos; las escrituras
+    de last_seen / enabled se aplican después en bloque con el cursor actual.
+
+    Returns:
+        list: un dict por suscripción con subscription_id, user_id, endpoint, ok, status, error
+    """
+    subscription_infos = [{
+        "endpoint": sub.endpoint,
+        "keys": {
+            "p256dh": sub.p256dh,
+            "auth": sub.auth
+        }
+    } for sub in subs]
+
+    if len(subs) == 1:
+        outcomes = [_webpush_one(subscription_infos[0], data_json, vapid)]
+    else:
+        workers = min(max_workers, len(subs))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='driverpro_push') as executor:
+            outcomes = list(executor.map(
+                lambda info: _webpush_one(info, data_json, vapid),
+                subscription_infos
+            ))
+
+    results = []
+    for sub, (ok, status, error) in zip(subs, outcomes):
+        # Solo el código HTTP de la respuesta decide; timeouts y errores de conexión se reintentan
+        permanent = not ok and status in PERMANENT_STATUS_CODES
+        results.append({
+            'subscription_id': sub.id,
+            'user_id': sub.user_id.id,
+            'endpoint': sub.endpoint,
+            'ok': ok,
+            'status': status,
+            'error': error,
+            'disabled': permanent,
+        })
+        if ok:
+            _logger.info(f"Push enviado exitosamente (endpoint: {sub.endpoint[:50]}...)")
+        else:
+            _logger.warning(f"Error enviando push (endpoint: {sub.endpoint[:50]}...): {error}")
+
+    # Actualizar última vez vista y deshabilitar suscripciones con error permanente
+    delivered = subs.browse([r['subscription_id'] for r in results if r['ok']])
+    if delivered:
+        delivered.write({'last_seen': fields.Datetime.now()})
+    disabled = subs.browse([r['subscription_id'] for r in results if r['disabled']])
+    if disabled:
+        disabled.write({'enabled': False})
+        _logger.info(f"{len(disabled)} suscripciones deshabilitadas por error permanente")
+
+    return results
+
+
+def _summarize_results(results):
+    """Resume resultados por suscripción en un reporte agregado"""
+    return {
+        'sent': sum(1 for r in results if r['ok']),
+        'failed': sum(1 for r in results if not r['ok']),
+        'disabled': sum(1 for r in results if r['disabled']),
+        'results': results,
+    }
+
+
+def send_web_push_report(env, user, payload):
     """
     Envía una notificación Web Push a todas las suscripciones activas de un usuario
-    
+
+    Las suscripciones se atienden en paralelo con un pool de hilos acotado y
+    un timeout por endpoint.
+
     Args:
         env: Environment de Odoo
         user: res.users record
         payload: dict con los datos de la notificación
-        
+
     Returns:
-        int: número de notificaciones enviadas exitosamente
+        dict: {'sent', 'failed', 'disabled', 'results': [resultado por suscripción]}
     """
+    report = _summarize_results([])
     if not WEBPUSH_AVAILABLE:
         _logger.warning("pywebpush no está disponible. No se pueden enviar notificaciones push.")
-        return 0
-    
-    # Obtener configuración VAPID
-    ICP = env['ir.config_parameter'].sudo()
-    vapid_pub = ICP.get_param('driverpro.vapid_public_key')
-    vapid_priv = ICP.get_param('driverpro.vapid_private_key')
-    subject = ICP.get_param('driverpro.vapid_subject') or 'mailto:support@racoondevs.com'
+        return report
     
-    if not (vapid_pub and vapid_priv):
+    # Obtener contexto VAPID cacheado por proceso
+    vapid = get_vapid_context(env)
+    if not vapid:
         _logger.warning("VAPID keys no configuradas. No se pueden enviar notificaciones push.")
-        return 0
+        return report
     
     # Obtener suscripciones activas del usuario
     subs = env['driverpro.push_subscription'].sudo().search([
@@ -49,64 +161,42 @@ def send_web_push(env, user, payload):
     
     if not subs:
         _logger.info(f"No hay suscripciones activas para el usuario {user.login}")
-        return 0
-    
-    success_count = 0
-    failed_count = 0
+        return report
     
     # Preparar payload JSON
     try:
         data_json = json.dumps(payload, ensure_ascii=False)
     except Exception as e:
         _logger.error(f"Error serializando payload: {str(e)}")
-        return 0
+        return report
     
-    for sub in subs:
-        try:
-            # Preparar información de suscripción
-            subscription_info = {
-                "endpoint": sub.endpoint,
-                "keys": {
-                    "p256dh": sub.p256dh,
-                    "auth": sub.auth
-                }
-            }
-            
-            # Enviar notificación
-            webpush(
-                subscription_info=subscription_info,
-                data=data_json,
-                vapid_private_key=vapid_priv,
-                vapid_claims={"sub": subject}
-            )
-            
-            success_count += 1
-            _logger.info(f"Push enviado exitosamente a {user.login} (endpoint: {sub.endpoint[:50]}...)")
-            
-            # Actualizar última vez vista
-            sub.write({'last_seen': fields.Datetime.now()})
-            
-        except WebPushException as e:
-            failed_count += 1
-            error_msg = str(e)
-            _logger.warning(f"Error enviando push a {user.login}: {error_msg}")
-            
-            # Si es un error permanente, deshabilitar la suscripción
-            if any(code in error_msg for code in ['410', '404', '403']):
-                sub.write({'enabled': False})
-                _logger.info(f"Suscripción deshabilitada por error permanente: {sub.endpoint[:50]}...")
-                
-        except Exception as e:
-            failed_count += 1
-            _logger.error(f"Error inesperado enviando push a {user.login}: {str(e)}")
+    report = _summarize_results(_deliver_to_subscriptions(env, subs, data_json, vapid))
+    _logger.info(f"Push enviado: {report['sent']} exitosos, {report['failed']} fallidos para usuario {user.login}")
+    return report
+
+
+def send_web_push(env, user, payload):
+    """
+    Envía una notificación Web Push a todas las suscripciones activas de un usuario
     
-    _logger.info(f"Push enviado: {success_count} exitosos, {failed_count} fallidos para usuario {user.login}")
-    return success_count
+    Args:
+        env: Environment de Odoo
+        user: res.users record
+        payload: dict con los datos de la notificación
+        
+    Returns:
+        int: número de notificaciones enviadas exitosamente
+    """
+    return send_web_push_report(env, user, payload)['sent']
 
 
 def send_web_push_to_multiple_users(env, users, payload):
     """
     Envía una notificación Web Push a múltiples usuarios
+
+    Carga las suscripciones activas de todos los usuarios en una sola
+    consulta, cifra y entrega en paralelo con un único pool de hilos y
+    aplica last_seen / enabled con escrituras en bloque.
     
     Args:
         env: Environment de Odoo
@@ -116,12 +206,35 @@ def send_web_push_to_multiple_users(env, users, payload):
     Returns:
         dict: {user_id: count_sent, ...}
     """
-    results = {}
-    
-    for user in users:
-        count = send_web_push(env, user, payload)
-        results[user.id] = count
-    
+    results = {user_id: 0 for user_id in users.ids}
+    if not users or not WEBPUSH_AVAILABLE:
+        return results
+
+    vapid = get_vapid_context(env)
+    if not vapid:
+        _logger.warning("VAPID keys no configuradas. No se pueden enviar notificaciones push.")
+        return results
+
+    subs = env['driverpro.push_subscription'].sudo().search([
+        ('user_id', 'in', users.ids),
+        ('enabled', '=', True)
+    ])
+    if not subs:
+        return results
+
+    try:
+        data_json = json.dumps(payload, ensure_ascii=False)
+    except Exception as e:
+        _logger.error(f"Error serializando payload: {str(e)}")
+        return results
+
+    delivery = _deliver_to_subscriptions(env, subs, data_json, vapid, max_workers=PUSH_FANOUT_MAX_WORKERS)
+    for result in delivery:
+        if result['ok']:
+            results[result['user_id']] += 1
+
+    report = _summarize_results(delivery)
+    _logger.info(f"Difusión push: {report['sent']} exitosos, {report['failed']} fallidos, {len(users)} usuarios")
     return results
 
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Consultas frecuentes de la API y los crons: (etiqueta, tabla principal, índice declarado, SQL)
+# Los parámetros con nombre se resuelven con valores reales de la base de datos.
+HOT_QUERIES = [
+    ('trips_by_driver_recent', 'driverpro_trip', 'driverpro_trip_driver_create_date_id_idx', """
+        SELECT id FROM driverpro_trip
+         WHERE driver_id = %(driver_id)s AND create_date >= now() - interval '7 days'
+      ORDER BY create_date DESC, id DESC LIMIT 11
+    """),
+    ('trips_by_driver_state', 'driverpro_trip', 'driverpro_trip_driver_state_idx', """
+        SELECT id FROM driverpro_trip
+         WHERE driver_id = %(driver_id)s AND state = 'active'
+    """),
+    ('trips_open_by_driver', 'driverpro_trip', 'driverpro_trip_driver_open_idx', """
+        SELECT id FROM driverpro_trip
+         WHERE driver_id = %(driver_id)s AND state IN ('draft', 'empty')
+    """),
+    ('scheduled_trip_notifications', 'driverpro_trip', 'driverpro_trip_scheduled_draft_idx', """
+        SELECT id FROM driverpro_trip
+         WHERE is_scheduled AND state = 'draft'
+           AND scheduled_datetime BETWEEN now() + interval '10 minutes' AND now() + interval '30 minutes'
+    """),
+    ('empty_trips_in_progress', 'driverpro_trip', 'driverpro_trip_empty_started_idx', """
+        SELECT id FROM driverpro_trip
+         WHERE state = 'empty' AND empty_started_at IS NOT NULL
+    """),
+    ('card_by_vehicle', 'driverpro_card', 'driverpro_card_vehicle_active_idx', """
+        SELECT id FROM driverpro_card
+         WHERE vehicle_id = %(vehicle_id)s AND active
+         LIMIT 1
+    """),
+    ('card_balance_aggregate', 'driverpro_card_movement', 'driverpro_card_movement_card_type_amount_idx', """
+        SELECT movement_type, SUM(amount) FROM driverpro_card_movement
+         WHERE card_id = %(card_id)s
+      GROUP BY movement_type
+    """),
+    ('card_latest_balance', 'driverpro_card_movement', 'driverpro_card_movement_card_id_id_idx', """
+        SELECT DISTINCT ON (card_id) card_id, balance_after FROM driverpro_card_movement
+         WHERE card_id IN (%(card_id)s)
+      ORDER BY card_id, id DESC
+    """),
+    ('card_balance_at', 'driverpro_card_movement', 'driverpro_card_movement_card_create_date_id_idx', """
+        SELECT balance_after FROM driverpro_card_movement
+         WHERE card_id = %(card_id)s AND create_date <= now() - interval '30 days'
+      ORDER BY create_date DESC, id DESC LIMIT 1
+    """),
+    ('empty_trip_scheduler', 'driverpro_empty_trip', 'driverpro_empty_trip_next_event_idx', """
+        SELECT id FROM driverpro_empty_trip
+         WHERE state = 'searching' AND next_event_at <= now()
+      ORDER BY next_event_at, id LIMIT 100
+    """),
+]
+
+
+def _sample_params(cr):
+    """Toma valores reales (chofer, vehículo, tarjeta) para parametrizar las consultas"""
+    cr.execute("SELECT driver_id FROM driverpro_trip WHERE driver_id IS NOT NULL LIMIT 1")
+    row = cr.fetchone()
+    driver_id = row[0] if row else 0
+    cr.execute("SELECT id, vehicle_id FROM driverpro_card WHERE vehicle_id IS NOT NULL LIMIT 1")
+    row = cr.fetchone()
+    card_id, vehicle_id = row if row else (0, 0)
+    return {'driver_id': driver_id, 'vehicle_id': vehicle_id, 'card_id': card_id}
+
+
+def _bitmap_index(plan):
+    """Índice de un Bitmap Heap Scan: está en el Bitmap Index Scan hijo, no en el nodo"""
+    for child in plan.get('Plans', []):
+        index = child.get('Index Name') or _bitmap_index(child)
+        if index:
+            return index
+    return None
+
+
+def _scan_nodes(plan):
+    """Recorre el plan JSON y devuelve los nodos de lectura de tablas"""
+    nodes = []
+    if 'Relation Name' in plan:
+        index = plan.get('Index Name')
+        if plan['Node Type'] == 'Bitmap Heap Scan':
+            index = _bitmap_index(plan)
+        nodes.append((plan['Node Type'], plan['Relation Name'], index))
+    for child in plan.get('Plans', []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+
+def explain_hot_queries(cr, analyze=False):
+    """
+    Ejecuta EXPLAIN sobre las consultas frecuentes y reporta si usan índice
+
+    Pensado para validar los índices sobre un volumen representativo (por
+    ejemplo, los datos generados por benchmarks), desde un shell de Odoo:
+
+        from odoo.addons.driverpro.utils.query_plans import explain_hot_queries
+        explain_hot_queries(env.cr)
+
+    Args:
+        cr: cursor de base de datos
+        analyze: si True usa EXPLAIN ANALYZE (ejecuta las consultas)
+
+    Returns:
+        list: dicts con label, table, index, uses_index, uses_declared_index, scans y plan
+    """
+    params = _sample_params(cr)
+    report = []
+    for label, table, index, query in HOT_QUERIES:
+        cr.execute(
+            f"EXPLAIN ({'ANALYZE, ' if analyze else ''}FORMAT JSON) {query}",
+            params
+        )
+        plan = cr.fetchone()[0][0]['Plan']
+        scans = [node for node in _scan_nodes(plan) if node[1] == table]
+        uses_index = bool(scans) and all(node_type != 'Seq Scan' for node_type, _table, _index in scans)
+        uses_declared_index = any(scan_index == index for _node_type, _table, scan_index in scans)
+        if not uses_index:
+            _logger.warning(f"Consulta {label} recorre {table} sin índice: {scans}")
+        elif not uses_declared_index:
+            _logger.warning(f"Consulta {label} no usa el índice {index}: {scans}")
+        report.append({
+            'label': label,
+            'table': table,
+            'index': index,
+            'uses_index': uses_index,
+            'uses_declared_index': uses_declared_index,
+            'scans': scans,
+            'plan': plan,
+        })
+    return report
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def reserve_sequence_numbers(env, code, count):
+    """
+    Reserva count valores consecutivos de una secuencia de ir.sequence
+
+    Las secuencias de implementación estándar se respaldan en una secuencia
+    de PostgreSQL: los valores se toman con un solo nextval sobre
+    generate_series y el prefijo/sufijo se interpola una vez. Las
+    secuencias sin huecos o con rangos por fecha usan next_by_code.
+
+    Args:
+        env: entorno de Odoo
+        code: código de la secuencia
+        count: cantidad de valores a reservar
+
+    Returns:
+        list: nombres generados (False si la secuencia no existe)
+    """
+    if count <= 0:
+        return []
+
+    IrSequence = env['ir.sequence'].sudo()
+    sequence = IrSequence.search([
+        ('code', '=', code),
+        ('company_id', 'in', [env.company.id, False])
+    ], order='company_id', limit=1)
+    if not sequence:
+        _logger.debug(f"No existe la secuencia {code}")
+        return [False] * count
+
+    if sequence.implementation != 'standard' or sequence.use_date_range or count == 1:
+        return [IrSequence.next_by_code(code) for _index in range(count)]
+
+    env.cr.execute(
+        "SELECT nextval(%s) FROM generate_series(1, %s)",
+        [f'ir_sequence_{sequence.id:03d}', count]
+    )
+    numbers = sorted(row[0] for row in env.cr.fetchall())
+    prefix, suffix = sequence._get_prefix_suffix()
+    return [f"{prefix}{number:0{sequence.padding}d}{suffix}" for number in numbers]
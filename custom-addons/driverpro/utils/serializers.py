@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import datetime, timedelta
+import pytz
+
+from odoo import fields
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'America/Mexico_City'
+
+
+def elapsed_hours(start, end):
+    """Horas transcurridas entre dos datetimes UTC"""
+    return max((end - start).total_seconds(), 0) / 3600
+
+
+class BaseSerializer:
+    """Base de serializadores con una sola zona horaria por petición"""
+
+    def __init__(self, env, tz_name=None):
+        self.env = env
+        try:
+            # Obtener la zona horaria del usuario, por defecto México (UTC-6)
+            self.timezone = pytz.timezone(tz_name or env.user.tz or DEFAULT_TIMEZONE)
+        except Exception as e:
+            _logger.warning(f"Error convirtiendo zona horaria: {e}")
+            self.timezone = None
+
+    def to_local(self, datetime_utc):
+        """Convierte datetime UTC a la zona horaria cacheada"""
+        if not datetime_utc:
+            return None
+        if self.timezone is None:
+            return datetime_utc
+        if datetime_utc.tzinfo is None:
+            # Si no tiene timezone info, asumir que es UTC
+            datetime_utc = pytz.UTC.localize(datetime_utc)
+        return datetime_utc.astimezone(self.timezone)
+
+    def to_local_iso(self, datetime_utc):
+        """Convierte a la zona horaria cacheada y devuelve ISO 8601"""
+        local_dt = self.to_local(datetime_utc)
+        return local_dt.isoformat() if local_dt else None
+
+
+class TripSerializer(BaseSerializer):
+    """
+    Serializa viajes por lotes para la API de choferes
+
+    Todas las columnas se leen en una sola llamada, vehículos y tarjetas se
+    resuelven con una consulta por modelo, el inicio de las pausas activas con
+    una consulta solo si algún viaje está pausado y la zona horaria se
+    resuelve una sola vez por petición.
+    """
+
+    TRIP_FIELDS = [
+        'name', 'state', 'origin', 'destination', 'passenger_count',
+        'passenger_reference', 'start_datetime', 'end_datetime', 'duration',
+        'pause_duration', 'effective_duration', 'consumed_credits', 'amount_mxn',
+        'amount_usd', 'total_amount_mxn', 'payment_in_usd', 'exchange_rate',
+        'payment_method', 'payment_reference', 'pause_count', 'comments',
+        'is_scheduled', 'scheduled_datetime', 'vehicle_id', 'card_id',
+        'is_paused',
+    ]
+
+    def search_serialize(self, domain, limit=None, offset=0, order=None):
+        """Busca y serializa viajes con un solo search_read"""
+        rows = self.env['driverpro.trip'].search_read(
+            domain, self.TRIP_FIELDS, offset=offset, limit=limit, order=order
+        )
+        return self.serialize_rows(rows)
+
+    def serialize(self, trips):
+        """Serializa un recordset de driverpro.trip"""
+        if not trips:
+            return []
+        return self.serialize_rows(trips.read(self.TRIP_FIELDS))
+
+    def serialize_rows(self, rows):
+        """Serializa filas leídas con TRIP_FIELDS manteniendo el formato de la API"""
+        if not rows:
+            return []
+
+        vehicles = self._read_related('fleet.vehicle', rows, 'vehicle_id', ['name', 'license_plate'])
+        cards = self._read_related('driverpro.card', rows, 'card_id', ['name', 'balance'])
+        active_pauses = self._read_active_pauses(rows)
+        now = fields.Datetime.now()
+
+        trips_data = []
+        for row in rows:
+            vehicle = vehicles.get(row['vehicle_id'][0]) if row['vehicle_id'] else None
+            card = cards.get(row['card_id'][0]) if row['card_id'] else None
+            # Las pausas cerradas vienen agregadas; la activa se mide hasta ahora
+            pause_start = active_pauses.get(row['id'])
+            pause_duration = row['pause_duration']
+            effective_duration = row['effective_duration']
+            if pause_start:
+                active_hours = elapsed_hours(pause_start, now)
+                pause_duration += active_hours
+                effective_duration -= active_hours
+            trips_data.append({
+                'id': row['id'],
+                'name': row['name'],
+                'state': row['state'],
+                'origin': row['origin'],
+                'destination': row['destination'],
+                'passenger_count': row['passenger_count'],
+                'passenger_reference': row['passenger_reference'],
+                'start_datetime': self.to_local_iso(row['start_datetime']),
+                'end_datetime': self.to_local_iso(row['end_datetime']),
+                'duration': row['duration'],
+                'pause_duration': pause_duration,
+                'effective_duration': effective_duration,
+                'consumed_credits': row['consumed_credits'],
+                'amount_mxn': row['amount_mxn'],
+                'amount_usd': row['amount_usd'],
+                'total_amount_mxn': row['total_amount_mxn'],
+                'payment_in_usd': row['payment_in_usd'],
+                'exchange_rate': row['exchange_rate'],
+                'payment_method': row['payment_method'],
+                'payment_reference': row['payment_reference'],
+                'is_paused': row['is_paused'],
+                'pause_count': row['pause_count'],
+                'comments': row['comments'],
+                'is_scheduled': row['is_scheduled'],
+                'scheduled_datetime': self.to_local_iso(row['scheduled_datetime']),
+                'vehicle': {
+                    'id': vehicle['id'],
+                    'name': vehicle['name'],
+                    'license_plate': vehicle['license_plate']
+                } if vehicle else None,
+                'card': {
+                    'id': card['id'],
+                    'name': card['name'],
+                    'balance': card['balance']
+                } if card else None
+            })
+        return trips_data
+
+    def _read_related(self, model_name, rows, field_name, fnames):
+        """Lee en bloque los registros referenciados por un Many2one"""
+        ids = {row[field_name][0] for row in rows if row[field_name]}
+        if not ids:
+            return {}
+        records = self.env[model_name].browse(sorted(ids))
+        return {values['id']: values for values in records.read(fnames)}
+
+    def _read_active_pauses(self, rows):
+        """Inicio de la pausa activa de cada viaje pausado (sin consulta si no hay ninguno)"""
+        trip_ids = tuple(row['id'] for row in rows if row['is_paused'])
+        if not trip_ids:
+            return {}
+        self.env['driverpro.trip.pause'].flush_model(['trip_id', 'start_datetime', 'is_active'])
+        self.env.cr.execute("""
+            SELECT trip_id, start_datetime
+              FROM driverpro_trip_pause
+             WHERE trip_id IN %s AND is_active
+        """, [trip_ids])
+        return dict(self.env.cr.fetchall())
+
+
+class EmptyTripSerializer(BaseSerializer):
+    """Serializa búsquedas de clientes (driverpro.empty_trip) para la API"""
+
+    def serialize(self, empty_trips):
+        """Serializa un recordset de driverpro.empty_trip"""
+        return [self.serialize_one(trip) for trip in empty_trips]
+
+    def serialize_one(self, trip):
+        """Serializa una búsqueda con tiempo restante en la zona del usuario"""
+        # Calcular tiempo restante con conversión de timezone
+        time_remaining = 0
+        wait_limit_time = None
+
+        if trip.started_at and trip.wait_limit_minutes > 0:
+            # Convertir started_at a timezone del usuario
+            started = self.to_local(trip.started_at).replace(tzinfo=None)  # Para cálculo sin tz
+            limit_time = started + timedelta(minutes=trip.wait_limit_minutes)
+            wait_limit_time = limit_time.isoformat()
+
+            if trip.state == 'searching':
+                # Usar hora local del usuario para el cálculo
+                now_local = datetime.now(self.timezone or pytz.UTC).replace(tzinfo=None)
+
+                if now_local < limit_time:
+                    diff = limit_time - now_local
+                    time_remaining = int(diff.total_seconds() / 60)  # en minutos
+
+        # Datos del vehículo (reemplaza assignment_data)
+        vehicle_data = None
+        if trip.vehicle_id:
+            vehicle_data = {
+                'id': trip.vehicle_id.id,
+                'license_plate': trip.vehicle_id.license_plate,
+                'brand': trip.vehicle_id.brand_id.name if trip.vehicle_id.brand_id else '',
+                'model': trip.vehicle_id.model_id.name if trip.vehicle_id.model_id else '',
+            }
+
+        return {
+            'id': trip.id,
+            'search_number': trip.name,
+            'state': trip.state,
+            'search_location': trip.search_location,
+            'wait_limit_minutes': trip.wait_limit_minutes,
+            'wait_limit_time': wait_limit_time,
+            'time_remaining': time_remaining,
+            'create_date': self.to_local_iso(trip.create_date),
+            'started_at': self.to_local_iso(trip.started_at),
+            'converted_at': self.to_local_iso(trip.converted_at),
+            'cancelled_at': self.to_local_iso(trip.cancelled_at),
+            'converted_trip_id': trip.converted_trip_id.id if trip.converted_trip_id else None,
+            'converted_trip_name': trip.converted_trip_id.name if trip.converted_trip_id else None,
+            'comments': getattr(trip, 'comments', ''),
+            'vehicle_id': vehicle_data,
+        }
+
+
+class PauseSerializer(BaseSerializer):
+    """Serializa pausas de viaje (driverpro.trip.pause) para la API"""
+
+    PAUSE_FIELDS = [
+        'trip_id', 'reason_id', 'start_datetime', 'end_datetime',
+        'duration', 'is_active', 'notes',
+    ]
+
+    def serialize(self, pauses):
+        """Serializa un recordset de driverpro.trip.pause con una sola lectura"""
+        if not pauses:
+            return []
+        now = fields.Datetime.now()
+        return [{
+            'id': row['id'],
+            'trip_id': row['trip_id'][0] if row['trip_id'] else None,
+            'reason': {
+                'id': row['reason_id'][0],
+                'name': row['reason_id'][1]
+            } if row['reason_id'] else None,
+            'start_datetime': self.to_local_iso(row['start_datetime']),
+            'end_datetime': self.to_local_iso(row['end_datetime']),
+            'duration': elapsed_hours(row['start_datetime'], now) if row['is_active'] else row['duration'],
+            'is_active': row['is_active'],
+            'notes': row['notes'],
+        } for row in pauses.read(self.PAUSE_FIELDS)]
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+from odoo.http import request
+from odoo.tools.mimetypes import guess_mimetype
+
+_logger = logging.getLogger(__name__)
+
+# Límites por defecto (MB); configurables con driverpro.upload_max_file_mb y driverpro.upload_max_request_mb
+DEFAULT_UPLOAD_MAX_FILE_MB = 10
+DEFAULT_UPLOAD_MAX_REQUEST_MB = 25
+
+# Tamaño de bloque al copiar el archivo subido al filestore
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadLimitExceeded(Exception):
+    """El archivo o el request superan el límite de tamaño configurado"""
+
+
+def _param_bytes(ICP, key, default_mb):
+    """Lee un límite en MB de ir.config_parameter y lo devuelve en bytes"""
+    try:
+        megabytes = float(ICP.get_param(key) or default_mb)
+    except (TypeError, ValueError):
+        megabytes = default_mb
+    return int(megabytes * 1024 * 1024)
+
+
+def get_upload_limits(env):
+    """
+    Límites de subida configurados
+
+    Returns:
+        tuple: (máximo por archivo, máximo por request) en bytes
+    """
+    ICP = env['ir.config_parameter'].sudo()
+    return (
+        _param_bytes(ICP, 'driverpro.upload_max_file_mb', DEFAULT_UPLOAD_MAX_FILE_MB),
+        _param_bytes(ICP, 'driverpro.upload_max_request_mb', DEFAULT_UPLOAD_MAX_REQUEST_MB),
+    )
+
+
+def max_request_bytes(controller=None):
+    """
+    Límite por request para el parámetro max_content_length de las rutas de subida
+
+    Odoo lo aplica antes de leer el cuerpo: werkzeug rechaza con 413 por
+    Content-Length sin analizar el multipart y corta los cuerpos sin
+    Content-Length en cuanto superan el límite.
+    """
+    return get_upload_limits(request.env)[1]
+
+
+def _read_chunks(stream, max_bytes, filename):
+    """Itera el stream por bloques, cortando en cuanto se supera max_bytes"""
+    size = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadLimitExceeded(
+                f'El archivo {filename} supera el límite de {max_bytes // (1024 * 1024)} MB'
+            )
+        yield chunk
+
+
+def _attachment_vals(file_item, head, res_model, res_id):
+    """Valores comunes del adjunto; el tipo MIME se detecta con el primer bloque"""
+    mimetype = guess_mimetype(head, default='') if head else ''
+    if not mimetype or mimetype == 'application/octet-stream':
+        mimetype = file_item.mimetype or 'application/octet-stream'
+    return {
+        'name': file_item.filename,
+        'type': 'binary',
+        'res_model': res_model,
+        'res_id': res_id,
+        'mimetype': mimetype,
+    }
+
+
+def _link_duplicate(env, checksum, res_model, res_id, link_field):
+    """
+    Busca un adjunto con idéntico contenido y lo vincula al documento
+
+    La búsqueda usa los permisos del usuario actual, así que solo reutiliza
+    adjuntos de documentos que ya puede leer (sus propios viajes en el caso
+    de un chofer); quien sube el archivo ya tiene su contenido.
+
+    Returns:
+        ir.attachment existente (vinculado mediante link_field) o recordset vacío
+    """
+    if not link_field:
+        return env['ir.attachment']
+    duplicate = env['ir.attachment'].search([
+        ('checksum', '=', checksum),
+        ('res_model', '=', res_model),
+    ], order='id', limit=1)
+    if duplicate and duplicate.res_id != res_id:
+        record = env[res_model].browse(res_id)
+        if duplicate not in record[link_field]:
+            record.write({link_field: [(4, duplicate.id)]})
+    return duplicate
+
+
+def _stream_to_filestore(env, file_item, max_bytes, res_model, res_id, link_field=None):
+    """Copia el archivo al filestore por bloques calculando SHA-1 y tamaño al vuelo"""
+    Attachment = env['ir.attachment'].sudo()
+    filestore = Attachment._filestore()
+    os.makedirs(filestore, exist_ok=True)
+
+    sha = hashlib.sha1()
+    size = 0
+    head = b''
+    tmp = tempfile.NamedTemporaryFile(dir=filestore, prefix='.driverpro-upload-', delete=False)
+    try:
+        with tmp:
+            for chunk in _read_chunks(file_item.stream, max_bytes, file_item.filename):
+                if not head:
+                    head = chunk
+                sha.update(chunk)
+                size += len(chunk)
+                tmp.write(chunk)
+
+        # Misma ruta que usa Odoo para el filestore (el contenido idéntico se reutiliza)
+        checksum = sha.hexdigest()
+        fname = f'{checksum[:2]}/{checksum}'
+        if os.path.isfile(Attachment._full_path(fname)):
+            os.unlink(tmp.name)
+        else:
+            fname, full_path = Attachment._get_path(b'', checksum)
+            os.replace(tmp.name, full_path)
+    except BaseException:
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
+        raise
+
+    # Si la transacción se revierte, el GC del filestore elimina el archivo huérfano
+    Attachment._mark_for_gc(fname)
+
+    duplicate = _link_duplicate(env, checksum, res_model, res_id, link_field)
+    if duplicate:
+        return duplicate, True
+
+    # El ORM valida nombre, documento y tipo MIME; el archivo ya copiado se registra aparte
+    attachment = env['ir.attachment'].create(_attachment_vals(file_item, head, res_model, res_id))
+    attachment._driverpro_set_stored_file(fname, size, checksum, head)
+    return attachment, False
+
+
+def _store_in_database(env, file_item, max_bytes, res_model, res_id, link_field=None):
+    """Almacenamiento en base de datos: se lee acotado al límite y se guarda como raw"""
+    buffer = io.BytesIO()
+    for chunk in _read_chunks(file_item.stream, max_bytes, file_item.filename):
+        buffer.write(chunk)
+    raw = buffer.getvalue()
+
+    duplicate = _link_duplicate(env, hashlib.sha1(raw).hexdigest(), res_model, res_id, link_field)
+    if duplicate:
+        return duplicate, True
+
+    vals = _attachment_vals(file_item, raw[:UPLOAD_CHUNK_SIZE], res_model, res_id)
+    vals['raw'] = raw
+    return env['ir.attachment'].create(vals), False
+
+
+def store_uploaded_file(env, file_item, res_model, res_id, max_bytes, link_field=None):
+    """
+    Guarda un archivo multipart de werkzeug como ir.attachment sin cargarlo completo en memoria
+
+    Si se indica link_field (many2many de adjuntos del documento) y el usuario
+    ya puede leer un adjunto con el mismo checksum, se vincula el adjunto
+    existente en lugar de crear otro.
+
+    Args:
+        env: entorno de Odoo
+        file_item: werkzeug FileStorage
+        res_model: modelo del documento
+        res_id: id del documento
+        max_bytes: tamaño máximo permitido para el archivo
+        link_field: campo many2many para vincular duplicados (opcional)
+
+    Returns:
+        tuple: (ir.attachment con file_size y checksum calculados, si se reutilizó uno existente)
+
+    Raises:
+        UploadLimitExceeded: si el archivo supera max_bytes
+    """
+    if env['ir.attachment']._storage() == 'file':
+        return _stream_to_filestore(env, file_item, max_bytes, res_model, res_id, link_field)
+    return _store_in_database(env, file_item, max_bytes, res_model, res_id, link_field)
+
+
+def store_uploaded_files(env, files, res_model, res_id, link_field=None):
+    """
+    Guarda los archivos de un request aplicando los límites por archivo y por request
+
+    Args:
+        env: entorno de Odoo
+        files: MultiDict de werkzeug (request.httprequest.files)
+        res_model: modelo del documento
+        res_id: id del documento
+        link_field: campo many2many para vincular duplicados (opcional)
+
+    Returns:
+        tuple: (archivos guardados, archivos rechazados) como listas de dicts
+    """
+    max_file, max_request = get_upload_limits(env)
+    uploaded, rejected = [], []
+    remaining = max_request
+    for file_key in files:
+        for file_item in files.getlist(file_key):
+            if not file_item or not file_item.filename:
+                continue
+            try:
+                with env.cr.savepoint():
+                    attachment, deduplicated = store_uploaded_file(
+                        env, file_item, res_model, res_id, min(max_file, remaining), link_field
+                    )
+            except UploadLimitExceeded as e:
+                error = str(e)
+                if remaining < max_file:
+                    error = f'El archivo {file_item.filename} excede el límite de {max_request // (1024 * 1024)} MB por request'
+                rejected.append({'name': file_item.filename, 'error': error})
+                continue
+            except Exception as e:
+                _logger.warning(f"Error subiendo archivo {file_item.filename}: {e}")
+                rejected.append({'name': file_item.filename, 'error': str(e)})
+                continue
+            remaining -= attachment.file_size
+            uploaded.append({
+                'name': attachment.name,
+                'id': attachment.id,
+                'size': attachment.file_size,
+                'checksum': attachment.checksum,
+                'mimetype': attachment.mimetype,
+                'deduplicated': deduplicated,
+            })
+    return uploaded, rejected
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import logging
+from urllib.parse import urlparse
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from py_vapid import Vapid
+    VAPID_AVAILABLE = True
+except ImportError:
+    VAPID_AVAILABLE = False
+
+# Vigencia de los JWT VAPID firmados y margen para renovarlos antes de expirar (segundos)
+VAPID_JWT_TTL = 12 * 3600
+VAPID_JWT_RENEW_MARGIN = 3600
+
+DEFAULT_VAPID_SUBJECT = 'mailto:support@racoondevs.com'
+
+# Contextos por proceso: {(dbname, private_key, subject): VapidContext}
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+class VapidContext:
+    """
+    Clave VAPID ya parseada y encabezados firmados por origen de push service
+
+    Se comparte entre peticiones y crons del mismo proceso; los JWT se
+    reutilizan por origen hasta poco antes de su expiración.
+    """
+
+    def __init__(self, public_key, private_key, subject):
+        self.public_key = public_key
+        self.private_key = private_key
+        self.subject = subject
+        self.vapid = Vapid.from_string(private_key=private_key)
+        self._headers = {}
+        self._lock = threading.Lock()
+
+    def headers_for(self, endpoint):
+        """Devuelve (copia de) los encabezados VAPID firmados para el origen del endpoint"""
+        url = urlparse(endpoint)
+        origin = f"{url.scheme}://{url.netloc}"
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(origin)
+            if cached and cached[1] - VAPID_JWT_RENEW_MARGIN > now:
+                return dict(cached[0])
+            expires = int(now) + VAPID_JWT_TTL
+            headers = self.vapid.sign({
+                'sub': self.subject,
+                'aud': origin,
+                'exp': expires,
+            })
+            self._headers[origin] = (headers, expires)
+            return dict(headers)
+
+
+def get_vapid_context(env):
+    """
+    Obtiene el contexto VAPID del proceso para la base de datos actual
+
+    Los parámetros se leen de ir.config_parameter (cacheado por el ORM); si
+    cambian, la clave del caché cambia y se construye un contexto nuevo.
+
+    Returns:
+        VapidContext o None si las claves no están configuradas
+    """
+    if not VAPID_AVAILABLE:
+        return None
+
+    ICP = env['ir.config_parameter'].sudo()
+    vapid_pub = ICP.get_param('driverpro.vapid_public_key')
+    vapid_priv = ICP.get_param('driverpro.vapid_private_key')
+    subject = ICP.get_param('driverpro.vapid_subject') or DEFAULT_VAPID_SUBJECT
+
+    if not (vapid_pub and vapid_priv):
+        return None
+
+    dbname = env.cr.dbname
+    key = (dbname, vapid_priv, subject)
+    context = _contexts.get(key)
+    if context is not None and context.public_key == vapid_pub:
+        return context
+
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None or context.public_key != vapid_pub:
+            try:
+                context = VapidContext(vapid_pub, vapid_priv, subject)
+            except Exception as e:
+                _logger.error(f"Error cargando clave privada VAPID: {str(e)}")
+                return None
+            # Descartar contextos anteriores de la misma base de datos
+            for stale_key in [k for k in _contexts if k[0] == dbname]:
+                del _contexts[stale_key]
+            _contexts[key] = context
+    return context